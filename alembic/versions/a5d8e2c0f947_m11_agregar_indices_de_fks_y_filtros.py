@@ -0,0 +1,129 @@
+"""M11_Agregar_indices_de_fks_y_filtros
+
+Revision ID: a5d8e2c0f947
+Revises: f1c6b2e8a054
+Create Date: 2026-10-18 18:02:41.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a5d8e2c0f947'
+down_revision: Union[str, Sequence[str], None] = 'f1c6b2e8a054'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (tabla, índice, columnas). La fecha va segunda donde las consultas filtran u
+# ordenan por ella (historial de la mascota, agenda del veterinario).
+FK_INDEXES = [
+    ('pets', 'ix_pets_owner_id', ['owner_id']),
+    ('appointments', 'ix_appointments_pet_id_date', ['pet_id', 'appointment_date']),
+    ('appointments', 'ix_appointments_veterinarian_id_date', ['veterinarian_id', 'appointment_date']),
+    ('vaccination_records', 'ix_vaccination_records_pet_id_date', ['pet_id', 'vaccination_date']),
+    ('vaccination_records', 'ix_vaccination_records_vaccine_id', ['vaccine_id']),
+    ('vaccination_records', 'ix_vaccination_records_veterinarian_id', ['veterinarian_id']),
+]
+
+FILTER_INDEXES = [
+    ('invoices', 'ix_invoices_payment_status_issue_date', ['payment_status', 'issue_date']),
+    ('invoices', 'ix_invoices_payment_date', ['payment_date']),
+    ('appointments', 'ix_appointments_status_date', ['status', 'appointment_date']),
+    ('medical_records', 'ix_medical_records_created_at', ['created_at']),
+]
+
+
+def _is_partitioned(bind, table: str) -> bool:
+    return bind.execute(
+        sa.text("SELECT relkind = 'p' FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+        {"table": table},
+    ).scalar()
+
+def _partitions_of(bind, table: str) -> list:
+    return bind.execute(sa.text("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:table AS regclass) ORDER BY c.relname
+    """), {"table": table}).scalars().all()
+
+def _attached_partitions(bind, index: str) -> set:
+    # Particiones que ya tienen su índice adjunto (las creadas después del ON ONLY
+    # lo reciben al hacer ATTACH, o una corrida anterior llegó hasta ahí)
+    return set(bind.execute(sa.text("""
+        SELECT t.relname FROM pg_inherits i
+        JOIN pg_index x ON x.indexrelid = i.inhrelid
+        JOIN pg_class t ON t.oid = x.indrelid
+        WHERE i.inhparent = CAST(:index AS regclass)
+    """), {"index": index}).scalars())
+
+def _drop_if_invalid(bind, name: str) -> None:
+    # Un CREATE INDEX CONCURRENTLY interrumpido deja el índice INVALID; IF NOT
+    # EXISTS lo daría por bueno, así que se borra y se vuelve a construir.
+    invalid = bind.execute(sa.text("""
+        SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = :name AND c.relkind = 'i'
+    """), {"name": name}).scalar()
+    if invalid:
+        op.execute(f'DROP INDEX CONCURRENTLY "{name}"')
+
+def _create_index_concurrently(bind, table: str, name: str, columns: list) -> None:
+    cols = ", ".join(columns)
+    if not _is_partitioned(bind, table):
+        _drop_if_invalid(bind, name)
+        op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" ({cols})')
+        return
+
+    # Tablas particionadas (M9): CONCURRENTLY no existe para el padre. Se crea
+    # el índice del padre vacío (ON ONLY, queda inválido), se construye cada
+    # partición con CONCURRENTLY y se adjunta; con la última adjunta Postgres lo
+    # marca válido. Las particiones nuevas lo reciben solas al hacer ATTACH.
+    op.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON ONLY "{table}" ({cols})')
+    attached = _attached_partitions(bind, name)
+    for partition in _partitions_of(bind, table):
+        if partition in attached:
+            continue
+        partition_index = f"{partition}_{'_'.join(columns)}_idx"
+        _drop_if_invalid(bind, partition_index)
+        op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{partition_index}" ON "{partition}" ({cols})')
+        op.execute(f'ALTER INDEX "{name}" ATTACH PARTITION "{partition_index}"')
+
+
+def upgrade() -> None:
+    """
+    Paso 1: Índices para las claves foráneas que no tenían (pets.owner_id,
+            appointments.pet_id / veterinarian_id, vaccination_records.*).
+    Paso 2: Índices para los filtros y ordenamientos frecuentes (facturas
+            pendientes, pagos, estado de citas, historial médico).
+    Todo con CREATE INDEX CONCURRENTLY: no bloquea escrituras, pero no puede ir
+    dentro de una transacción (autocommit_block). Si se interrumpe, volver a
+    correr la migración rehace los índices que quedaron inválidos.
+    Para revisar que toda FK tenga índice:  python -m app.indexes --db
+    """
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        print("M11: Creando índices de claves foráneas...")
+        for table, name, columns in FK_INDEXES:
+            print(f"M11:   {name}")
+            _create_index_concurrently(bind, table, name, columns)
+
+        print("M11: Creando índices de filtros frecuentes...")
+        for table, name, columns in FILTER_INDEXES:
+            print(f"M11:   {name}")
+            _create_index_concurrently(bind, table, name, columns)
+
+    print("M11: Upgrade completado.")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        for table, name, _ in reversed(FK_INDEXES + FILTER_INDEXES):
+            print(f"M11: Eliminando índice '{name}'...")
+            if _is_partitioned(bind, table):
+                # Borrar el índice del padre borra también los de cada partición
+                op.execute(f'DROP INDEX IF EXISTS "{name}"')
+            else:
+                op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+    print("M11: Downgrade completado.")
@@ -0,0 +1,136 @@
+"""M17_Propagar_updated_at_a_padres_sync
+
+Revision ID: a8d3f6c2b914
+Revises: f4c9e3a7b215
+Create Date: 2026-10-19 18:05:12.417630
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d3f6c2b914'
+down_revision: Union[str, Sequence[str], None] = 'f4c9e3a7b215'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Las respuestas de /sync embeben copias de otras tablas (crud.SYNC_ENTITIES):
+#   owners       -> pets (PetSimple: name, species)
+#   pets         -> owner (OwnerSimple: first_name, last_name, email)
+#   appointments -> pet (PetSimple) y veterinarian (VeterinarianSimple)
+#   invoices     -> appointment completa (con su pet y su veterinarian)
+# Si cambia la fila embebida hay que "tocar" la que la embebe para que su
+# updated_at avance y el cliente la vuelva a recibir. El toque es un
+# UPDATE ... SET updated_at, que no dispara estos triggers (solo escuchan las
+# columnas embebidas), así que no hay ciclos.
+TOUCH_TRIGGERS = {
+    # trigger: (tabla, eventos, función)
+    'trg_pets_touch_sync_parents': (
+        'pets', 'INSERT OR DELETE OR UPDATE OF name, species, owner_id', 'touch_sync_parents_of_pet'),
+    'trg_owners_touch_sync_parents': (
+        'owners', 'UPDATE OF first_name, last_name, email', 'touch_sync_parents_of_owner'),
+    'trg_veterinarians_touch_sync_parents': (
+        'veterinarians', 'UPDATE OF first_name, last_name, specialization', 'touch_sync_parents_of_veterinarian'),
+    # INSERT: un cambio de appointment_date que mueve la fila de partición
+    # llega como DELETE + INSERT, no como UPDATE
+    'trg_appointments_touch_sync_parents': (
+        'appointments',
+        'INSERT OR UPDATE OF pet_id, veterinarian_id, appointment_date, reason, status, notes, series_id',
+        'touch_sync_parents_of_appointment'),
+}
+
+
+def upgrade() -> None:
+    """
+    Paso 1: Funciones de trigger que suben updated_at de las filas que embeben
+            a la que cambió (también la factura de una cita, a través de su
+            mascota o su veterinario).
+    Paso 2: Triggers AFTER limitados a las columnas que salen en las copias,
+            para no tocar a los padres con los contadores (visit_count,
+            total_appointments) que cambian en cada cita.
+    """
+    print("M17: Creando funciones de trigger para propagar updated_at...")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION touch_sync_parents_of_pet() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND NEW.name IS NOT DISTINCT FROM OLD.name
+               AND NEW.species IS NOT DISTINCT FROM OLD.species
+               AND NEW.owner_id IS NOT DISTINCT FROM OLD.owner_id THEN
+                RETURN NULL;
+            END IF;
+            -- Dueño anterior y nuevo (owners.pets)
+            UPDATE owners SET updated_at = clock_timestamp()
+            WHERE owner_id IN (
+                CASE WHEN TG_OP <> 'INSERT' THEN OLD.owner_id END,
+                CASE WHEN TG_OP <> 'DELETE' THEN NEW.owner_id END
+            );
+            -- Citas y facturas (appointments.pet, invoices.appointment.pet)
+            IF TG_OP = 'UPDATE' AND (NEW.name IS DISTINCT FROM OLD.name
+                                     OR NEW.species IS DISTINCT FROM OLD.species) THEN
+                UPDATE appointments SET updated_at = clock_timestamp() WHERE pet_id = NEW.pet_id;
+                UPDATE invoices SET updated_at = clock_timestamp()
+                WHERE appointment_id IN (SELECT appointment_id FROM appointments WHERE pet_id = NEW.pet_id);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION touch_sync_parents_of_owner() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.first_name IS DISTINCT FROM OLD.first_name
+               OR NEW.last_name IS DISTINCT FROM OLD.last_name
+               OR NEW.email IS DISTINCT FROM OLD.email THEN
+                UPDATE pets SET updated_at = clock_timestamp() WHERE owner_id = NEW.owner_id;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION touch_sync_parents_of_veterinarian() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.first_name IS DISTINCT FROM OLD.first_name
+               OR NEW.last_name IS DISTINCT FROM OLD.last_name
+               OR NEW.specialization IS DISTINCT FROM OLD.specialization THEN
+                UPDATE appointments SET updated_at = clock_timestamp() WHERE veterinarian_id = NEW.veterinarian_id;
+                UPDATE invoices SET updated_at = clock_timestamp()
+                WHERE appointment_id IN (
+                    SELECT appointment_id FROM appointments WHERE veterinarian_id = NEW.veterinarian_id
+                );
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION touch_sync_parents_of_appointment() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND (to_jsonb(NEW) - 'updated_at') = (to_jsonb(OLD) - 'updated_at') THEN
+                RETURN NULL;
+            END IF;
+            UPDATE invoices SET updated_at = clock_timestamp() WHERE appointment_id = NEW.appointment_id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    for trigger, (table, events, function) in TOUCH_TRIGGERS.items():
+        print(f"M17: Creando trigger '{trigger}' en '{table}'...")
+        op.execute(f"""
+            CREATE TRIGGER {trigger}
+            AFTER {events} ON {table}
+            FOR EACH ROW EXECUTE FUNCTION {function}();
+        """)
+
+    print("M17: Upgrade completado.")
+
+
+def downgrade() -> None:
+    print("M17: Eliminando triggers de propagación de updated_at...")
+    for trigger, (table, _, function) in TOUCH_TRIGGERS.items():
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {table}")
+        op.execute(f"DROP FUNCTION IF EXISTS {function}()")
+    print("M17: Downgrade completado.")
@@ -0,0 +1,48 @@
+"""M12_Agregar_tabla_job_runs
+
+Revision ID: b7e4f19c3d62
+Revises: a5d8e2c0f947
+Create Date: 2026-10-18 19:14:27.604183
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e4f19c3d62'
+down_revision: Union[str, Sequence[str], None] = 'a5d8e2c0f947'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Paso 1: Tabla 'job_runs': una fila por corrida de cada tarea programada
+            (app/jobs.py) con su duración, filas afectadas y resultado.
+    """
+    print("M12: Creando tabla 'job_runs'...")
+    op.create_table('job_runs',
+        sa.Column('job_run_id', sa.BigInteger(), nullable=False),
+        sa.Column('job_name', sa.String(length=50), nullable=False),
+        sa.Column('started_at', sa.TIMESTAMP(), nullable=False),
+        sa.Column('finished_at', sa.TIMESTAMP(), nullable=False),
+        sa.Column('duration_ms', sa.Integer(), nullable=False),
+        sa.Column('rows_affected', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('details', postgresql.JSONB(), nullable=True),
+        sa.PrimaryKeyConstraint('job_run_id')
+    )
+    op.create_index('ix_job_runs_job_name_started_at', 'job_runs', ['job_name', 'started_at'])
+    print("M12: Upgrade completado.")
+
+
+def downgrade() -> None:
+    print("M12: Eliminando tabla 'job_runs'...")
+    op.drop_index('ix_job_runs_job_name_started_at', table_name='job_runs')
+    op.drop_table('job_runs')
+    print("M12: Downgrade completado.")
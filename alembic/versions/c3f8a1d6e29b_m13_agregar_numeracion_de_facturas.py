@@ -0,0 +1,49 @@
+"""M13_Agregar_numeracion_de_facturas
+
+Revision ID: c3f8a1d6e29b
+Revises: b7e4f19c3d62
+Create Date: 2026-10-18 20:02:11.318406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f8a1d6e29b'
+down_revision: Union[str, Sequence[str], None] = 'b7e4f19c3d62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Números que reserva cada proceso por nextval() en el modo 'blocks' (app/numbering.py)
+INVOICE_NUMBER_BLOCK = 50
+
+
+def upgrade() -> None:
+    """
+    Paso 1: Secuencia 'invoice_number_seq' (modo 'blocks', tolera huecos).
+            Su INCREMENT BY es el tamaño del bloque que reserva cada proceso.
+    Paso 2: Tabla 'invoice_number_counters' (modo 'gapless'): un contador por
+            serie (prefijo-año) que se incrementa dentro de la transacción.
+    Las facturas existentes conservan su número; los nuevos usan el formato
+    PREFIJO-AAAA-NNNNNN, que no choca con los anteriores.
+    """
+    print("M13: Creando secuencia 'invoice_number_seq'...")
+    op.execute(f"CREATE SEQUENCE invoice_number_seq INCREMENT BY {INVOICE_NUMBER_BLOCK} START WITH 1 MINVALUE 1")
+
+    print("M13: Creando tabla 'invoice_number_counters'...")
+    op.create_table('invoice_number_counters',
+        sa.Column('series', sa.String(length=50), nullable=False),
+        sa.Column('last_value', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('series')
+    )
+    print("M13: Upgrade completado.")
+
+
+def downgrade() -> None:
+    print("M13: Eliminando numeración de facturas...")
+    op.drop_table('invoice_number_counters')
+    op.execute("DROP SEQUENCE IF EXISTS invoice_number_seq")
+    print("M13: Downgrade completado.")
@@ -0,0 +1,88 @@
+"""M7_Agregar_busqueda_trigram_y_full_text
+
+Revision ID: c4e1a7d2f9b3
+Revises: 0a2f2da6a729
+Create Date: 2026-10-18 09:12:40.118230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e1a7d2f9b3'
+down_revision: Union[str, Sequence[str], None] = '0a2f2da6a729'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Añade columnas generadas (STORED) para la búsqueda y sus índices GIN.
+    - search_text: texto normalizado (lower) para búsqueda difusa con pg_trgm.
+    - search_vector: tsvector para búsqueda full-text con ranking.
+    Al ser columnas generadas, PostgreSQL las mantiene solas en cada INSERT/UPDATE.
+    """
+    print("M7: Activando extensión pg_trgm...")
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # --- OWNERS: nombre, email y teléfono ---
+    print("M7: Añadiendo columnas de búsqueda a 'owners'...")
+    op.execute("""
+        ALTER TABLE owners
+        ADD COLUMN search_text text GENERATED ALWAYS AS (
+            lower(first_name || ' ' || last_name || ' ' || email || ' ' || coalesce(phone, ''))
+        ) STORED,
+        ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', first_name || ' ' || last_name), 'A') ||
+            setweight(to_tsvector('simple', email || ' ' || coalesce(phone, '')), 'B')
+        ) STORED
+    """)
+    op.execute("CREATE INDEX ix_owners_search_text_trgm ON owners USING gin (search_text gin_trgm_ops)")
+    op.execute("CREATE INDEX ix_owners_search_vector ON owners USING gin (search_vector)")
+
+    # --- PETS: nombre y microchip ---
+    print("M7: Añadiendo columnas de búsqueda a 'pets'...")
+    op.execute("""
+        ALTER TABLE pets
+        ADD COLUMN search_text text GENERATED ALWAYS AS (
+            lower(name || ' ' || coalesce(microchip_number, ''))
+        ) STORED,
+        ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', name), 'A') ||
+            setweight(to_tsvector('simple', coalesce(microchip_number, '')), 'A')
+        ) STORED
+    """)
+    op.execute("CREATE INDEX ix_pets_search_text_trgm ON pets USING gin (search_text gin_trgm_ops)")
+    op.execute("CREATE INDEX ix_pets_search_vector ON pets USING gin (search_vector)")
+
+    # --- MEDICAL RECORDS: diagnóstico, tratamiento y receta (texto clínico en español) ---
+    print("M7: Añadiendo columnas de búsqueda a 'medical_records'...")
+    op.execute("""
+        ALTER TABLE medical_records
+        ADD COLUMN search_text text GENERATED ALWAYS AS (
+            lower(diagnosis || ' ' || treatment || ' ' || coalesce(prescription, ''))
+        ) STORED,
+        ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('spanish', diagnosis), 'A') ||
+            setweight(to_tsvector('spanish', treatment), 'B') ||
+            setweight(to_tsvector('spanish', coalesce(prescription, '')), 'C')
+        ) STORED
+    """)
+    op.execute("CREATE INDEX ix_medical_records_search_text_trgm ON medical_records USING gin (search_text gin_trgm_ops)")
+    op.execute("CREATE INDEX ix_medical_records_search_vector ON medical_records USING gin (search_vector)")
+
+    print("M7: Upgrade completado.")
+
+
+def downgrade() -> None:
+    print("M7: Eliminando índices y columnas de búsqueda...")
+    for table in ('medical_records', 'pets', 'owners'):
+        op.execute(f"DROP INDEX IF EXISTS ix_{table}_search_vector")
+        op.execute(f"DROP INDEX IF EXISTS ix_{table}_search_text_trgm")
+        op.drop_column(table, 'search_vector')
+        op.drop_column(table, 'search_text')
+    # La extensión pg_trgm se deja instalada: puede usarse fuera de esta migración.
+    print("M7: Downgrade completado.")
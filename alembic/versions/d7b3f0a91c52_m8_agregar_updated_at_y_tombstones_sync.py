@@ -0,0 +1,95 @@
+"""M8_Agregar_updated_at_y_tombstones_sync
+
+Revision ID: d7b3f0a91c52
+Revises: c4e1a7d2f9b3
+Create Date: 2026-10-18 11:40:02.551907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7b3f0a91c52'
+down_revision: Union[str, Sequence[str], None] = 'c4e1a7d2f9b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Tabla -> nombre de su clave primaria (lo usa el trigger de tombstones)
+SYNC_TABLES = {
+    'owners': 'owner_id',
+    'pets': 'pet_id',
+    'appointments': 'appointment_id',
+    'invoices': 'invoice_id',
+}
+
+
+def upgrade() -> None:
+    """
+    Paso 1: Columna 'updated_at' (con índice) en las tablas sincronizables.
+    Paso 2: Trigger que la actualiza en CUALQUIER UPDATE (también en SQL masivo).
+    Paso 3: Tabla 'sync_tombstones' alimentada por un trigger AFTER DELETE,
+            así los borrados en cascada también llegan a los clientes.
+    """
+    print("M8: Creando funciones de trigger para sincronización...")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := clock_timestamp();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION record_sync_tombstone() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO sync_tombstones (entity, entity_id)
+            VALUES (TG_TABLE_NAME, (to_jsonb(OLD) ->> TG_ARGV[0])::integer);
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    print("M8: Creando tabla 'sync_tombstones'...")
+    op.create_table('sync_tombstones',
+        sa.Column('tombstone_id', sa.BigInteger(), nullable=False),
+        sa.Column('entity', sa.String(length=30), nullable=False),
+        sa.Column('entity_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.TIMESTAMP(), server_default=sa.text('clock_timestamp()'), nullable=False),
+        sa.PrimaryKeyConstraint('tombstone_id')
+    )
+    op.create_index('ix_sync_tombstones_entity_deleted_at', 'sync_tombstones', ['entity', 'deleted_at'])
+
+    for table, pk in SYNC_TABLES.items():
+        print(f"M8: Añadiendo 'updated_at' y triggers a '{table}'...")
+        op.add_column(table, sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False))
+        op.create_index(f'ix_{table}_updated_at', table, ['updated_at', pk])
+        op.execute(f"""
+            CREATE TRIGGER trg_{table}_set_updated_at
+            BEFORE UPDATE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+        """)
+        op.execute(f"""
+            CREATE TRIGGER trg_{table}_sync_tombstone
+            AFTER DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION record_sync_tombstone('{pk}');
+        """)
+
+    print("M8: Upgrade completado.")
+
+
+def downgrade() -> None:
+    print("M8: Eliminando triggers, columnas 'updated_at' y tombstones...")
+    for table in SYNC_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_sync_tombstone ON {table}")
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_set_updated_at ON {table}")
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+        op.drop_column(table, 'updated_at')
+
+    op.drop_index('ix_sync_tombstones_entity_deleted_at', table_name='sync_tombstones')
+    op.drop_table('sync_tombstones')
+    op.execute("DROP FUNCTION IF EXISTS record_sync_tombstone()")
+    op.execute("DROP FUNCTION IF EXISTS set_updated_at()")
+    print("M8: Downgrade completado.")
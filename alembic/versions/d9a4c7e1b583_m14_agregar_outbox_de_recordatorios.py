@@ -0,0 +1,76 @@
+"""M14_Agregar_outbox_de_recordatorios
+
+Revision ID: d9a4c7e1b583
+Revises: c3f8a1d6e29b
+Create Date: 2026-10-19 09:41:06.527913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9a4c7e1b583'
+down_revision: Union[str, Sequence[str], None] = 'c3f8a1d6e29b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Paso 1: Tabla 'reminder_outbox': un mensaje por dueño con todas sus dosis
+            próximas (items JSONB), más su estado de envío y reintentos.
+    Paso 2: Tabla 'reminder_outbox_items': qué dosis (vaccination_id) ya fueron
+            incluidas en un mensaje; su PK evita recordar dos veces la misma.
+    Paso 3: Índice en vaccination_records.next_dose_date (alertas y recordatorios).
+    """
+    print("M14: Creando tabla 'reminder_outbox'...")
+    op.create_table('reminder_outbox',
+        sa.Column('message_id', sa.BigInteger(), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(length=255), nullable=False),
+        sa.Column('kind', sa.String(length=30), nullable=False),
+        sa.Column('items', postgresql.JSONB(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.TIMESTAMP(), nullable=False, server_default=sa.text('now()')),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=False, server_default=sa.text('now()')),
+        sa.Column('sent_at', sa.TIMESTAMP(), nullable=True),
+        sa.ForeignKeyConstraint(['owner_id'], ['owners.owner_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('message_id')
+    )
+    op.create_index('ix_reminder_outbox_owner_id', 'reminder_outbox', ['owner_id'])
+    # El worker solo mira los pendientes: índice parcial, pequeño aunque haya millones de enviados
+    op.create_index('ix_reminder_outbox_pending', 'reminder_outbox', ['next_attempt_at'],
+                    postgresql_where=sa.text("status = 'pending'"))
+
+    print("M14: Creando tabla 'reminder_outbox_items'...")
+    op.create_table('reminder_outbox_items',
+        sa.Column('vaccination_id', sa.Integer(), nullable=False),
+        sa.Column('message_id', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['vaccination_id'], ['vaccination_records.vaccination_id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['message_id'], ['reminder_outbox.message_id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('vaccination_id')
+    )
+    op.create_index('ix_reminder_outbox_items_message_id', 'reminder_outbox_items', ['message_id'])
+
+    print("M14: Indexando 'vaccination_records.next_dose_date' (CONCURRENTLY)...")
+    with op.get_context().autocommit_block():
+        op.create_index('ix_vaccination_records_next_dose_date', 'vaccination_records', ['next_dose_date'],
+                        postgresql_concurrently=True, if_not_exists=True)
+    print("M14: Upgrade completado.")
+
+
+def downgrade() -> None:
+    print("M14: Eliminando outbox de recordatorios...")
+    op.drop_index('ix_vaccination_records_next_dose_date', table_name='vaccination_records')
+    op.drop_index('ix_reminder_outbox_items_message_id', table_name='reminder_outbox_items')
+    op.drop_table('reminder_outbox_items')
+    op.drop_index('ix_reminder_outbox_pending', table_name='reminder_outbox')
+    op.drop_index('ix_reminder_outbox_owner_id', table_name='reminder_outbox')
+    op.drop_table('reminder_outbox')
+    print("M14: Downgrade completado.")
@@ -0,0 +1,317 @@
+"""M9_Particionar_appointments_e_invoices
+
+Revision ID: e3a9c5d17b40
+Revises: d7b3f0a91c52
+Create Date: 2026-10-18 15:12:47.208331
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3a9c5d17b40'
+down_revision: Union[str, Sequence[str], None] = 'd7b3f0a91c52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Tabla -> (columna de partición, clave primaria, meses futuros a crear)
+PARTITIONED_TABLES = {
+    'appointments': ('appointment_date', 'appointment_id', 12),
+    'invoices': ('issue_date', 'invoice_id', 3),
+}
+
+
+# --- Funciones SQL ---
+CREATE_MONTHLY_PARTITIONS = """
+    CREATE OR REPLACE FUNCTION create_monthly_partitions(p_table text, p_from date, p_to date)
+    RETURNS integer AS $$
+    DECLARE
+        month_start date := date_trunc('month', p_from)::date;
+        partition_name text;
+        created integer := 0;
+    BEGIN
+        -- Serializa a quien cree particiones de la misma tabla (API, cron, migración)
+        PERFORM pg_advisory_xact_lock(hashtext('create_monthly_partitions:' || p_table));
+        WHILE month_start <= p_to LOOP
+            partition_name := p_table || '_p' || to_char(month_start, 'YYYY_MM');
+            IF to_regclass(partition_name) IS NULL THEN
+                -- CREATE + ATTACH (y no CREATE ... PARTITION OF) para tomar solo
+                -- SHARE UPDATE EXCLUSIVE sobre el padre: no bloquea lecturas ni escrituras.
+                EXECUTE format('CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                               partition_name, p_table);
+                EXECUTE format('ALTER TABLE %I ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                               p_table, partition_name, month_start, (month_start + interval '1 month')::date);
+                created := created + 1;
+            END IF;
+            month_start := (month_start + interval '1 month')::date;
+        END LOOP;
+        RETURN created;
+    END;
+    $$ LANGUAGE plpgsql SET lock_timeout = '5s';
+"""
+
+# medical_records e invoices guardan la fecha de la cita para poder tener una FK
+# real contra (appointment_id, appointment_date). El código sigue asignando solo
+# appointment_id: este trigger completa la fecha.
+FILL_APPOINTMENT_DATE = """
+    CREATE OR REPLACE FUNCTION fill_appointment_date() RETURNS trigger AS $$
+    BEGIN
+        IF NEW.appointment_id IS NULL THEN
+            NEW.appointment_date := NULL;
+        ELSIF TG_OP = 'INSERT' OR NEW.appointment_id IS DISTINCT FROM OLD.appointment_id
+              OR NEW.appointment_date IS NULL THEN
+            SELECT appointment_date INTO NEW.appointment_date
+            FROM appointments WHERE appointment_id = NEW.appointment_id;
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+# Un índice UNIQUE en una tabla particionada debe incluir la columna de partición,
+# así que la unicidad global de invoice_number y appointment_id vive en una tabla
+# normal mantenida por trigger (un UNIQUE de verdad, sin carreras).
+SYNC_INVOICE_KEYS = """
+    CREATE OR REPLACE FUNCTION sync_invoice_keys() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM invoice_keys WHERE invoice_id = OLD.invoice_id;
+            RETURN OLD;
+        ELSIF TG_OP = 'INSERT' THEN
+            INSERT INTO invoice_keys (invoice_id, invoice_number, appointment_id)
+            VALUES (NEW.invoice_id, NEW.invoice_number, NEW.appointment_id);
+        ELSE
+            UPDATE invoice_keys
+            SET invoice_number = NEW.invoice_number, appointment_id = NEW.appointment_id
+            WHERE invoice_id = OLD.invoice_id;
+        END IF;
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+# Igual que en M8, pero: TG_TABLE_NAME en una partición es el nombre de la hoja
+# (ej. appointments_p2026_03), así que la entidad llega como 2º argumento; y un
+# UPDATE que cambia la fecha MUEVE la fila de partición (DELETE + INSERT), lo que
+# dispara el AFTER DELETE aunque la fila siga existiendo.
+RECORD_SYNC_TOMBSTONE_M9 = """
+    CREATE OR REPLACE FUNCTION record_sync_tombstone() RETURNS trigger AS $$
+    DECLARE
+        deleted_id integer := (to_jsonb(OLD) ->> TG_ARGV[0])::integer;
+        still_exists boolean := false;
+    BEGIN
+        IF TG_NARGS > 1 THEN
+            EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE %I = $1)', TG_ARGV[1], TG_ARGV[0])
+            INTO still_exists USING deleted_id;
+        END IF;
+        IF NOT still_exists THEN
+            INSERT INTO sync_tombstones (entity, entity_id)
+            VALUES (COALESCE(TG_ARGV[1], TG_TABLE_NAME), deleted_id);
+        END IF;
+        RETURN OLD;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+RECORD_SYNC_TOMBSTONE_M8 = """
+    CREATE OR REPLACE FUNCTION record_sync_tombstone() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO sync_tombstones (entity, entity_id)
+        VALUES (TG_TABLE_NAME, (to_jsonb(OLD) ->> TG_ARGV[0])::integer);
+        RETURN OLD;
+    END;
+    $$ LANGUAGE plpgsql;
+"""
+
+
+# --- Helpers ---
+def _drop_foreign_keys_to(table: str) -> None:
+    """Elimina todas las FKs que apuntan a 'table' (sus nombres dependen de la versión de cada migración)."""
+    op.execute(f"""
+        DO $$
+        DECLARE fk record;
+        BEGIN
+            FOR fk IN SELECT conrelid::regclass AS tbl, conname FROM pg_constraint
+                      WHERE contype = 'f' AND confrelid = '{table}'::regclass
+            LOOP
+                EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', fk.tbl, fk.conname);
+            END LOOP;
+        END $$;
+    """)
+
+def _rebuild(table: str, partition_by: str = None) -> None:
+    """
+    Recrea 'table' con los mismos datos, particionada por 'partition_by' (o sin
+    particionar si es None). Copia columnas, defaults y CHECKs; la secuencia del
+    id pasa a la tabla nueva. PK, FKs, índices y triggers los agrega quien llama.
+    """
+    column, pk, months_ahead = PARTITIONED_TABLES[table]
+    old = f"{table}_old"
+    op.execute(f"ALTER TABLE {table} RENAME TO {old}")
+    suffix = f" PARTITION BY RANGE ({partition_by})" if partition_by else ""
+    op.execute(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS INCLUDING CONSTRAINTS){suffix}")
+    if partition_by:
+        # Desde el mes del dato más antiguo hasta 'months_ahead' meses en el futuro
+        # (o hasta el dato más lejano, si hay citas/facturas cargadas más adelante)
+        op.execute(f"""
+            SELECT create_monthly_partitions(
+                '{table}',
+                COALESCE((SELECT min({column})::date FROM {old}), current_date),
+                GREATEST((SELECT max({column})::date FROM {old}),
+                         (current_date + interval '{months_ahead} months')::date)
+            )
+        """)
+    op.execute(f"INSERT INTO {table} SELECT * FROM {old}")
+    op.execute(f"""
+        DO $$
+        BEGIN
+            EXECUTE format('ALTER SEQUENCE %s OWNED BY {table}.{pk}', pg_get_serial_sequence('{old}', '{pk}'));
+        END $$;
+    """)
+    op.execute(f"DROP TABLE {old}")
+
+def _create_sync_triggers(table: str, pk: str, entity_arg: bool) -> None:
+    args = f"'{pk}', '{table}'" if entity_arg else f"'{pk}'"
+    op.execute(f"""
+        CREATE TRIGGER trg_{table}_set_updated_at
+        BEFORE UPDATE ON {table}
+        FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+    """)
+    op.execute(f"""
+        CREATE TRIGGER trg_{table}_sync_tombstone
+        AFTER DELETE ON {table}
+        FOR EACH ROW EXECUTE FUNCTION record_sync_tombstone({args});
+    """)
+
+def _create_fill_trigger(table: str) -> None:
+    op.execute(f"""
+        CREATE TRIGGER trg_{table}_fill_appointment_date
+        BEFORE INSERT OR UPDATE OF appointment_id ON {table}
+        FOR EACH ROW EXECUTE FUNCTION fill_appointment_date();
+    """)
+
+
+def upgrade() -> None:
+    """
+    Paso 1: Funciones (creación de particiones, fecha de la cita, unicidad de facturas).
+    Paso 2: 'appointments' particionada por mes en appointment_date. PK (appointment_id, appointment_date).
+    Paso 3: 'medical_records' e 'invoices' guardan appointment_date y referencian la PK compuesta
+            (ON UPDATE CASCADE: reprogramar una cita actualiza a sus hijos).
+    Paso 4: 'invoices' particionada por mes en issue_date. PK (invoice_id, issue_date) y
+            unicidad de invoice_number / appointment_id en 'invoice_keys'.
+    Requiere PostgreSQL 15 (FKs hacia tablas particionadas con UPDATE que mueve filas).
+    """
+    print("M9: Creando funciones de particionado...")
+    op.execute(CREATE_MONTHLY_PARTITIONS)
+    op.execute(FILL_APPOINTMENT_DATE)
+    op.execute(SYNC_INVOICE_KEYS)
+    op.execute(RECORD_SYNC_TOMBSTONE_M9)
+
+    print("M9: Guardando appointment_date en 'medical_records' e 'invoices'...")
+    _drop_foreign_keys_to('appointments')
+    for child in ('medical_records', 'invoices'):
+        op.add_column(child, sa.Column('appointment_date', sa.TIMESTAMP(), nullable=True))
+        op.execute(f"""
+            UPDATE {child} AS c SET appointment_date = a.appointment_date
+            FROM appointments AS a WHERE a.appointment_id = c.appointment_id
+        """)
+    op.alter_column('medical_records', 'appointment_date', nullable=False)
+
+    print("M9: Particionando 'appointments' por mes (appointment_date)...")
+    _rebuild('appointments', partition_by='appointment_date')
+    op.create_primary_key('appointments_pkey', 'appointments', ['appointment_id', 'appointment_date'])
+    op.create_foreign_key('appointments_pet_id_fkey', 'appointments', 'pets', ['pet_id'], ['pet_id'])
+    op.create_foreign_key('appointments_veterinarian_id_fkey', 'appointments', 'veterinarians',
+                          ['veterinarian_id'], ['veterinarian_id'])
+    op.create_index('ix_appointments_appointment_id', 'appointments', ['appointment_id'])
+    op.create_index('ix_appointments_updated_at', 'appointments', ['updated_at', 'appointment_id'])
+    _create_sync_triggers('appointments', 'appointment_id', entity_arg=True)
+
+    print("M9: Particionando 'invoices' por mes (issue_date)...")
+    _drop_foreign_keys_to('invoices')
+    _rebuild('invoices', partition_by='issue_date')
+    op.create_primary_key('invoices_pkey', 'invoices', ['invoice_id', 'issue_date'])
+    op.create_index('ix_invoices_invoice_id', 'invoices', ['invoice_id'])
+    op.create_index('ix_invoices_invoice_number', 'invoices', ['invoice_number'])
+    op.create_index('ix_invoices_appointment_id', 'invoices', ['appointment_id', 'appointment_date'])
+    op.create_index('ix_invoices_updated_at', 'invoices', ['updated_at', 'invoice_id'])
+    _create_sync_triggers('invoices', 'invoice_id', entity_arg=True)
+
+    print("M9: Creando 'invoice_keys' (unicidad global de facturas)...")
+    op.create_table('invoice_keys',
+        sa.Column('invoice_id', sa.Integer(), nullable=False),
+        sa.Column('invoice_number', sa.String(length=50), nullable=False),
+        sa.Column('appointment_id', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('invoice_id'),
+        sa.UniqueConstraint('invoice_number', name='uq_invoice_keys_invoice_number'),
+        sa.UniqueConstraint('appointment_id', name='uq_invoice_keys_appointment_id'),
+    )
+    op.execute("""
+        INSERT INTO invoice_keys (invoice_id, invoice_number, appointment_id)
+        SELECT invoice_id, invoice_number, appointment_id FROM invoices
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_invoices_sync_keys
+        AFTER INSERT OR DELETE OR UPDATE OF invoice_number, appointment_id ON invoices
+        FOR EACH ROW EXECUTE FUNCTION sync_invoice_keys();
+    """)
+
+    print("M9: Restaurando FKs 1:1 hacia 'appointments' (clave compuesta)...")
+    op.create_foreign_key('medical_records_appointment_fkey', 'medical_records', 'appointments',
+                          ['appointment_id', 'appointment_date'], ['appointment_id', 'appointment_date'],
+                          ondelete='CASCADE', onupdate='CASCADE')
+    # MATCH FULL: o ambas columnas son NULL (factura sin cita) o la cita existe
+    op.create_foreign_key('invoices_appointment_fkey', 'invoices', 'appointments',
+                          ['appointment_id', 'appointment_date'], ['appointment_id', 'appointment_date'],
+                          ondelete='SET NULL', onupdate='CASCADE', match='FULL')
+    _create_fill_trigger('medical_records')
+    _create_fill_trigger('invoices')
+
+    op.execute("ANALYZE appointments")
+    op.execute("ANALYZE invoices")
+    print("M9: Upgrade completado.")
+
+
+def downgrade() -> None:
+    """Vuelve a tablas normales con las mismas filas (las particiones se funden en una)."""
+    print("M9: Eliminando triggers y FKs compuestas...")
+    op.execute("DROP TRIGGER IF EXISTS trg_medical_records_fill_appointment_date ON medical_records")
+    op.drop_constraint('medical_records_appointment_fkey', 'medical_records', type_='foreignkey')
+    op.drop_table('invoice_keys')
+
+    print("M9: Convirtiendo 'invoices' en tabla normal...")
+    _rebuild('invoices')
+    op.drop_column('invoices', 'appointment_date')
+    op.create_primary_key('invoices_pkey', 'invoices', ['invoice_id'])
+    op.create_unique_constraint('invoices_appointment_id_key', 'invoices', ['appointment_id'])
+    op.create_unique_constraint('invoices_invoice_number_key', 'invoices', ['invoice_number'])
+    op.create_index('ix_invoices_invoice_id', 'invoices', ['invoice_id'])
+    op.create_index('ix_invoices_invoice_number', 'invoices', ['invoice_number'], unique=True)
+    op.create_index('ix_invoices_updated_at', 'invoices', ['updated_at', 'invoice_id'])
+    _create_sync_triggers('invoices', 'invoice_id', entity_arg=False)
+
+    print("M9: Convirtiendo 'appointments' en tabla normal...")
+    _rebuild('appointments')
+    op.create_primary_key('appointments_pkey', 'appointments', ['appointment_id'])
+    op.create_foreign_key('appointments_pet_id_fkey', 'appointments', 'pets', ['pet_id'], ['pet_id'])
+    op.create_foreign_key('appointments_veterinarian_id_fkey', 'appointments', 'veterinarians',
+                          ['veterinarian_id'], ['veterinarian_id'])
+    op.create_index('ix_appointments_appointment_id', 'appointments', ['appointment_id'])
+    op.create_index('ix_appointments_updated_at', 'appointments', ['updated_at', 'appointment_id'])
+    _create_sync_triggers('appointments', 'appointment_id', entity_arg=False)
+
+    print("M9: Restaurando FKs simples hacia 'appointments'...")
+    op.drop_column('medical_records', 'appointment_date')
+    op.create_foreign_key('medical_records_appointment_id_fkey', 'medical_records', 'appointments',
+                          ['appointment_id'], ['appointment_id'], ondelete='CASCADE')
+    op.create_foreign_key('invoices_appointment_id_fkey', 'invoices', 'appointments',
+                          ['appointment_id'], ['appointment_id'], ondelete='SET NULL')
+
+    op.execute(RECORD_SYNC_TOMBSTONE_M8)
+    op.execute("DROP FUNCTION IF EXISTS sync_invoice_keys()")
+    op.execute("DROP FUNCTION IF EXISTS fill_appointment_date()")
+    op.execute("DROP FUNCTION IF EXISTS create_monthly_partitions(text, date, date)")
+    print("M9: Downgrade completado.")
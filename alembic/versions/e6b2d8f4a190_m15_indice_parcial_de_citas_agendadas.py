@@ -0,0 +1,79 @@
+"""M15_Indice_parcial_de_citas_agendadas
+
+Revision ID: e6b2d8f4a190
+Revises: d9a4c7e1b583
+Create Date: 2026-10-19 11:08:52.164730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6b2d8f4a190'
+down_revision: Union[str, Sequence[str], None] = 'd9a4c7e1b583'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX_NAME = 'ix_appointments_scheduled_vet_date'
+COLUMNS = 'veterinarian_id, appointment_date'
+PREDICATE = "status = 'scheduled'"
+
+
+def _partitions_of(bind, table: str) -> list:
+    return bind.execute(sa.text("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:table AS regclass) ORDER BY c.relname
+    """), {"table": table}).scalars().all()
+
+def _attached_partitions(bind, index: str) -> set:
+    return set(bind.execute(sa.text("""
+        SELECT t.relname FROM pg_inherits i
+        JOIN pg_index x ON x.indexrelid = i.inhrelid
+        JOIN pg_class t ON t.oid = x.indrelid
+        WHERE i.inhparent = CAST(:index AS regclass)
+    """), {"index": index}).scalars())
+
+def _drop_if_invalid(bind, name: str) -> None:
+    invalid = bind.execute(sa.text("""
+        SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = :name AND c.relkind = 'i'
+    """), {"name": name}).scalar()
+    if invalid:
+        op.execute(f'DROP INDEX CONCURRENTLY "{name}"')
+
+
+def upgrade() -> None:
+    """
+    Paso 1: Índice parcial de citas agendadas por veterinario y fecha.
+            Las consultas de agenda (pendientes, choques de horario, citas
+            activas antes de borrar) filtran status = 'scheduled'; el índice
+            solo contiene esas filas, así que las canceladas/completadas (la
+            gran mayoría con el tiempo) no se recorren ni ocupan espacio.
+    Mismo procedimiento que M11 para la tabla particionada: índice ON ONLY en
+    el padre, CONCURRENTLY en cada partición y ATTACH.
+    """
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        print(f"M15: Creando índice parcial '{INDEX_NAME}' ({PREDICATE})...")
+        op.execute(f'CREATE INDEX IF NOT EXISTS "{INDEX_NAME}" ON ONLY appointments ({COLUMNS}) WHERE {PREDICATE}')
+        attached = _attached_partitions(bind, INDEX_NAME)
+        for partition in _partitions_of(bind, 'appointments'):
+            if partition in attached:
+                continue
+            partition_index = f"{partition}_scheduled_vet_date_idx"
+            print(f"M15:   {partition_index}")
+            _drop_if_invalid(bind, partition_index)
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{partition_index}" '
+                       f'ON "{partition}" ({COLUMNS}) WHERE {PREDICATE}')
+            op.execute(f'ALTER INDEX "{INDEX_NAME}" ATTACH PARTITION "{partition_index}"')
+    print("M15: Upgrade completado.")
+
+
+def downgrade() -> None:
+    print(f"M15: Eliminando índice '{INDEX_NAME}'...")
+    # Borrar el índice del padre borra también los de cada partición
+    op.execute(f'DROP INDEX IF EXISTS "{INDEX_NAME}"')
+    print("M15: Downgrade completado.")
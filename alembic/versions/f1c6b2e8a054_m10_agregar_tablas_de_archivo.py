@@ -0,0 +1,120 @@
+"""M10_Agregar_tablas_de_archivo
+
+Revision ID: f1c6b2e8a054
+Revises: e3a9c5d17b40
+Create Date: 2026-10-18 16:31:09.774120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c6b2e8a054'
+down_revision: Union[str, Sequence[str], None] = 'e3a9c5d17b40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ARCHIVE_TABLES = ('archived_appointments', 'archived_medical_records', 'archived_invoices')
+
+
+def upgrade() -> None:
+    """
+    Paso 1: Tablas de archivo (almacenamiento frío) para citas cerradas antiguas,
+            sus historiales médicos y sus facturas pagadas.
+            Solo las columnas de búsqueda van como columnas; la fila completa se
+            guarda en 'data' (JSONB comprimido con lz4 si el servidor lo soporta).
+    Las llena app/archive.py (python -m app.archive).
+    """
+    print("M10: Creando tabla 'archived_appointments'...")
+    op.create_table('archived_appointments',
+        sa.Column('appointment_id', sa.Integer(), nullable=False),
+        sa.Column('pet_id', sa.Integer(), nullable=True),
+        sa.Column('veterinarian_id', sa.Integer(), nullable=False),
+        sa.Column('appointment_date', sa.TIMESTAMP(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('data', postgresql.JSONB(), nullable=False),
+        sa.Column('archived_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('appointment_id')
+    )
+    op.create_index('ix_archived_appointments_pet_id', 'archived_appointments', ['pet_id', 'appointment_date'])
+
+    print("M10: Creando tabla 'archived_medical_records'...")
+    op.create_table('archived_medical_records',
+        sa.Column('record_id', sa.Integer(), nullable=False),
+        sa.Column('appointment_id', sa.Integer(), nullable=False),
+        sa.Column('pet_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=True),
+        sa.Column('data', postgresql.JSONB(), nullable=False),
+        sa.Column('archived_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('record_id')
+    )
+    op.create_index('ix_archived_medical_records_pet_id', 'archived_medical_records', ['pet_id', 'created_at'])
+
+    print("M10: Creando tabla 'archived_invoices'...")
+    op.create_table('archived_invoices',
+        sa.Column('invoice_id', sa.Integer(), nullable=False),
+        sa.Column('appointment_id', sa.Integer(), nullable=True),
+        sa.Column('invoice_number', sa.String(length=50), nullable=False),
+        sa.Column('issue_date', sa.Date(), nullable=False),
+        sa.Column('total_amount', sa.Numeric(precision=10, scale=2), nullable=False),
+        sa.Column('data', postgresql.JSONB(), nullable=False),
+        sa.Column('archived_at', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('invoice_id')
+    )
+    op.create_index('ix_archived_invoices_appointment_id', 'archived_invoices', ['appointment_id'])
+    op.create_index('ix_archived_invoices_issue_date', 'archived_invoices', ['issue_date'])
+
+    print("M10: Activando compresión lz4 en las columnas 'data'...")
+    for table in ARCHIVE_TABLES:
+        op.execute(f"""
+            DO $$
+            BEGIN
+                ALTER TABLE {table} ALTER COLUMN data SET COMPRESSION lz4;
+            EXCEPTION WHEN feature_not_supported OR invalid_parameter_value THEN
+                RAISE NOTICE 'lz4 no disponible, {table}.data queda con pglz';
+            END $$;
+        """)
+
+    print("M10: Upgrade completado.")
+
+
+def downgrade() -> None:
+    """
+    Devuelve lo archivado a las tablas vivas antes de borrar las tablas de archivo
+    (así un downgrade no pierde historiales).
+    """
+    print("M10: Restaurando filas archivadas en las tablas vivas...")
+    # El archivado pudo haber borrado las particiones viejas que quedaron vacías
+    op.execute("""
+        SELECT create_monthly_partitions('appointments', min(appointment_date)::date, max(appointment_date)::date)
+        FROM archived_appointments HAVING count(*) > 0
+    """)
+    op.execute("""
+        SELECT create_monthly_partitions('invoices', min(issue_date), max(issue_date))
+        FROM archived_invoices HAVING count(*) > 0
+    """)
+    op.execute("""
+        INSERT INTO appointments
+        SELECT (jsonb_populate_record(NULL::appointments, data)).* FROM archived_appointments
+    """)
+    op.execute("""
+        INSERT INTO medical_records (record_id, appointment_id, appointment_date, diagnosis, treatment,
+                                     prescription, follow_up_required, created_at)
+        SELECT r.record_id, r.appointment_id, r.appointment_date, r.diagnosis, r.treatment,
+               r.prescription, r.follow_up_required, r.created_at
+        FROM archived_medical_records a, jsonb_populate_record(NULL::medical_records, a.data) AS r
+    """)
+    op.execute("DELETE FROM invoice_keys WHERE invoice_id IN (SELECT invoice_id FROM archived_invoices)")
+    op.execute("""
+        INSERT INTO invoices
+        SELECT (jsonb_populate_record(NULL::invoices, data)).* FROM archived_invoices
+    """)
+
+    for table in reversed(ARCHIVE_TABLES):
+        print(f"M10: Eliminando tabla '{table}'...")
+        op.drop_table(table)
+    print("M10: Downgrade completado.")
@@ -0,0 +1,101 @@
+"""M16_Agregar_series_de_citas
+
+Revision ID: f4c9e3a7b215
+Revises: e6b2d8f4a190
+Create Date: 2026-10-19 12:26:40.903517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4c9e3a7b215'
+down_revision: Union[str, Sequence[str], None] = 'e6b2d8f4a190'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX_NAME = 'ix_appointments_series_id'
+
+
+def _partitions_of(bind, table: str) -> list:
+    return bind.execute(sa.text("""
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:table AS regclass) ORDER BY c.relname
+    """), {"table": table}).scalars().all()
+
+def _attached_partitions(bind, index: str) -> set:
+    return set(bind.execute(sa.text("""
+        SELECT t.relname FROM pg_inherits i
+        JOIN pg_index x ON x.indexrelid = i.inhrelid
+        JOIN pg_class t ON t.oid = x.indrelid
+        WHERE i.inhparent = CAST(:index AS regclass)
+    """), {"index": index}).scalars())
+
+def _drop_if_invalid(bind, name: str) -> None:
+    invalid = bind.execute(sa.text("""
+        SELECT NOT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = :name AND c.relkind = 'i'
+    """), {"name": name}).scalar()
+    if invalid:
+        op.execute(f'DROP INDEX CONCURRENTLY "{name}"')
+
+
+def upgrade() -> None:
+    """
+    Paso 1: Tabla 'appointment_series': la regla de recurrencia (cada N días,
+            semanas o meses, K veces) de un tratamiento o seguimiento.
+    Paso 2: 'appointments.series_id' (nullable, FK): cada cita generada apunta
+            a su serie. Agregar una columna NULL no reescribe las particiones.
+    Paso 3: Índice de la FK, CONCURRENTLY por partición como en M11/M15.
+    """
+    print("M16: Creando tabla 'appointment_series'...")
+    op.create_table('appointment_series',
+        sa.Column('series_id', sa.Integer(), nullable=False),
+        sa.Column('pet_id', sa.Integer(), nullable=False),
+        sa.Column('veterinarian_id', sa.Integer(), nullable=False),
+        sa.Column('first_appointment_date', sa.TIMESTAMP(), nullable=False),
+        sa.Column('frequency', sa.String(length=10), nullable=False),
+        sa.Column('interval', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('occurrences', sa.Integer(), nullable=False),
+        sa.Column('reason', sa.Text(), nullable=True),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=False, server_default=sa.text('now()')),
+        sa.ForeignKeyConstraint(['pet_id'], ['pets.pet_id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['veterinarian_id'], ['veterinarians.veterinarian_id']),
+        sa.PrimaryKeyConstraint('series_id')
+    )
+    op.create_index('ix_appointment_series_pet_id', 'appointment_series', ['pet_id'])
+    op.create_index('ix_appointment_series_veterinarian_id', 'appointment_series', ['veterinarian_id'])
+
+    print("M16: Agregando 'appointments.series_id'...")
+    op.add_column('appointments', sa.Column('series_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('fk_appointments_series_id', 'appointments', 'appointment_series',
+                          ['series_id'], ['series_id'], ondelete='SET NULL')
+
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        print(f"M16: Creando índice '{INDEX_NAME}'...")
+        op.execute(f'CREATE INDEX IF NOT EXISTS "{INDEX_NAME}" ON ONLY appointments (series_id)')
+        attached = _attached_partitions(bind, INDEX_NAME)
+        for partition in _partitions_of(bind, 'appointments'):
+            if partition in attached:
+                continue
+            partition_index = f"{partition}_series_id_idx"
+            _drop_if_invalid(bind, partition_index)
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{partition_index}" ON "{partition}" (series_id)')
+            op.execute(f'ALTER INDEX "{INDEX_NAME}" ATTACH PARTITION "{partition_index}"')
+    print("M16: Upgrade completado.")
+
+
+def downgrade() -> None:
+    print("M16: Eliminando series de citas...")
+    op.execute(f'DROP INDEX IF EXISTS "{INDEX_NAME}"')
+    op.drop_constraint('fk_appointments_series_id', 'appointments', type_='foreignkey')
+    op.drop_column('appointments', 'series_id')
+    op.drop_index('ix_appointment_series_veterinarian_id', table_name='appointment_series')
+    op.drop_index('ix_appointment_series_pet_id', table_name='appointment_series')
+    op.drop_table('appointment_series')
+    print("M16: Downgrade completado.")
@@ -0,0 +1,169 @@
+import argparse
+import logging
+import os
+from datetime import date, datetime
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+from . import partitions
+
+# --- Archivo de Datos Fríos (M10) ---
+# Mueve las citas cerradas (completed, cancelled, no_show) más viejas que
+# ARCHIVE_AFTER_YEARS, junto con su historial médico y su factura PAGADA, a las
+# tablas archived_* (JSONB comprimido). Una cita con factura pendiente no se
+# archiva. Trabaja por lotes (cada lote es una transacción) con SKIP LOCKED para
+# no pelear con la API, y al final borra las particiones mensuales que quedaron
+# vacías: las tablas vivas y sus índices solo guardan los años recientes.
+#
+# Uso (cron):  python -m app.archive [--years 3] [--batch-size 1000] [--dry-run]
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_YEARS = int(os.getenv("ARCHIVE_AFTER_YEARS", "3"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+ARCHIVABLE_STATUSES = ('completed', 'cancelled', 'no_show')
+
+# Columnas generadas (M7) que no tiene sentido guardar en el archivo
+GENERATED_COLUMNS = "- 'search_text' - 'search_vector'"
+
+SELECT_BATCH = """
+    SELECT a.appointment_id, a.appointment_date
+    FROM appointments a
+    WHERE a.appointment_date < :cutoff
+      AND a.status IN :statuses
+      AND NOT EXISTS (
+          SELECT 1 FROM invoices i
+          WHERE i.appointment_id = a.appointment_id
+            AND i.appointment_date = a.appointment_date
+            AND i.payment_status <> 'paid'
+      )
+    ORDER BY a.appointment_date
+    LIMIT :batch_size
+    FOR UPDATE OF a SKIP LOCKED
+"""
+
+# El par (id, fecha) permite que Postgres descarte las particiones que no tocan el lote
+BATCH_KEYS = "SELECT * FROM unnest(CAST(:ids AS integer[]), CAST(:dates AS timestamp[]))"
+
+MOVE_MEDICAL_RECORDS = f"""
+    WITH moved AS (
+        DELETE FROM medical_records m
+        WHERE (m.appointment_id, m.appointment_date) IN ({BATCH_KEYS})
+        RETURNING m.*
+    )
+    INSERT INTO archived_medical_records (record_id, appointment_id, pet_id, created_at, data)
+    SELECT moved.record_id, moved.appointment_id, a.pet_id, moved.created_at, to_jsonb(moved) {GENERATED_COLUMNS}
+    FROM moved
+    JOIN appointments a ON a.appointment_id = moved.appointment_id AND a.appointment_date = moved.appointment_date
+"""
+
+MOVE_INVOICES = f"""
+    WITH moved AS (
+        DELETE FROM invoices i
+        WHERE (i.appointment_id, i.appointment_date) IN ({BATCH_KEYS})
+          AND i.payment_status = 'paid'
+        RETURNING i.*
+    )
+    INSERT INTO archived_invoices (invoice_id, appointment_id, invoice_number, issue_date, total_amount, data)
+    SELECT invoice_id, appointment_id, invoice_number, issue_date, total_amount, to_jsonb(moved)
+    FROM moved
+    RETURNING invoice_id, invoice_number, appointment_id
+"""
+
+# Al borrar la factura el trigger de M9 libera su número en invoice_keys;
+# se vuelve a reservar para que nunca se reutilice un número archivado.
+RESERVE_INVOICE_KEYS = """
+    INSERT INTO invoice_keys (invoice_id, invoice_number, appointment_id)
+    SELECT * FROM unnest(CAST(:invoice_ids AS integer[]), CAST(:numbers AS varchar[]), CAST(:appointment_ids AS integer[]))
+"""
+
+MOVE_APPOINTMENTS = f"""
+    WITH moved AS (
+        DELETE FROM appointments a
+        WHERE (a.appointment_id, a.appointment_date) IN ({BATCH_KEYS})
+        RETURNING a.*
+    )
+    INSERT INTO archived_appointments (appointment_id, pet_id, veterinarian_id, appointment_date, status, data)
+    SELECT appointment_id, pet_id, veterinarian_id, appointment_date, status::text, to_jsonb(moved)
+    FROM moved
+"""
+
+
+def cutoff_for(years: int, today: date = None) -> datetime:
+    today = today or date.today()
+    try:
+        day = today.replace(year=today.year - years)
+    except ValueError: # 29 de febrero
+        day = today.replace(year=today.year - years, day=28)
+    return datetime.combine(day, datetime.min.time())
+
+
+def archive_batch(db: Session, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> dict:
+    """Archiva un lote dentro de la transacción de 'db' (quien llama hace commit)."""
+    batch = db.execute(
+        text(SELECT_BATCH).bindparams(bindparam("statuses", expanding=True)),
+        {"cutoff": cutoff, "statuses": list(ARCHIVABLE_STATUSES), "batch_size": batch_size},
+    ).all()
+    if not batch:
+        return {"appointments": 0, "medical_records": 0, "invoices": 0}
+
+    keys = {"ids": [row.appointment_id for row in batch], "dates": [row.appointment_date for row in batch]}
+    records = db.execute(text(MOVE_MEDICAL_RECORDS), keys).rowcount
+    invoices = db.execute(text(MOVE_INVOICES), keys).all()
+    if invoices:
+        db.execute(text(RESERVE_INVOICE_KEYS), {
+            "invoice_ids": [row.invoice_id for row in invoices],
+            "numbers": [row.invoice_number for row in invoices],
+            "appointment_ids": [row.appointment_id for row in invoices],
+        })
+    appointments = db.execute(text(MOVE_APPOINTMENTS), keys).rowcount
+    return {"appointments": appointments, "medical_records": records, "invoices": len(invoices)}
+
+
+def run_archival(engine, years: int = ARCHIVE_AFTER_YEARS, batch_size: int = ARCHIVE_BATCH_SIZE,
+                 drop_partitions: bool = True) -> dict:
+    """Archiva hasta que no queden citas elegibles. Devuelve los totales movidos."""
+    cutoff = cutoff_for(years)
+    totals = {"appointments": 0, "medical_records": 0, "invoices": 0, "partitions_dropped": 0}
+    while True:
+        with Session(engine) as db:
+            moved = archive_batch(db, cutoff, batch_size)
+            db.commit()
+        for key, value in moved.items():
+            totals[key] += value
+        logger.info("Archived batch: %s", moved)
+        if moved["appointments"] < batch_size:
+            break
+
+    if drop_partitions:
+        for table in ("appointments", "invoices"):
+            totals["partitions_dropped"] += len(partitions.drop_empty_partitions(engine, table, cutoff.date()))
+    return totals
+
+
+def count_eligible(engine, years: int = ARCHIVE_AFTER_YEARS) -> int:
+    sql = SELECT_BATCH.replace("LIMIT :batch_size", "").replace("FOR UPDATE OF a SKIP LOCKED", "")
+    with engine.connect() as conn:
+        return conn.execute(
+            text(f"SELECT count(*) FROM ({sql}) AS eligible").bindparams(bindparam("statuses", expanding=True)),
+            {"cutoff": cutoff_for(years), "statuses": list(ARCHIVABLE_STATUSES)},
+        ).scalar()
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    parser = argparse.ArgumentParser(description="Archiva citas cerradas antiguas (M10)")
+    parser.add_argument("--years", type=int, default=ARCHIVE_AFTER_YEARS)
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--keep-partitions", action="store_true", help="No borrar particiones vacías")
+    parser.add_argument("--dry-run", action="store_true", help="Solo contar las citas elegibles")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.dry_run:
+        logger.info("Eligible appointments: %d", count_eligible(engine, args.years))
+    else:
+        logger.info("Archival finished: %s",
+                    run_archival(engine, args.years, args.batch_size, drop_partitions=not args.keep_partitions))
@@ -0,0 +1,289 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Callable, Dict, Optional
+
+# --- Caché de la Agenda Diaria por Veterinario (dos niveles: local + Redis) ---
+# /veterinarians/{vet_id}/schedule se consulta todo el día desde recepción y
+# consultorios. Se guarda la respuesta YA SERIALIZADA (bytes JSON) por
+# (veterinario, día):
+#   1) en memoria del proceso (LRU con TTL corto): un acierto no hace I/O;
+#   2) en Redis, compartida entre workers: un fallo local cuesta un MGET en
+#      vez de la consulta + serialización.
+# crud.py invalida exactamente el par (vet, día) afectado después de cada
+# commit que crea, modifica, completa, cancela o borra una cita. La invalidación:
+#   - sube la versión de la clave en Redis (INCR): una carga que empezó antes
+#     y termina después deja un valor con versión vieja que nadie usa;
+#   - se publica en un canal de Redis para que los demás procesos borren su
+#     copia local al instante.
+# Los nombres de mascota/veterinario dentro de la agenda solo se refrescan al
+# vencer el TTL (o con invalidate_vet al editar el veterinario).
+# Si Redis no responde se sigue solo con la caché local (fail-open); en ese
+# caso otros workers pueden servir su copia hasta AGENDA_CACHE_LOCAL_TTL.
+
+logger = logging.getLogger(__name__)
+
+AGENDA_CACHE_ENABLED = os.getenv("AGENDA_CACHE_ENABLED", "true").lower() != "false"
+AGENDA_CACHE_STORAGE_URI = os.getenv("AGENDA_CACHE_STORAGE_URI", os.getenv("RATE_LIMIT_STORAGE_URI", "redis://localhost:6379"))
+AGENDA_CACHE_TTL = int(os.getenv("AGENDA_CACHE_TTL", "600"))             # nivel Redis (segundos)
+AGENDA_CACHE_LOCAL_TTL = float(os.getenv("AGENDA_CACHE_LOCAL_TTL", "30")) # nivel local (segundos)
+AGENDA_CACHE_MAX_ENTRIES = int(os.getenv("AGENDA_CACHE_MAX_ENTRIES", "2000"))
+INVALIDATION_CHANNEL = "agenda:invalidate"
+BACKEND_ERROR_LOG_INTERVAL = 60 # no llenar el log si Redis está caído
+
+
+def _key(vet_id: int, day: date) -> str:
+    return f"{vet_id}:{day.isoformat()}"
+
+
+# --- Backends compartidos ---
+class MemoryBackend:
+    """
+    Nivel compartido en memoria (un nodo, pruebas y benchmarks): varios
+    AgendaCache con la misma instancia simulan varios workers.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[str, bytes] = {}
+        self._versions: Dict[str, int] = {}
+        self._subscribers = []
+
+    def get(self, key: str) -> tuple:
+        with self._lock:
+            return self._values.get(key), self._versions.get(key, 0)
+
+    def set(self, key: str, value: bytes, version: int, ttl: int) -> None:
+        with self._lock:
+            self._values[key] = b"%d:" % version + value
+
+    def invalidate(self, keys: list) -> None:
+        with self._lock:
+            for key in keys:
+                self._versions[key] = self._versions.get(key, 0) + 1
+                self._values.pop(key, None)
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback(keys)
+
+    def keys_for_vet(self, vet_id: int) -> list:
+        with self._lock:
+            return [k for k in self._values if k.startswith(f"{vet_id}:")]
+
+    def subscribe(self, callback: Callable) -> None:
+        with self._lock:
+            self._subscribers.append(callback)
+
+class RedisBackend:
+    """Valores 'version:json' en agenda:{vet}:{día} y su versión en agenda:v:{vet}:{día}."""
+    def __init__(self, url: str):
+        import redis
+        self._redis = redis
+        self._url = url
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+
+    def get(self, key: str) -> tuple:
+        value, version = self._client.mget(f"agenda:{key}", f"agenda:v:{key}")
+        return value, int(version or 0)
+
+    def set(self, key: str, value: bytes, version: int, ttl: int) -> None:
+        self._client.set(f"agenda:{key}", b"%d:" % version + value, ex=ttl)
+
+    def invalidate(self, keys: list) -> None:
+        pipe = self._client.pipeline(transaction=False)
+        for key in keys:
+            pipe.incr(f"agenda:v:{key}")
+            pipe.expire(f"agenda:v:{key}", 2 * AGENDA_CACHE_TTL)
+            pipe.delete(f"agenda:{key}")
+        pipe.publish(INVALIDATION_CHANNEL, ",".join(keys))
+        pipe.execute()
+
+    def keys_for_vet(self, vet_id: int) -> list:
+        prefix = len("agenda:")
+        return [k.decode()[prefix:] for k in self._client.scan_iter(match=f"agenda:{vet_id}:*", count=500)]
+
+    def subscribe(self, callback: Callable) -> None:
+        threading.Thread(target=self._listen, args=(callback,), name="agenda-cache-invalidation",
+                         daemon=True).start()
+
+    def _listen(self, callback: Callable) -> None:
+        last_error_log = 0.0
+        while True:
+            try:
+                client = self._redis.Redis.from_url(self._url, socket_connect_timeout=0.2, health_check_interval=30)
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message:
+                        callback(message["data"].decode().split(","))
+            except Exception as e:
+                now = time.monotonic()
+                if now - last_error_log > BACKEND_ERROR_LOG_INTERVAL:
+                    last_error_log = now
+                    logger.warning("Agenda cache invalidation channel unavailable, retrying: %s", e)
+                time.sleep(5)
+
+def backend_from_uri(uri: str):
+    if uri.startswith("memory://"):
+        return MemoryBackend()
+    return RedisBackend(uri)
+
+
+class AgendaCache:
+    def __init__(self, backend=None, local_ttl: float = AGENDA_CACHE_LOCAL_TTL, ttl: int = AGENDA_CACHE_TTL,
+                 max_entries: int = AGENDA_CACHE_MAX_ENTRIES, enabled: bool = True):
+        self.backend = backend
+        self.local_ttl = local_ttl
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local: "OrderedDict[str, tuple]" = OrderedDict() # clave -> (bytes, vence_en)
+        self._invalidated_at: Dict[str, float] = {} # última invalidación (local o recibida) por clave
+        self._subscribed = False
+        self._last_backend_error = 0.0
+        self.stats = {"local_hits": 0, "shared_hits": 0, "misses": 0, "invalidations": 0, "backend_errors": 0}
+
+    def get_or_load(self, vet_id: int, day: date, loader: Callable[[], Optional[bytes]]) -> Optional[bytes]:
+        """
+        Devuelve la agenda serializada; si no está en ningún nivel llama a
+        loader() y guarda el resultado (None no se guarda: p. ej. vet inexistente).
+        """
+        if not self.enabled:
+            return loader()
+        self._ensure_subscribed()
+        key = _key(vet_id, day)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[1] > now:
+                self._local.move_to_end(key)
+                self.stats["local_hits"] += 1
+                return entry[0]
+        load_started = now
+
+        version = 0
+        if self.backend is not None:
+            try:
+                stored, version = self.backend.get(key)
+                if stored is not None:
+                    stored_version, _, payload = stored.partition(b":")
+                    if int(stored_version) == version:
+                        self._store_local(key, payload, load_started)
+                        with self._lock:
+                            self.stats["shared_hits"] += 1
+                        return payload
+            except Exception as e:
+                self._backend_error(e)
+
+        with self._lock:
+            self.stats["misses"] += 1
+        payload = loader()
+        if payload is None:
+            return None
+        self._store_local(key, payload, load_started)
+        if self.backend is not None:
+            try:
+                self.backend.set(key, payload, version, self.ttl)
+            except Exception as e:
+                self._backend_error(e)
+        return payload
+
+    def invalidate(self, vet_id: int, *days: date) -> None:
+        """Llamar DESPUÉS del commit que cambió citas de ese veterinario en esos días."""
+        if not self.enabled:
+            return
+        keys = sorted({_key(vet_id, day) for day in days})
+        self._evict_local(keys)
+        with self._lock:
+            self.stats["invalidations"] += len(keys)
+        if self.backend is not None:
+            try:
+                self.backend.invalidate(keys)
+            except Exception as e:
+                self._backend_error(e)
+
+    def invalidate_vet(self, vet_id: int) -> None:
+        """Todas las agendas del veterinario (se editó o borró el veterinario)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            keys = {k for k in self._local if k.startswith(f"{vet_id}:")}
+        if self.backend is not None:
+            try:
+                keys.update(self.backend.keys_for_vet(vet_id))
+            except Exception as e:
+                self._backend_error(e)
+        if keys:
+            days = [date.fromisoformat(k.partition(":")[2]) for k in keys]
+            self.invalidate(vet_id, *days)
+
+    def clear_local(self) -> None:
+        with self._lock:
+            self._local.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["local_entries"] = len(self._local)
+        lookups = stats["local_hits"] + stats["shared_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["local_hits"] + stats["shared_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    # --- Internos ---
+    def _store_local(self, key: str, payload: bytes, load_started: float) -> None:
+        with self._lock:
+            # Si llegó una invalidación mientras se cargaba, el valor ya está viejo
+            if self._invalidated_at.get(key, float("-inf")) >= load_started:
+                return
+            self._local[key] = (payload, time.monotonic() + self.local_ttl)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def _evict_local(self, keys: list) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+                self._invalidated_at[key] = now
+            if len(self._invalidated_at) > self.max_entries:
+                # Solo importan mientras dura una carga en curso (milisegundos)
+                self._invalidated_at = {k: t for k, t in self._invalidated_at.items() if now - t < 60}
+
+    def _ensure_subscribed(self) -> None:
+        if self.backend is None or self._subscribed:
+            return
+        with self._lock:
+            if self._subscribed:
+                return
+            self._subscribed = True
+        try:
+            self.backend.subscribe(self._evict_local)
+        except Exception as e:
+            self._backend_error(e)
+
+    def _backend_error(self, error: Exception) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self.stats["backend_errors"] += 1
+            should_log = now - self._last_backend_error > BACKEND_ERROR_LOG_INTERVAL
+            if should_log:
+                self._last_backend_error = now
+        if should_log:
+            logger.warning("Agenda cache backend unavailable, using local cache only: %s", error)
+
+
+def create_agenda_cache() -> AgendaCache:
+    backend = None
+    if AGENDA_CACHE_ENABLED:
+        try:
+            backend = backend_from_uri(AGENDA_CACHE_STORAGE_URI)
+        except ImportError:
+            logger.warning("redis package not installed, agenda cache is per process only")
+    return AgendaCache(backend=backend, enabled=AGENDA_CACHE_ENABLED)
+
+agenda_cache = create_agenda_cache()
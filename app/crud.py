@@ -1,8 +1,11 @@
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func, extract
-from . import models, schemas, auth
+from sqlalchemy import func, extract, text, tuple_
+from . import models, schemas, auth, events, partitions, numbering, cache
 from datetime import date, datetime, timedelta
 from decimal import Decimal
+import base64
+import calendar
+import json
 
 # --- Utils ---
 def update_db_item(db_item, update_data):
@@ -47,6 +50,7 @@ def update_veterinarian(db: Session, db_vet: models.Veterinarian, vet_update: sc
     db_vet = update_db_item(db_vet, vet_update)
     db.commit()
     db.refresh(db_vet)
+    cache.agenda_cache.invalidate_vet(db_vet.veterinarian_id) # su nombre va en cada agenda
     return db_vet
 
 def delete_veterinarian(db: Session, db_vet: models.Veterinarian):
@@ -58,18 +62,31 @@ def delete_veterinarian(db: Session, db_vet: models.Veterinarian):
     if active_appointments > 0:
         return None # Indica fallo
         
+    vet_id = db_vet.veterinarian_id
     db.delete(db_vet)
     db.commit()
+    cache.agenda_cache.invalidate_vet(vet_id)
     return db_vet
 
 def get_appointments_by_veterinarian(db: Session, vet_id: int):
     return db.query(models.Appointment).filter(models.Appointment.veterinarian_id == vet_id).all()
 
-def get_appointments_by_vet_and_date(db: Session, vet_id: int, date: date):
-     return db.query(models.Appointment).filter(
+def get_appointments_by_vet_and_date(db: Session, vet_id: int, date: date, with_cancelled: bool = False):
+    # Rango [día, día+1) en vez de func.date(): usa el índice (veterinarian_id,
+    # appointment_date) y poda particiones (M9); pet y veterinarian van en la respuesta.
+    # Las canceladas no salen en la agenda salvo con with_cancelled=True.
+    day_start = datetime.combine(date, datetime.min.time())
+    query = db.query(models.Appointment).options(
+        joinedload(models.Appointment.pet),
+        joinedload(models.Appointment.veterinarian)
+    ).filter(
         models.Appointment.veterinarian_id == vet_id,
-        func.date(models.Appointment.appointment_date) == date
-    ).order_by(models.Appointment.appointment_date).all()
+        models.Appointment.appointment_date >= day_start,
+        models.Appointment.appointment_date < day_start + timedelta(days=1)
+    )
+    if not with_cancelled:
+        query = query.filter(models.Appointment.status != 'cancelled')
+    return query.order_by(models.Appointment.appointment_date).all()
 
 
 # --- CRUD Owners ---
@@ -158,6 +175,24 @@ def get_appointments(db: Session, skip: int = 0, limit: int = 100):
         joinedload(models.Appointment.veterinarian)
     ).order_by(models.Appointment.appointment_date.desc()).offset(skip).limit(limit).all()
 
+def adjust_appointment_counters(db: Session, pet_id: int, vet_id: int, delta: int):
+    """
+    Suma 'delta' a visit_count de la mascota y total_appointments del veterinario
+    con UPDATE ... SET x = x + delta en la BD (M5). Es atómico: no hay
+    leer-modificar-escribir en Python que pierda cambios de otras peticiones,
+    y al restar nunca baja de 0.
+    """
+    for model, key, counter, entity_id in (
+        (models.Pet, models.Pet.pet_id, models.Pet.visit_count, pet_id),
+        (models.Veterinarian, models.Veterinarian.veterinarian_id, models.Veterinarian.total_appointments, vet_id),
+    ):
+        if entity_id is None:
+            continue
+        query = db.query(model).filter(key == entity_id)
+        if delta < 0:
+            query = query.filter(counter >= -delta)
+        query.update({counter: counter + delta}, synchronize_session=False)
+
 # app/crud.py
 
 def create_appointment(db: Session, appt: schemas.AppointmentCreate):
@@ -178,46 +213,181 @@ def create_appointment(db: Session, appt: schemas.AppointmentCreate):
         return None # Si se dio un ID pero no existe, error.
 
     db_appt = models.Appointment(**appt.model_dump())
+    partitions.ensure_partition_for(db, "appointments", appt.appointment_date) # M9
     
     # --- LÓGICA M5 ---
     if db_pet: # Solo actualizar métricas de mascota si existe
-        db_pet.visit_count += 1
         db_pet.last_visit_date = appt.appointment_date.date()
         db.add(db_pet)
-        
-    db_vet.total_appointments += 1
-    db.add(db_vet)
+    adjust_appointment_counters(db, appt.pet_id, appt.veterinarian_id, +1)
     # -----------------
     
     db.add(db_appt)
     db.commit()
     db.refresh(db_appt)
+    cache.agenda_cache.invalidate(db_appt.veterinarian_id, db_appt.appointment_date.date())
+    events.publish("appointments", "created", db_appt.appointment_id, status=db_appt.status)
     return db_appt
 
 def update_appointment(db: Session, db_appt: models.Appointment, appt_update: schemas.AppointmentUpdate):
+    partitions.ensure_partition_for(db, "appointments", appt_update.appointment_date) # M9: reprogramar mueve la fila
+    old_vet_id, old_day = db_appt.veterinarian_id, db_appt.appointment_date.date()
+
+    # Las citas canceladas no cuentan en las métricas: entrar o salir de
+    # 'cancelled' las ajusta. Igual que en cancel_appointment, el cambio de
+    # estado es un UPDATE condicionado al estado actual en la BD (antes de
+    # tocar el objeto): si dos PUT cancelan a la vez, solo uno descuenta.
+    new_status = appt_update.model_dump(exclude_unset=True).get('status')
+    delta = 0
+    if new_status is not None:
+        cancelling = new_status == 'cancelled'
+        changed = db.query(models.Appointment).filter(
+            models.Appointment.appointment_id == db_appt.appointment_id,
+            models.Appointment.appointment_date == db_appt.appointment_date, # M9: poda de particiones
+            models.Appointment.status != 'cancelled' if cancelling else models.Appointment.status == 'cancelled'
+        ).update({models.Appointment.status: new_status}, synchronize_session=False)
+        if changed:
+            delta = -1 if cancelling else +1
+
     db_appt = update_db_item(db_appt, appt_update)
+    if delta:
+        adjust_appointment_counters(db, db_appt.pet_id, db_appt.veterinarian_id, delta)
+    db.commit()
+    db.refresh(db_appt)
+    # Reprogramar o cambiar de veterinario afecta la agenda vieja y la nueva
+    cache.agenda_cache.invalidate(old_vet_id, old_day)
+    cache.agenda_cache.invalidate(db_appt.veterinarian_id, db_appt.appointment_date.date())
+    events.publish("appointments", "updated", db_appt.appointment_id, status=db_appt.status)
+    return db_appt
+
+def cancel_appointment(db: Session, db_appt: models.Appointment):
+    """
+    Cancela una cita agendada sin borrarla: conserva historial, factura y el
+    dato para analítica de cancelaciones. Devuelve None si ya no estaba 'scheduled'.
+    """
+    # UPDATE condicionado: si dos peticiones cancelan a la vez solo una lo logra
+    # y las métricas se descuentan una sola vez
+    cancelled = db.query(models.Appointment).filter(
+        models.Appointment.appointment_id == db_appt.appointment_id,
+        models.Appointment.appointment_date == db_appt.appointment_date, # M9: poda de particiones
+        models.Appointment.status == 'scheduled'
+    ).update({models.Appointment.status: 'cancelled'}, synchronize_session=False)
+    if not cancelled:
+        db.rollback()
+        return None
+    adjust_appointment_counters(db, db_appt.pet_id, db_appt.veterinarian_id, -1)
     db.commit()
     db.refresh(db_appt)
+    cache.agenda_cache.invalidate(db_appt.veterinarian_id, db_appt.appointment_date.date())
+    events.publish("appointments", "cancelled", db_appt.appointment_id, status=db_appt.status)
     return db_appt
 
 def delete_appointment(db: Session, db_appt: models.Appointment):
     """Borra una cita y revierte las métricas (M5)."""
-    db_pet = db_appt.pet
-    db_vet = db_appt.veterinarian
-    
-    # --- LÓGICA M5 ---
-    if db_pet:
-        db_pet.visit_count = max(0, db_pet.visit_count - 1)
-        db.add(db_pet)
-    if db_vet:
-        db_vet.total_appointments = max(0, db_vet.total_appointments - 1)
-        db.add(db_vet)
+    # --- LÓGICA M5 --- (una cancelada ya se descontó al cancelarla)
+    if db_appt.status != 'cancelled':
+        adjust_appointment_counters(db, db_appt.pet_id, db_appt.veterinarian_id, -1)
     # -----------------
 
+    vet_id, day = db_appt.veterinarian_id, db_appt.appointment_date.date()
+    # La factura se borra en cascada (delete-orphan): también se avisa a sus suscriptores
+    invoice_id = db_appt.invoice.invoice_id if db_appt.invoice else None
     db.delete(db_appt)
     db.commit()
+    cache.agenda_cache.invalidate(vet_id, day)
+    events.publish("appointments", "deleted", db_appt.appointment_id)
+    if invoice_id is not None:
+        events.publish("invoices", "deleted", invoice_id)
     return db_appt
 
+# --- Series de Citas (M16) ---
+# Misma duración que usa la página de Citas para detectar choques de horario
+APPOINTMENT_DURATION_MINUTES = 30
+
+def expand_recurrence(start: datetime, frequency: str, interval: int, occurrences: int) -> list:
+    """Fechas concretas de la serie. En 'monthly' un día 31 cae en el último día del mes."""
+    dates = []
+    for i in range(occurrences):
+        step = i * interval
+        if frequency == 'daily':
+            dates.append(start + timedelta(days=step))
+        elif frequency == 'weekly':
+            dates.append(start + timedelta(weeks=step))
+        else:
+            month_index = start.month - 1 + step
+            year, month = start.year + month_index // 12, month_index % 12 + 1
+            day = min(start.day, calendar.monthrange(year, month)[1])
+            dates.append(start.replace(year=year, month=month, day=day))
+    return dates
+
+# Todas las fechas de la serie contra la agenda del veterinario en una consulta:
+# cada fecha busca citas 'scheduled' a menos de la duración de distancia, con
+# el índice parcial de M15 (veterinarian_id, appointment_date).
+SERIES_CONFLICTS = """
+    SELECT s.n, s.slot AS requested_date, a.appointment_id, a.appointment_date
+    FROM unnest(CAST(:slots AS timestamp[])) WITH ORDINALITY AS s(slot, n)
+    JOIN appointments a
+      ON a.veterinarian_id = :vet_id
+     AND a.status = 'scheduled'
+     AND a.appointment_date > s.slot - make_interval(mins => :duration)
+     AND a.appointment_date < s.slot + make_interval(mins => :duration)
+    ORDER BY s.n, a.appointment_date
+"""
+
+def create_appointment_series(db: Session, series: schemas.AppointmentSeriesCreate):
+    """
+    Expande la serie y crea todas sus citas en una transacción: un chequeo de
+    choques para todas las fechas, un INSERT masivo y una sola actualización
+    de métricas. Devuelve (serie, citas creadas, choques); la serie es None si
+    hubo choques y no se pidió 'skip_conflicts' (o si ninguna fecha quedó libre).
+    """
+    slots = expand_recurrence(series.first_appointment_date, series.frequency.value,
+                              series.interval, series.occurrences)
+    # Serializa las series del mismo veterinario hasta el commit: dos series
+    # simultáneas no reservan el mismo horario. Solo cubre series contra series;
+    # create_appointment (POST /appointments/) no revisa choques ni toma el lock,
+    # igual que antes de M16
+    db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"),
+               {"key": f"vet-calendar:{series.veterinarian_id}"})
+    conflicts = db.execute(text(SERIES_CONFLICTS), {
+        "slots": slots, "vet_id": series.veterinarian_id, "duration": APPOINTMENT_DURATION_MINUTES,
+    }).all()
+    busy = {row.n - 1 for row in conflicts}
+    free = [slot for i, slot in enumerate(slots) if i not in busy]
+    if (conflicts and not series.skip_conflicts) or not free:
+        db.rollback()
+        return None, [], conflicts
+
+    db_series = models.AppointmentSeries(**series.model_dump(exclude={"skip_conflicts", "frequency"}),
+                                         frequency=series.frequency.value)
+    db.add(db_series)
+    db.flush() # series_id para las citas
+
+    for month in {(slot.year, slot.month) for slot in free}:
+        partitions.ensure_partition_for(db, "appointments", date(*month, 1)) # M9
+    appointments = models.Appointment.__table__
+    created = db.execute(
+        appointments.insert().returning(appointments.c.appointment_id, appointments.c.appointment_date,
+                                        appointments.c.status),
+        [{"pet_id": series.pet_id, "veterinarian_id": series.veterinarian_id, "appointment_date": slot,
+          "reason": series.reason, "notes": series.notes, "status": "scheduled",
+          "series_id": db_series.series_id} for slot in free]
+    ).all()
+
+    # --- LÓGICA M5 --- una vez por serie, no por cita (la última fecha, como
+    # quedaría agendando las citas una por una)
+    db.query(models.Pet).filter(models.Pet.pet_id == series.pet_id).update(
+        {models.Pet.last_visit_date: max(free).date()}, synchronize_session=False)
+    adjust_appointment_counters(db, series.pet_id, series.veterinarian_id, len(created))
+    # -----------------
+    db.commit()
+    db.refresh(db_series)
+    cache.agenda_cache.invalidate(series.veterinarian_id, *(slot.date() for slot in free))
+    for row in created:
+        events.publish("appointments", "created", row.appointment_id, status=row.status,
+                       series_id=db_series.series_id)
+    return db_series, created, conflicts
+
 def get_appointments_by_status_or_date(db: Session, status: str = None, date: date = None):
     query = db.query(models.Appointment)
     if status:
@@ -233,8 +403,29 @@ def get_medical_record(db: Session, record_id: int):
 def get_medical_record_by_appointment(db: Session, appointment_id: int):
     return db.query(models.MedicalRecord).filter(models.MedicalRecord.appointment_id == appointment_id).first()
 
-def get_medical_records_by_pet(db: Session, pet_id: int):
-    return db.query(models.MedicalRecord).join(models.Appointment).filter(models.Appointment.pet_id == pet_id).order_by(models.MedicalRecord.created_at.desc()).all()
+def get_medical_records_by_pet(db: Session, pet_id: int, include_archived: bool = False):
+    records = db.query(models.MedicalRecord).join(models.Appointment).filter(models.Appointment.pet_id == pet_id).order_by(models.MedicalRecord.created_at.desc()).all()
+    if not include_archived:
+        return records
+    # M10: los historiales viejos viven en archived_medical_records (ver app/archive.py)
+    archived = db.query(models.ArchivedMedicalRecord).filter(
+        models.ArchivedMedicalRecord.pet_id == pet_id
+    ).order_by(models.ArchivedMedicalRecord.created_at.desc()).all()
+    return records + [archived_medical_record(row) for row in archived]
+
+def archived_medical_record(row: models.ArchivedMedicalRecord) -> dict:
+    """Fila archivada con la misma forma que schemas.MedicalRecord."""
+    data = row.data
+    return {
+        "record_id": row.record_id,
+        "appointment_id": row.appointment_id,
+        "diagnosis": data["diagnosis"],
+        "treatment": data["treatment"],
+        "prescription": data.get("prescription"),
+        "follow_up_required": bool(data.get("follow_up_required")),
+        "created_at": row.created_at,
+        "archived": True,
+    }
 
 def create_medical_record(db: Session, record: schemas.MedicalRecordCreate):
     db_record = models.MedicalRecord(**record.model_dump())
@@ -332,20 +523,43 @@ def get_pending_invoices(db: Session, skip: int = 0, limit: int = 100):
         models.Invoice.payment_status.in_(['pending', 'overdue'])
     ).order_by(models.Invoice.issue_date.desc()).offset(skip).limit(limit).all()
 
+def get_invoice_by_number(db: Session, invoice_number: str):
+    return db.query(models.Invoice).filter(models.Invoice.invoice_number == invoice_number).first()
+
 def create_invoice(db: Session, invoice: schemas.InvoiceCreate):
-    db_invoice = models.Invoice(**invoice.model_dump())
+    invoice_data = invoice.model_dump()
+    if not invoice_data["invoice_number"]:
+        # M13: número asignado por el servidor, en la misma transacción del INSERT
+        invoice_data["invoice_number"] = numbering.allocate_invoice_numbers(db, invoice.issue_date)[0]
+    db_invoice = models.Invoice(**invoice_data)
+    partitions.ensure_partition_for(db, "invoices", invoice.issue_date) # M9
     db.add(db_invoice)
     db.commit()
     db.refresh(db_invoice)
+    events.publish("invoices", "created", db_invoice.invoice_id, payment_status=db_invoice.payment_status)
     return db_invoice
 # ----------------------------------------
 
+def update_invoice(db: Session, db_invoice: models.Invoice, invoice_update: schemas.InvoiceUpdate):
+    db_invoice = update_db_item(db_invoice, invoice_update)
+    db.commit()
+    db.refresh(db_invoice)
+    events.publish("invoices", "updated", db_invoice.invoice_id, payment_status=db_invoice.payment_status)
+    return db_invoice
+
+def delete_invoice(db: Session, db_invoice: models.Invoice):
+    db.delete(db_invoice)
+    db.commit()
+    events.publish("invoices", "deleted", db_invoice.invoice_id)
+    return db_invoice
+
 def mark_invoice_as_paid(db: Session, db_invoice: models.Invoice):
     db_invoice.payment_status = 'paid'
     db_invoice.payment_date = datetime.now()
     db.add(db_invoice)
     db.commit()
     db.refresh(db_invoice)
+    events.publish("invoices", "paid", db_invoice.invoice_id, payment_status=db_invoice.payment_status)
     return db_invoice
 
 # --- CRUD Reports (M5) ---
@@ -357,6 +571,69 @@ def get_revenue_report(db: Session, start_date: date, end_date: date):
     ).scalar()
     return total_revenue or Decimal('0.00')
 
+# Cuentas por cobrar: totales y antigüedad (0-30, 31-60, 61-90, 90+ días desde
+# issue_date) por estado, dueño y veterinario en UNA consulta con GROUPING SETS.
+# GROUPING(...) identifica a qué conjunto pertenece cada fila (bit en 1 = columna
+# agregada): 7 = total general, 3 = por estado, 5 = por dueño, 6 = por veterinario.
+# Por cobrar = pending, partial y overdue (no hay monto abonado de las parciales).
+RECEIVABLES_SETS = {7: 'totals', 3: 'by_status', 5: 'by_owner', 6: 'by_veterinarian'}
+RECEIVABLES_SQL = """
+    WITH grouped AS (
+        SELECT GROUPING(i.payment_status, p.owner_id, a.veterinarian_id) AS grouping_set,
+               i.payment_status::text AS status,
+               -- El nombre solo tiene sentido en el conjunto agrupado por esa columna
+               p.owner_id,
+               CASE WHEN GROUPING(p.owner_id) = 0
+                    THEN max(o.first_name || ' ' || o.last_name) END AS owner_name,
+               a.veterinarian_id,
+               CASE WHEN GROUPING(a.veterinarian_id) = 0
+                    THEN max(v.first_name || ' ' || v.last_name) END AS veterinarian_name,
+               count(*) AS invoice_count,
+               coalesce(sum(i.total_amount), 0) AS billed,
+               coalesce(sum(i.total_amount) FILTER (WHERE i.payment_status = 'paid'), 0) AS paid,
+               coalesce(sum(i.total_amount) FILTER (WHERE i.payment_status <> 'paid'), 0) AS outstanding,
+               coalesce(sum(i.total_amount) FILTER (WHERE i.payment_status <> 'paid'
+                        AND :as_of - i.issue_date <= 30), 0) AS days_0_30,
+               coalesce(sum(i.total_amount) FILTER (WHERE i.payment_status <> 'paid'
+                        AND :as_of - i.issue_date BETWEEN 31 AND 60), 0) AS days_31_60,
+               coalesce(sum(i.total_amount) FILTER (WHERE i.payment_status <> 'paid'
+                        AND :as_of - i.issue_date BETWEEN 61 AND 90), 0) AS days_61_90,
+               coalesce(sum(i.total_amount) FILTER (WHERE i.payment_status <> 'paid'
+                        AND :as_of - i.issue_date > 90), 0) AS days_over_90
+        FROM invoices i
+        LEFT JOIN appointments a ON a.appointment_id = i.appointment_id AND a.appointment_date = i.appointment_date
+        LEFT JOIN pets p ON p.pet_id = a.pet_id
+        LEFT JOIN owners o ON o.owner_id = p.owner_id
+        LEFT JOIN veterinarians v ON v.veterinarian_id = a.veterinarian_id
+        WHERE i.issue_date <= :as_of
+        GROUP BY GROUPING SETS ((), (i.payment_status), (p.owner_id), (a.veterinarian_id))
+    ),
+    ranked AS (
+        SELECT *, row_number() OVER (PARTITION BY grouping_set ORDER BY outstanding DESC) AS position
+        FROM grouped
+    )
+    SELECT * FROM ranked
+    WHERE grouping_set IN (7, 3) OR (outstanding > 0 AND position <= :top)
+    ORDER BY grouping_set, outstanding DESC
+"""
+
+def get_receivables_report(db: Session, as_of: date = None, top: int = 20):
+    """
+    Devuelve {'as_of', 'totals', 'by_status', 'by_owner', 'by_veterinarian'};
+    por dueño y por veterinario solo los 'top' con más saldo por cobrar.
+    """
+    as_of = as_of or date.today()
+    report = {"as_of": as_of, "totals": None, "by_status": [], "by_owner": [], "by_veterinarian": []}
+    rows = db.execute(text(RECEIVABLES_SQL), {"as_of": as_of, "top": top}).mappings().all()
+    for row in rows:
+        group = RECEIVABLES_SETS[row["grouping_set"]]
+        data = {k: v for k, v in row.items() if k not in ("grouping_set", "position")}
+        if group == 'totals':
+            report["totals"] = data
+        else:
+            report[group].append(data)
+    return report
+
 def get_popular_veterinarians(db: Session, limit: int = 5):
     # Reutiliza el contador 'total_appointments' que ya calculamos
     return db.query(models.Veterinarian).order_by(
@@ -372,4 +649,356 @@ def get_vaccination_alerts(db: Session, days_window: int = 30):
         joinedload(models.VaccinationRecord.vaccine)
     ).filter(
         models.VaccinationRecord.next_dose_date.between(today, end_date)
-    ).order_by(models.VaccinationRecord.next_dose_date.asc()).all()
\ No newline at end of file
+    ).order_by(models.VaccinationRecord.next_dose_date.asc()).all()
+
+# --- Búsqueda (M7: pg_trgm + tsvector) ---
+# Cada rama usa sus índices GIN (search_vector para full-text y search_text
+# con gin_trgm_ops para similitud/subcadena) y se corta con su propio LIMIT,
+# así el UNION ALL final solo ordena unas pocas filas aunque haya millones.
+# La similitud es por palabra (:term <% search_text / word_similarity): el
+# término corto se compara con el mejor tramo del texto y no con el texto
+# entero (nombre + email + teléfono), que diluía el puntaje por debajo del umbral.
+# benchmarks/bench_search.py mide la latencia y revisa los planes a 1M filas.
+SEARCH_BRANCHES = {
+    'owner': """
+        (SELECT 'owner' AS entity_type, o.owner_id AS entity_id, NULL::integer AS parent_id,
+                o.first_name || ' ' || o.last_name AS title,
+                o.email || coalesce(' · ' || o.phone, '') AS snippet,
+                GREATEST(ts_rank(o.search_vector, websearch_to_tsquery('simple', :q)),
+                         word_similarity(:term, o.search_text)) AS rank
+         FROM owners o
+         WHERE o.search_vector @@ websearch_to_tsquery('simple', :q)
+            OR :term <% o.search_text
+            OR o.search_text LIKE :like
+         ORDER BY rank DESC
+         LIMIT :branch_limit)
+    """,
+    'pet': """
+        (SELECT 'pet' AS entity_type, p.pet_id AS entity_id, p.owner_id AS parent_id,
+                p.name AS title,
+                coalesce('Microchip ' || p.microchip_number, p.species::text) AS snippet,
+                GREATEST(ts_rank(p.search_vector, websearch_to_tsquery('simple', :q)),
+                         word_similarity(:term, p.search_text)) AS rank
+         FROM pets p
+         WHERE p.search_vector @@ websearch_to_tsquery('simple', :q)
+            OR :term <% p.search_text
+            OR p.search_text LIKE :like
+         ORDER BY rank DESC
+         LIMIT :branch_limit)
+    """,
+    'medical_record': """
+        (SELECT 'medical_record' AS entity_type, mr.record_id AS entity_id, a.pet_id AS parent_id,
+                left(mr.diagnosis, 120) AS title,
+                left(mr.treatment, 200) AS snippet,
+                GREATEST(ts_rank(mr.search_vector, websearch_to_tsquery('spanish', :q)),
+                         word_similarity(:term, mr.search_text)) AS rank
+         FROM medical_records mr
+         JOIN appointments a ON a.appointment_id = mr.appointment_id
+         WHERE mr.search_vector @@ websearch_to_tsquery('spanish', :q)
+            OR :term <% mr.search_text
+            OR mr.search_text LIKE :like
+         ORDER BY rank DESC
+         LIMIT :branch_limit)
+    """,
+}
+
+def build_search_query(q: str, entity_types: list = None, skip: int = 0, limit: int = 20) -> tuple:
+    """SQL y parámetros de search() (benchmarks/bench_search.py los usa para EXPLAIN)."""
+    term = q.strip().lower()
+    branches = [SEARCH_BRANCHES[t] for t in (entity_types or SEARCH_BRANCHES.keys())]
+    sql = " UNION ALL ".join(branches) + " ORDER BY rank DESC, entity_type, entity_id LIMIT :limit OFFSET :skip"
+    like = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return sql, {
+        "q": q,
+        "term": term,
+        "like": like,
+        "branch_limit": skip + limit + 1,
+        "limit": limit + 1,
+        "skip": skip,
+    }
+
+def search(db: Session, q: str, entity_types: list = None, skip: int = 0, limit: int = 20):
+    """
+    Búsqueda rankeada sobre dueños, mascotas e historiales médicos.
+    Devuelve (resultados, has_more). Se pide una fila extra para saber si hay
+    más páginas sin tener que hacer un COUNT(*) sobre todas las coincidencias.
+    """
+    sql, params = build_search_query(q, entity_types, skip, limit)
+    rows = db.execute(text(sql), params).mappings().all()
+    return [dict(r) for r in rows[:limit]], len(rows) > limit
+
+
+# --- Expediente del Paciente (línea de tiempo) ---
+# Citas, historiales, vacunas y facturas de una mascota en UNA consulta. Igual
+# que la búsqueda, cada rama se corta con su propio ORDER BY/LIMIT (usando los
+# índices (pet_id, fecha) de M11), así el UNION ALL solo ordena unas pocas filas.
+# Los datos de la mascota y su dueño vienen en la misma consulta.
+TIMELINE_BRANCHES = {
+    'appointment': """
+        (SELECT 'appointment' AS event_type, a.appointment_id AS event_id, a.appointment_date AS occurred_at,
+                a.appointment_id, v.first_name || ' ' || v.last_name AS veterinarian,
+                a.reason AS title,
+                jsonb_build_object('status', a.status, 'notes', a.notes) AS details,
+                false AS archived
+         FROM appointments a
+         JOIN veterinarians v ON v.veterinarian_id = a.veterinarian_id
+         WHERE a.pet_id = :pet_id
+         ORDER BY occurred_at DESC
+         LIMIT :branch_limit)
+    """,
+    'medical_record': """
+        (SELECT 'medical_record', m.record_id, coalesce(m.created_at, a.appointment_date) AS occurred_at,
+                m.appointment_id, v.first_name || ' ' || v.last_name,
+                left(m.diagnosis, 120),
+                jsonb_build_object('diagnosis', m.diagnosis, 'treatment', m.treatment,
+                                   'prescription', m.prescription, 'follow_up_required', m.follow_up_required),
+                false
+         FROM medical_records m
+         JOIN appointments a ON a.appointment_id = m.appointment_id AND a.appointment_date = m.appointment_date
+         JOIN veterinarians v ON v.veterinarian_id = a.veterinarian_id
+         WHERE a.pet_id = :pet_id
+         ORDER BY occurred_at DESC
+         LIMIT :branch_limit)
+    """,
+    'vaccination': """
+        (SELECT 'vaccination', r.vaccination_id, r.vaccination_date::timestamp AS occurred_at,
+                NULL::integer, v.first_name || ' ' || v.last_name,
+                vc.name,
+                jsonb_build_object('vaccine', vc.name, 'batch_number', r.batch_number,
+                                   'next_dose_date', r.next_dose_date),
+                false
+         FROM vaccination_records r
+         JOIN vaccines vc ON vc.vaccine_id = r.vaccine_id
+         JOIN veterinarians v ON v.veterinarian_id = r.veterinarian_id
+         WHERE r.pet_id = :pet_id
+         ORDER BY occurred_at DESC
+         LIMIT :branch_limit)
+    """,
+    'invoice': """
+        (SELECT 'invoice', i.invoice_id, i.issue_date::timestamp AS occurred_at,
+                i.appointment_id, v.first_name || ' ' || v.last_name,
+                'Factura ' || i.invoice_number,
+                jsonb_build_object('invoice_number', i.invoice_number, 'total_amount', i.total_amount,
+                                   'payment_status', i.payment_status, 'payment_date', i.payment_date),
+                false
+         FROM invoices i
+         JOIN appointments a ON a.appointment_id = i.appointment_id AND a.appointment_date = i.appointment_date
+         JOIN veterinarians v ON v.veterinarian_id = a.veterinarian_id
+         WHERE a.pet_id = :pet_id
+         ORDER BY occurred_at DESC
+         LIMIT :branch_limit)
+    """,
+}
+
+# M10: lo archivado solo se lee si se pide (include_archived)
+ARCHIVED_TIMELINE_BRANCHES = {
+    'appointment': """
+        (SELECT 'appointment', a.appointment_id, a.appointment_date AS occurred_at,
+                a.appointment_id, v.first_name || ' ' || v.last_name,
+                a.data->>'reason',
+                jsonb_build_object('status', a.status, 'notes', a.data->'notes'),
+                true
+         FROM archived_appointments a
+         LEFT JOIN veterinarians v ON v.veterinarian_id = a.veterinarian_id
+         WHERE a.pet_id = :pet_id
+         ORDER BY occurred_at DESC
+         LIMIT :branch_limit)
+    """,
+    'medical_record': """
+        (SELECT 'medical_record', m.record_id, coalesce(m.created_at, a.appointment_date) AS occurred_at,
+                m.appointment_id, v.first_name || ' ' || v.last_name,
+                left(m.data->>'diagnosis', 120),
+                jsonb_build_object('diagnosis', m.data->'diagnosis', 'treatment', m.data->'treatment',
+                                   'prescription', m.data->'prescription',
+                                   'follow_up_required', m.data->'follow_up_required'),
+                true
+         FROM archived_medical_records m
+         LEFT JOIN archived_appointments a ON a.appointment_id = m.appointment_id
+         LEFT JOIN veterinarians v ON v.veterinarian_id = a.veterinarian_id
+         WHERE m.pet_id = :pet_id
+         ORDER BY occurred_at DESC
+         LIMIT :branch_limit)
+    """,
+    'invoice': """
+        (SELECT 'invoice', i.invoice_id, i.issue_date::timestamp AS occurred_at,
+                i.appointment_id, v.first_name || ' ' || v.last_name,
+                'Factura ' || i.invoice_number,
+                jsonb_build_object('invoice_number', i.invoice_number, 'total_amount', i.total_amount,
+                                   'payment_status', i.data->'payment_status', 'payment_date', i.data->'payment_date'),
+                true
+         FROM archived_invoices i
+         JOIN archived_appointments a ON a.appointment_id = i.appointment_id
+         LEFT JOIN veterinarians v ON v.veterinarian_id = a.veterinarian_id
+         WHERE a.pet_id = :pet_id
+         ORDER BY occurred_at DESC
+         LIMIT :branch_limit)
+    """,
+}
+
+TIMELINE_PET = """
+    SELECT to_jsonb(p) - 'search_text' - 'search_vector'
+           || jsonb_build_object('owner', jsonb_build_object(
+                  'owner_id', o.owner_id, 'first_name', o.first_name, 'last_name', o.last_name,
+                  'email', o.email, 'phone', o.phone, 'address', o.address,
+                  'emergency_contact', o.emergency_contact)) AS pet
+    FROM pets p
+    JOIN owners o ON o.owner_id = p.owner_id
+    WHERE p.pet_id = :pet_id
+"""
+
+def get_pet_timeline(db: Session, pet_id: int, skip: int = 0, limit: int = 50, include_archived: bool = False):
+    """
+    Devuelve (mascota con dueño, eventos, has_more); mascota None si no existe.
+    Si la mascota no tiene eventos, el LEFT JOIN igual devuelve su fila.
+    """
+    branches = list(TIMELINE_BRANCHES.values())
+    if include_archived:
+        branches += ARCHIVED_TIMELINE_BRANCHES.values()
+    sql = f"""
+        WITH events AS ({" UNION ALL ".join(branches)})
+        SELECT pet.pet, e.*
+        FROM ({TIMELINE_PET}) AS pet
+        LEFT JOIN (
+            SELECT * FROM events
+            ORDER BY occurred_at DESC, event_type, event_id
+            LIMIT :limit OFFSET :skip
+        ) AS e ON true
+        ORDER BY e.occurred_at DESC, e.event_type, e.event_id
+    """
+    rows = db.execute(text(sql), {
+        "pet_id": pet_id,
+        "branch_limit": skip + limit + 1,
+        "limit": limit + 1,
+        "skip": skip,
+    }).mappings().all()
+    if not rows:
+        return None, [], False
+    events = [{k: v for k, v in row.items() if k != "pet"} for row in rows if row["event_type"] is not None]
+    return rows[0]["pet"], events[:limit], len(events) > limit
+
+
+# --- Tareas Programadas (M12) ---
+def get_job_runs(db: Session, job_name: str = None, limit: int = 50):
+    query = db.query(models.JobRun)
+    if job_name:
+        query = query.filter(models.JobRun.job_name == job_name)
+    return query.order_by(models.JobRun.started_at.desc()).limit(limit).all()
+
+
+# --- Recordatorios (M14) ---
+def get_reminder_outbox_summary(db: Session):
+    # Mensajes por estado de envío (pending / sent / failed)
+    return db.query(
+        models.ReminderOutbox.status,
+        func.count(models.ReminderOutbox.message_id).label("messages"),
+        func.max(models.ReminderOutbox.created_at).label("last_created_at"),
+        func.max(models.ReminderOutbox.sent_at).label("last_sent_at"),
+    ).group_by(models.ReminderOutbox.status).order_by(models.ReminderOutbox.status).all()
+
+
+# --- Sincronización Incremental (M8) ---
+# El token 'since' es opaco para el cliente: guarda el cursor de cambios
+# (updated_at, id) y el de borrados (deleted_at). Al ponerse al día, el cursor
+# no avanza más allá de "ahora - SYNC_OVERLAP" para no perder filas de
+# transacciones que hicieron commit un poco después de su updated_at.
+# Las copias embebidas (owner.pets, invoice.appointment, ...) se mantienen al
+# día porque M17 sube updated_at del padre cuando cambia la fila embebida.
+SYNC_OVERLAP = timedelta(seconds=5)
+SYNC_TOMBSTONE_RETENTION = timedelta(days=30)
+
+SYNC_ENTITIES = {
+    'owners': (models.Owner, models.Owner.owner_id, lambda: [joinedload(models.Owner.pets)]),
+    'pets': (models.Pet, models.Pet.pet_id, lambda: [joinedload(models.Pet.owner)]),
+    'appointments': (models.Appointment, models.Appointment.appointment_id, lambda: [
+        joinedload(models.Appointment.pet),
+        joinedload(models.Appointment.veterinarian)
+    ]),
+    'invoices': (models.Invoice, models.Invoice.invoice_id, lambda: [
+        joinedload(models.Invoice.appointment).joinedload(models.Appointment.pet),
+        joinedload(models.Invoice.appointment).joinedload(models.Appointment.veterinarian)
+    ]),
+}
+
+def encode_sync_token(changed_at: datetime, changed_id: int, deleted_at: datetime) -> str:
+    payload = {
+        "c": [changed_at.isoformat() if changed_at else None, changed_id],
+        "d": deleted_at.isoformat() if deleted_at else None,
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+def decode_sync_token(token: str):
+    """Devuelve (changed_at, changed_id, deleted_at). Lanza ValueError si el token no es válido."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        changed_at, changed_id = payload["c"]
+        deleted_at = payload["d"]
+        return (
+            datetime.fromisoformat(changed_at) if changed_at else None,
+            int(changed_id),
+            datetime.fromisoformat(deleted_at) if deleted_at else None,
+        )
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid sync token") from e
+
+def get_sync_changes(db: Session, entity: str, since: str = None, limit: int = 500):
+    """
+    Cambios de 'entity' posteriores al token 'since' (o todo, si no hay token).
+    Devuelve un dict con: changes, deleted, next_token, has_more, reset.
+    """
+    model, pk, options = SYNC_ENTITIES[entity]
+    changed_at, changed_id, deleted_at = decode_sync_token(since) if since else (None, 0, None)
+    now = db.query(func.localtimestamp()).scalar()
+    horizon = now - SYNC_OVERLAP
+
+    # Si el cliente estuvo desconectado más que la retención de tombstones,
+    # ya no podemos decirle qué se borró: debe recargar todo.
+    reset = deleted_at is not None and deleted_at < now - SYNC_TOMBSTONE_RETENTION
+    if reset:
+        changed_at, changed_id, deleted_at = None, 0, None
+
+    query = db.query(model).options(*options())
+    if changed_at is not None:
+        query = query.filter(tuple_(model.updated_at, pk) > tuple_(changed_at, changed_id))
+    rows = query.order_by(model.updated_at, pk).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    deleted = []
+    if deleted_at is not None:
+        tombstones = db.query(models.SyncTombstone.entity_id, models.SyncTombstone.deleted_at).filter(
+            models.SyncTombstone.entity == entity,
+            models.SyncTombstone.deleted_at > deleted_at
+        ).order_by(models.SyncTombstone.deleted_at).all()
+        deleted = [t.entity_id for t in tombstones]
+        last_deleted = tombstones[-1].deleted_at if tombstones else deleted_at
+        next_deleted_at = max(deleted_at, min(last_deleted, horizon))
+    else:
+        # Carga completa: los borrados anteriores no importan, se empieza desde ahora
+        next_deleted_at = horizon
+
+    if has_more:
+        next_changed_at, next_changed_id = rows[-1].updated_at, getattr(rows[-1], pk.key)
+    elif rows and rows[-1].updated_at <= horizon:
+        next_changed_at, next_changed_id = rows[-1].updated_at, getattr(rows[-1], pk.key)
+    else:
+        # Filas muy recientes (o ninguna): el cursor queda en el horizonte y lo
+        # que esté dentro de la ventana se reenviará en la próxima llamada
+        next_changed_at, next_changed_id = horizon, 0
+        if changed_at is not None and changed_at >= horizon:
+            next_changed_at, next_changed_id = changed_at, changed_id
+
+    return {
+        "changes": rows,
+        "deleted": deleted,
+        "next_token": encode_sync_token(next_changed_at, next_changed_id, next_deleted_at),
+        "has_more": has_more,
+        "reset": reset,
+    }
+
+def purge_sync_tombstones(db: Session, older_than: timedelta = SYNC_TOMBSTONE_RETENTION):
+    cutoff = datetime.now() - older_than
+    purged = db.query(models.SyncTombstone).filter(
+        models.SyncTombstone.deleted_at < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+    return purged
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+
+# --- Bus de Eventos (LISTEN/NOTIFY de PostgreSQL + historial por proceso) ---
+# Los cambios de citas y facturas se publican desde crud.py y jobs.py (después
+# del commit) y se reparten a los clientes conectados a /events/stream
+# (Server-Sent Events). El transporte es NOTIFY en el canal EVENTS_CHANNEL:
+# cada proceso del API escucha con LISTEN en un hilo, así que un evento
+# publicado por otro worker o por el cron (python -m app.jobs) llega a todos.
+# Al recibirlo, cada proceso le asigna su propio número de secuencia y lo
+# guarda en un historial corto: un cliente que se reconecta con
+# 'Last-Event-ID' recupera lo que se perdió. El id SSE es '{boot}-{secuencia}':
+# un id de otro proceso (el API se reinició o el cliente cayó en otro worker)
+# no se compara con la secuencia local. 'origin' identifica al evento en todos
+# los procesos (lo usa la caché del frontend).
+# Fuera de PostgreSQL, con EVENTS_TRANSPORT=memory o si NOTIFY falla, el evento
+# se entrega solo en el proceso que lo publicó (fail-open).
+
+logger = logging.getLogger(__name__)
+
+EVENTS_TRANSPORT = os.getenv("EVENTS_TRANSPORT", "postgres").lower() # 'postgres' | 'memory'
+EVENTS_CHANNEL = "clinica_events"
+HISTORY_SIZE = 1000
+LISTEN_POLL_SECONDS = 5 # también es cada cuánto se revisa que la conexión siga viva
+RECONNECT_DELAY_SECONDS = 5
+TRANSPORT_ERROR_LOG_INTERVAL = 60 # no llenar el log si la BD está caída
+# La secuencia es por proceso y vuelve a 1 al reiniciar: quien necesite una
+# identidad global del evento usa 'origin'
+BOOT_ID = uuid.uuid4().hex[:12]
+
+
+class PostgresTransport:
+    """NOTIFY para publicar; un hilo con LISTEN entrega lo recibido al bus local."""
+    def __init__(self, engine):
+        self.engine = engine
+        self.listening = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_error_log = 0.0
+
+    def send(self, event: dict) -> bool:
+        try:
+            with self.engine.connect() as conn:
+                conn.exec_driver_sql("SELECT pg_notify(%(channel)s, %(payload)s)",
+                                     {"channel": EVENTS_CHANNEL, "payload": json.dumps(event, default=str)})
+                conn.commit()
+            return True
+        except Exception as e:
+            self._error("Could not NOTIFY event, delivering it in this process only", e)
+            return False
+
+    def start(self, callback) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, args=(callback,), name="events-listen", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _listen(self, callback) -> None:
+        while not self._stop.is_set():
+            raw = None
+            try:
+                raw = self.engine.raw_connection()
+                raw.detach() # la conexión queda con LISTEN: no debe volver al pool
+                conn = raw.driver_connection
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {EVENTS_CHANNEL}")
+                self.listening = True
+                while not self._stop.is_set():
+                    if not select.select([conn], [], [], LISTEN_POLL_SECONDS)[0]:
+                        conn.cursor().execute("SELECT 1") # falla si la BD se cayó
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        callback(json.loads(conn.notifies.pop(0).payload))
+            except Exception as e:
+                self._error("Event channel (LISTEN) unavailable, retrying", e)
+            finally:
+                self.listening = False
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+            self._stop.wait(RECONNECT_DELAY_SECONDS)
+        self._thread = None
+
+    def _error(self, message: str, error: Exception) -> None:
+        now = time.monotonic()
+        if now - self._last_error_log > TRANSPORT_ERROR_LOG_INTERVAL:
+            self._last_error_log = now
+            logger.warning("%s: %s", message, error)
+
+
+def create_transport():
+    if EVENTS_TRANSPORT != "postgres":
+        return None
+    from .database import engine
+    if engine.dialect.name != "postgresql":
+        return None
+    return PostgresTransport(engine)
+
+
+_UNSET = object()
+
+class EventBus:
+    def __init__(self, history_size: int = HISTORY_SIZE, transport=_UNSET):
+        self._lock = threading.Lock()
+        self._seq = 0       # eventos entregados en este proceso (ids SSE)
+        self._published = 0 # eventos publicados por este proceso ('origin')
+        self._history = deque(maxlen=history_size)
+        self._origins = set() # 'origin' de los eventos del historial
+        self._subscribers = set()
+        self._transport = transport
+
+    @property
+    def transport(self):
+        if self._transport is _UNSET:
+            with self._lock:
+                if self._transport is _UNSET:
+                    self._transport = create_transport()
+        return self._transport
+
+    def publish(self, topic: str, action: str, entity_id: int, **data) -> dict:
+        """
+        Publica un evento para todos los procesos. Es seguro llamarlo desde los
+        hilos del threadpool (los endpoints síncronos).
+        """
+        with self._lock:
+            self._published += 1
+            origin = f"{BOOT_ID}-{self._published}"
+        event = {
+            "origin": origin,
+            "topic": topic,
+            "action": action,
+            "entity_id": entity_id,
+            "data": data,
+            "ts": datetime.now(timezone.utc).isoformat(),
+        }
+        transport = self.transport
+        # Si este proceso ya escuchaba, el evento le vuelve por LISTEN; si no
+        # (arranque, reconexión, cron), se entrega aquí mismo
+        listening = transport is not None and transport.listening
+        if not (transport is not None and transport.send(event) and listening):
+            return self.deliver(event)
+        return event
+
+    def deliver(self, event: dict) -> dict:
+        """
+        Guarda el evento en el historial con el siguiente id local y lo reparte
+        a los suscriptores, cada uno en su propio loop. Lo llama el hilo de LISTEN
+        (o publish, sin transporte); un 'origin' repetido se ignora.
+        """
+        with self._lock:
+            if event["origin"] in self._origins:
+                return event
+            if len(self._history) == self._history.maxlen:
+                self._origins.discard(self._history[0]["origin"])
+            self._seq += 1
+            event = {**event, "id": self._seq, "boot": BOOT_ID}
+            self._history.append(event)
+            self._origins.add(event["origin"])
+            subscribers = list(self._subscribers)
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # El loop del suscriptor ya se cerró; se limpia al desuscribirse
+                pass
+        return event
+
+    def subscribe(self) -> tuple:
+        """Registra un suscriptor en el loop actual. Devuelve el token para desuscribirse."""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: tuple) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def since(self, last_id: int) -> list:
+        """Eventos del historial posteriores a 'last_id' (para reconexiones)."""
+        with self._lock:
+            return [e for e in self._history if e["id"] > last_id]
+
+    @property
+    def last_id(self) -> int:
+        return self._seq
+
+
+bus = EventBus()
+
+def publish(topic: str, action: str, entity_id: int, **data) -> dict:
+    return bus.publish(topic, action, entity_id, **data)
+
+def start_listener() -> None:
+    """Empieza a recibir los eventos de todos los procesos (arranque del API)."""
+    if bus.transport is not None:
+        bus.transport.start(bus.deliver)
+
+def stop_listener() -> None:
+    if bus.transport is not None:
+        bus.transport.stop()
+
+def parse_sse_id(value: str) -> tuple:
+    """'{boot}-{secuencia}' -> (boot, secuencia); (None, 0) si no viene o no es válido."""
+    boot, _, seq = (value or "").strip().rpartition("-")
+    if not boot or not seq.isdigit():
+        return None, 0
+    return boot, int(seq)
+
+def resync_event(topic: str) -> dict:
+    """
+    Evento sintético para un cliente cuyo Last-Event-ID es de otro proceso: no
+    se sabe qué se perdió, así que debe recargar todo lo de ese tema.
+    """
+    return {
+        "id": bus.last_id,
+        "boot": BOOT_ID,
+        "origin": None,
+        "topic": topic,
+        "action": "resync",
+        "entity_id": None,
+        "data": {},
+        "ts": datetime.now(timezone.utc).isoformat(),
+    }
+
+def format_sse(event: dict) -> str:
+    """Serializa un evento en el formato de texto de Server-Sent Events."""
+    return (f"id: {event['boot']}-{event['id']}\nevent: {event['topic']}\n"
+            f"data: {json.dumps(event, default=str)}\n\n")
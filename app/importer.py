@@ -0,0 +1,341 @@
+import argparse
+import csv
+import io
+import logging
+import os
+import re
+import time
+import uuid
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# --- Importación Masiva (CSV / Parquet) ---
+# Para clínicas que migran con decenas de miles de dueños y mascotas. En vez de
+# un POST por fila, el archivo se lee por bloques de IMPORT_CHUNK_ROWS filas y
+# cada bloque:
+#   1. se valida con operaciones vectorizadas de pandas (sin bucles por fila),
+#   2. resuelve emails de dueños, microchips, vacunas y licencias con UNA
+#      consulta por bloque (JOIN contra unnest del arreglo de claves),
+#   3. se escribe con COPY a una tabla temporal y de ahí con un solo
+#      INSERT ... SELECT ... ON CONFLICT DO NOTHING a la tabla real,
+#   4. hace commit (un bloque con errores no deshace los anteriores).
+# Las filas rechazadas van a un CSV con el número de fila y el motivo.
+#
+# Orden: owners -> pets (por owner_email) -> vaccinations (por pet_microchip).
+# Uso:  python -m app.importer owners dueños.csv [--rejects rechazos.csv]
+# Endpoint: POST /import/{kind} (ver main.py)
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_ROWS = int(os.getenv("IMPORT_CHUNK_ROWS", "20000"))
+IMPORT_REJECTS_DIR = os.getenv("IMPORT_REJECTS_DIR", "imports/rejects")
+
+EMAIL_PATTERN = r"^[^@\s]+@[^@\s]+\.[^@\s]+$"
+TRUE_VALUES = {"true", "t", "1", "yes", "y", "si", "sí", "s"}
+FALSE_VALUES = {"false", "f", "0", "no", "n"}
+
+# Columnas esperadas en el archivo de cada tipo (las que faltan se toman como vacías)
+IMPORT_COLUMNS = {
+    'owners': ['first_name', 'last_name', 'email', 'phone', 'address',
+               'emergency_contact', 'preferred_payment_method'],
+    'pets': ['owner_email', 'name', 'species', 'breed', 'birth_date', 'weight',
+             'microchip_number', 'is_neutered', 'blood_type'],
+    'vaccinations': ['pet_microchip', 'vaccine_name', 'veterinarian_license',
+                     'vaccination_date', 'next_dose_date', 'batch_number'],
+}
+
+# Búsquedas por bloque: un JOIN contra unnest() deja que Postgres use el índice
+# (o un hash join) en vez de comparar cada fila con todo el arreglo.
+OWNERS_BY_EMAIL = """
+    SELECT k.key, o.owner_id FROM unnest(CAST(:keys AS text[])) AS k(key)
+    JOIN owners o ON lower(o.email) = k.key
+"""
+PETS_BY_MICROCHIP = """
+    SELECT k.key, p.pet_id FROM unnest(CAST(:keys AS text[])) AS k(key)
+    JOIN pets p ON p.microchip_number = k.key
+"""
+VETERINARIANS_BY_LICENSE = """
+    SELECT k.key, v.veterinarian_id FROM unnest(CAST(:keys AS text[])) AS k(key)
+    JOIN veterinarians v ON v.license_number = k.key
+"""
+
+
+class ImportErrorList:
+    """Primer motivo de rechazo de cada fila del bloque (None = fila válida)."""
+    def __init__(self, index):
+        self.reasons = pd.Series(None, index=index, dtype="object")
+
+    def add(self, mask, reason: str) -> None:
+        mask = mask.fillna(False).astype(bool) & self.reasons.isna()
+        self.reasons[mask] = reason
+
+    @property
+    def valid(self):
+        return self.reasons.isna()
+
+
+# --- Validaciones vectorizadas ---
+
+def _text(df, column, errors, max_length=None, required=False):
+    values = df[column].astype("string").str.strip()
+    values = values.mask(values == "")
+    if required:
+        errors.add(values.isna(), f"{column}: requerido")
+    if max_length:
+        errors.add(values.str.len() > max_length, f"{column}: más de {max_length} caracteres")
+    return values
+
+
+def _choice(df, column, errors, allowed, required=False):
+    values = _text(df, column, errors, required=required).str.lower()
+    errors.add(values.notna() & ~values.isin(allowed), f"{column}: debe ser uno de {', '.join(allowed)}")
+    return values
+
+
+def _date(df, column, errors, required=False):
+    raw = _text(df, column, errors, required=required)
+    parsed = pd.to_datetime(raw, errors="coerce", format="ISO8601")
+    errors.add(raw.notna() & parsed.isna(), f"{column}: fecha inválida (AAAA-MM-DD)")
+    return parsed
+
+
+def _bool(df, column, errors, default=False):
+    raw = _text(df, column, errors).str.lower()
+    errors.add(raw.notna() & ~raw.isin(TRUE_VALUES | FALSE_VALUES), f"{column}: debe ser sí/no")
+    return raw.isin(TRUE_VALUES).where(raw.notna(), default)
+
+
+def _unique_in_file(values, column, errors, seen: set):
+    """Rechaza claves repetidas dentro del archivo (en este bloque o en uno anterior)."""
+    errors.add(values.notna() & (values.duplicated() | values.isin(seen)), f"{column}: repetido en el archivo")
+
+
+def _lookup(db: Session, sql: str, keys) -> dict:
+    keys = sorted(set(keys))
+    if not keys:
+        return {}
+    return dict(db.execute(text(sql), {"keys": keys}).all())
+
+
+# --- Preparación por tipo: devuelve (filas a insertar, clave de conflicto) ---
+
+def _prepare_owners(db: Session, df, errors, state):
+    email = _text(df, 'email', errors, max_length=255, required=True).str.lower()
+    errors.add(email.notna() & ~email.str.match(EMAIL_PATTERN), "email: formato inválido")
+    rows = pd.DataFrame({
+        'first_name': _text(df, 'first_name', errors, max_length=100, required=True),
+        'last_name': _text(df, 'last_name', errors, max_length=100, required=True),
+        'email': email,
+        'phone': _text(df, 'phone', errors, max_length=30),
+        'address': _text(df, 'address', errors),
+        'emergency_contact': _text(df, 'emergency_contact', errors, max_length=30),
+        'preferred_payment_method': _choice(df, 'preferred_payment_method', errors,
+                                            ['cash', 'credit', 'debit', 'insurance']),
+    })
+    _unique_in_file(email, 'email', errors, state["seen"])
+    existing = _lookup(db, OWNERS_BY_EMAIL, email[errors.valid].dropna())
+    errors.add(email.isin(list(existing)), "email: el dueño ya existe")
+    state["seen"].update(email[errors.valid])
+    return rows, 'email'
+
+
+def _prepare_pets(db: Session, df, errors, state):
+    owner_email = _text(df, 'owner_email', errors, required=True).str.lower()
+    microchip = _text(df, 'microchip_number', errors, max_length=50)
+    birth_date = _date(df, 'birth_date', errors)
+    errors.add(birth_date > pd.Timestamp(date.today()), "birth_date: no puede ser futura")
+    raw_weight = _text(df, 'weight', errors)
+    weight = pd.to_numeric(raw_weight, errors="coerce")
+    errors.add(raw_weight.notna() & weight.isna(), "weight: no es un número")
+    errors.add((weight <= 0) | (weight >= 10000), "weight: fuera de rango")
+    rows = pd.DataFrame({
+        'name': _text(df, 'name', errors, max_length=100, required=True),
+        'species': _choice(df, 'species', errors, ['dog', 'cat', 'bird', 'rabbit', 'other'], required=True),
+        'breed': _text(df, 'breed', errors, max_length=100),
+        'birth_date': birth_date.dt.strftime("%Y-%m-%d"),
+        'weight': weight.round(2),
+        'microchip_number': microchip,
+        'is_neutered': _bool(df, 'is_neutered', errors),
+        'blood_type': _text(df, 'blood_type', errors, max_length=10),
+    })
+    _unique_in_file(microchip, 'microchip_number', errors, state["seen"])
+
+    owners = _lookup(db, OWNERS_BY_EMAIL, owner_email[errors.valid].dropna())
+    rows['owner_id'] = owner_email.map(owners).astype("Int64")
+    errors.add(owner_email.notna() & rows['owner_id'].isna(), "owner_email: dueño no encontrado")
+    existing = _lookup(db, PETS_BY_MICROCHIP, microchip[errors.valid].dropna())
+    errors.add(microchip.isin(list(existing)), "microchip_number: ya registrado")
+    state["seen"].update(microchip[errors.valid].dropna())
+    return rows, 'microchip_number'
+
+
+def _prepare_vaccinations(db: Session, df, errors, state):
+    if "vaccines" not in state:
+        # Catálogo pequeño: se carga una vez por importación
+        state["vaccines"] = {name.lower(): vaccine_id for vaccine_id, name in
+                             db.execute(text("SELECT vaccine_id, name FROM vaccines")).all()}
+    microchip = _text(df, 'pet_microchip', errors, required=True)
+    vaccine = _text(df, 'vaccine_name', errors, required=True).str.lower()
+    license_number = _text(df, 'veterinarian_license', errors, required=True)
+    vaccination_date = _date(df, 'vaccination_date', errors, required=True)
+    next_dose_date = _date(df, 'next_dose_date', errors)
+    errors.add(vaccination_date > pd.Timestamp(date.today()), "vaccination_date: no puede ser futura")
+    errors.add(next_dose_date < vaccination_date, "next_dose_date: anterior a vaccination_date")
+
+    pets = _lookup(db, PETS_BY_MICROCHIP, microchip[errors.valid].dropna())
+    vets = _lookup(db, VETERINARIANS_BY_LICENSE, license_number[errors.valid].dropna())
+    rows = pd.DataFrame({
+        'pet_id': microchip.map(pets).astype("Int64"),
+        'vaccine_id': vaccine.map(state["vaccines"]).astype("Int64"),
+        'veterinarian_id': license_number.map(vets).astype("Int64"),
+        'vaccination_date': vaccination_date.dt.strftime("%Y-%m-%d"),
+        'next_dose_date': next_dose_date.dt.strftime("%Y-%m-%d"),
+        'batch_number': _text(df, 'batch_number', errors, max_length=50),
+    })
+    errors.add(microchip.notna() & rows['pet_id'].isna(), "pet_microchip: mascota no encontrada")
+    errors.add(vaccine.notna() & rows['vaccine_id'].isna(), "vaccine_name: vacuna no encontrada")
+    errors.add(license_number.notna() & rows['veterinarian_id'].isna(), "veterinarian_license: veterinario no encontrado")
+    return rows, None
+
+
+PREPARERS = {
+    'owners': _prepare_owners,
+    'pets': _prepare_pets,
+    'vaccinations': _prepare_vaccinations,
+}
+TARGET_TABLES = {
+    'owners': 'owners',
+    'pets': 'pets',
+    'vaccinations': 'vaccination_records',
+}
+
+
+# --- Escritura con COPY ---
+
+def copy_rows(db: Session, table: str, rows, conflict_column: str = None) -> set:
+    """
+    COPY de 'rows' a una tabla temporal y de ahí a 'table' en un solo INSERT.
+    Devuelve los valores de 'conflict_column' que sí se insertaron: si otra
+    petición creó el mismo email/microchip entre la búsqueda y el COPY, esa
+    fila se salta (ON CONFLICT DO NOTHING) y quien llama la rechaza.
+    """
+    columns = ", ".join(rows.columns)
+    staging = f"import_{table}"
+    db.execute(text(f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {columns} FROM {table} WITH NO DATA"))
+
+    buffer = io.StringIO()
+    rows.to_csv(buffer, index=False, header=False, na_rep="")
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+    sql = f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging}"
+    if conflict_column is None:
+        db.execute(text(sql))
+        return set()
+    return set(db.execute(text(
+        f"{sql} ON CONFLICT ({conflict_column}) DO NOTHING RETURNING {conflict_column}"
+    )).scalars())
+
+
+# --- Lectura del archivo por bloques ---
+
+def read_chunks(source, file_format: str, chunk_rows: int = IMPORT_CHUNK_ROWS):
+    """Itera DataFrames de texto; Parquet requiere pyarrow (dependencia opcional)."""
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas().astype("string")
+    else:
+        yield from pd.read_csv(source, dtype=str, keep_default_na=False, encoding="utf-8-sig",
+                               chunksize=chunk_rows)
+
+
+def detect_format(filename: str) -> str:
+    return "parquet" if filename.lower().endswith((".parquet", ".pq")) else "csv"
+
+
+def import_file(engine, kind: str, source, file_format: str = "csv", rejects_path: str = None,
+                chunk_rows: int = IMPORT_CHUNK_ROWS) -> dict:
+    """
+    Importa 'source' (ruta o archivo abierto) como 'kind'. Las filas rechazadas
+    se escriben en 'rejects_path' con las columnas originales más 'row' y 'error'.
+    """
+    if kind not in PREPARERS:
+        raise ValueError(f"Unknown import kind: {kind}")
+    if engine.dialect.name != "postgresql":
+        raise RuntimeError("Bulk import requires PostgreSQL (COPY)")
+
+    started = time.perf_counter()
+    summary = {"kind": kind, "rows": 0, "imported": 0, "rejected": 0, "rejects_file": None}
+    state = {"seen": set()}
+    first_row = 1 if file_format == "parquet" else 2 # la fila 1 del CSV es el encabezado
+
+    for chunk in read_chunks(source, file_format, chunk_rows):
+        chunk = chunk.reindex(columns=list(dict.fromkeys([*IMPORT_COLUMNS[kind], *chunk.columns])))
+        chunk = chunk.fillna("").reset_index(drop=True)
+        errors = ImportErrorList(chunk.index)
+        with Session(engine) as db:
+            rows, conflict_column = PREPARERS[kind](db, chunk, errors, state)
+            valid = rows[errors.valid]
+            if not valid.empty:
+                inserted = copy_rows(db, TARGET_TABLES[kind], valid, conflict_column)
+                if conflict_column:
+                    keys = rows[conflict_column]
+                    errors.add(keys.notna() & errors.valid & ~keys.isin(inserted),
+                               f"{conflict_column}: creado por otra sesión durante la importación")
+            db.commit()
+
+        rejected = chunk[~errors.valid].assign(row=lambda d: d.index + first_row,
+                                                error=errors.reasons[~errors.valid])
+        if not rejected.empty and rejects_path:
+            os.makedirs(os.path.dirname(os.path.abspath(rejects_path)), exist_ok=True)
+            rejected[["row", "error", *chunk.columns]].to_csv(
+                rejects_path, mode="a", index=False, header=summary["rejects_file"] is None,
+                quoting=csv.QUOTE_MINIMAL,
+            )
+            summary["rejects_file"] = rejects_path
+
+        summary["rows"] += len(chunk)
+        summary["rejected"] += len(rejected)
+        summary["imported"] += int(errors.valid.sum())
+        first_row += len(chunk)
+        logger.info("Import %s: %d rows processed, %d rejected", kind, summary["rows"], summary["rejected"])
+
+    summary["elapsed_seconds"] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+def new_rejects_path(kind: str) -> str:
+    return os.path.join(IMPORT_REJECTS_DIR, f"{kind}_{date.today():%Y%m%d}_{uuid.uuid4().hex[:8]}.csv")
+
+
+def rejects_file_path(name: str):
+    """Ruta de un archivo de rechazos por su nombre (None si no es uno de los nuestros)."""
+    if not re.fullmatch(r"[a-z]+_\d{8}_[0-9a-f]{8}\.csv", name):
+        return None
+    path = os.path.join(IMPORT_REJECTS_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    parser = argparse.ArgumentParser(description="Importación masiva de dueños, mascotas y vacunas")
+    parser.add_argument("kind", choices=list(PREPARERS))
+    parser.add_argument("path", help="Archivo .csv o .parquet")
+    parser.add_argument("--rejects", help="CSV de filas rechazadas (por defecto en IMPORT_REJECTS_DIR)")
+    parser.add_argument("--chunk-rows", type=int, default=IMPORT_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    result = import_file(engine, args.kind, args.path, detect_format(args.path),
+                         rejects_path=args.rejects or new_rejects_path(args.kind), chunk_rows=args.chunk_rows)
+    logger.info("Import finished: %s (%.0f rows/min)", result,
+                result["rows"] / max(result["elapsed_seconds"], 0.01) * 60)
@@ -0,0 +1,88 @@
+import argparse
+import sys
+
+from sqlalchemy import PrimaryKeyConstraint, UniqueConstraint, text
+
+# --- Revisión de Índices de Claves Foráneas (M11) ---
+# Una FK sin índice obliga a recorrer la tabla hija completa en cada JOIN por
+# esa columna y en cada DELETE/UPDATE del padre. Este chequeo falla si alguna
+# FK no está cubierta por un índice:
+#   - de los modelos (no necesita BD):   python -m app.indexes
+#   - de la base real (tras migrar):     python -m app.indexes --db
+# Sale con código 1 si falta alguno, para usarlo en CI o después de alembic upgrade.
+#
+# Una FK está cubierta si un índice EMPIEZA por sus columnas (en cualquier
+# orden), o si un índice único usa solo columnas de la FK (como el UNIQUE de
+# medical_records.appointment_id, que cubre la FK compuesta de M9).
+
+UNINDEXED_FOREIGN_KEYS_SQL = """
+    SELECT c.conrelid::regclass::text AS table_name, c.conname,
+           array_agg(a.attname::text ORDER BY k.ord) AS columns
+    FROM pg_constraint c
+    JOIN pg_class t ON t.oid = c.conrelid
+    CROSS JOIN LATERAL unnest(c.conkey) WITH ORDINALITY AS k(attnum, ord)
+    JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = k.attnum
+    WHERE c.contype = 'f'
+      AND c.conparentid = 0 -- las copias de la FK en cada partición se revisan en el padre
+      AND NOT t.relispartition
+      AND t.relnamespace = 'public'::regnamespace
+      AND NOT EXISTS (
+          SELECT 1 FROM pg_index i
+          WHERE i.indrelid = c.conrelid
+            AND i.indpred IS NULL
+            AND (
+                ((i.indkey::int2[])[0:cardinality(c.conkey) - 1] @> c.conkey
+                 AND (i.indkey::int2[])[0:cardinality(c.conkey) - 1] <@ c.conkey)
+                OR (i.indisunique AND (i.indkey::int2[]) <@ c.conkey)
+            )
+      )
+    GROUP BY c.conrelid, c.conname
+    ORDER BY 1, 2
+"""
+
+
+def _covers(index_columns: list, fk_columns: set, unique: bool) -> bool:
+    leading = set(index_columns[:len(fk_columns)])
+    return leading == fk_columns or (unique and set(index_columns) <= fk_columns)
+
+
+def unindexed_foreign_keys(metadata) -> list:
+    """FKs de los modelos sin índice que las cubra: [(tabla, [columnas]), ...]."""
+    missing = []
+    for table in metadata.sorted_tables:
+        indexes = [([c.name for c in index.columns], index.unique) for index in table.indexes]
+        for constraint in table.constraints:
+            if isinstance(constraint, (PrimaryKeyConstraint, UniqueConstraint)):
+                indexes.append(([c.name for c in constraint.columns], True))
+        for fk in table.foreign_key_constraints:
+            fk_columns = [c.name for c in fk.columns]
+            if not any(_covers(columns, set(fk_columns), unique) for columns, unique in indexes):
+                missing.append((table.name, fk_columns))
+    return missing
+
+
+def unindexed_foreign_keys_in_db(engine) -> list:
+    """Lo mismo, leyendo el catálogo de PostgreSQL (lo que realmente creó alembic)."""
+    with engine.connect() as conn:
+        rows = conn.execute(text(UNINDEXED_FOREIGN_KEYS_SQL)).all()
+    return [(row.table_name, list(row.columns)) for row in rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verifica que toda clave foránea tenga índice")
+    parser.add_argument("--db", action="store_true", help="Revisar la base de datos en vez de los modelos")
+    args = parser.parse_args()
+
+    if args.db:
+        from .database import engine
+        missing = unindexed_foreign_keys_in_db(engine)
+    else:
+        from .database import Base
+        from . import models # noqa: F401 (registra las tablas en Base.metadata)
+        missing = unindexed_foreign_keys(Base.metadata)
+
+    for table, columns in missing:
+        print(f"FK sin índice: {table} ({', '.join(columns)})")
+    if missing:
+        sys.exit(1)
+    print("OK: todas las claves foráneas tienen índice.")
@@ -0,0 +1,271 @@
+import argparse
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from sqlalchemy import TIMESTAMP, text
+from sqlalchemy.orm import Session
+
+from . import events, models, numbering, partitions, reminders
+
+# --- Tareas Programadas ---
+# Cada tarea corre bajo un advisory lock (si la API tiene varios workers y
+# además hay un cron, solo uno la ejecuta a la vez) y deja una fila en
+# 'job_runs' (M12) con su duración, filas afectadas y resultado.
+#
+# Uso (cron):  python -m app.jobs overdue_invoices
+#              python -m app.jobs auto_invoices     (cierre del día)
+#              python -m app.jobs send_reminders    (worker de la outbox, ver app/reminders.py)
+# En la API:   JOBS_ENABLED=true las corre en un hilo cada JOBS_INTERVAL_SECONDS.
+
+logger = logging.getLogger(__name__)
+
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "false").lower() == "true"
+JOBS_INTERVAL_SECONDS = int(os.getenv("JOBS_INTERVAL_SECONDS", "3600"))
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "5000")) # ancho de cada rango de ids
+JOB_LOCK_TIMEOUT = os.getenv("JOB_LOCK_TIMEOUT", "2s")
+
+# Días desde issue_date tras los cuales una factura 'pending' pasa a 'overdue'
+INVOICE_DUE_DAYS = int(os.getenv("INVOICE_DUE_DAYS", "30"))
+
+# Facturación automática: impuesto sobre consultation_fee y ventana hacia atrás
+INVOICE_TAX_RATE = Decimal(os.getenv("INVOICE_TAX_RATE", "0.13"))
+AUTO_INVOICE_LOOKBACK_DAYS = int(os.getenv("AUTO_INVOICE_LOOKBACK_DAYS", "30"))
+
+
+@contextmanager
+def job_run(engine, job_name: str):
+    """
+    Registra una corrida en job_runs. Quien la usa acumula en run["rows"] y
+    run["details"]; si la tarea lanza una excepción queda como 'failed'.
+    """
+    run = {"rows": 0, "details": {}, "status": "success", "error": None}
+    started_at = datetime.now()
+    started = time.perf_counter()
+    try:
+        yield run
+    except Exception as e:
+        run["status"], run["error"] = "failed", str(e)[:2000]
+        raise
+    finally:
+        duration_ms = int((time.perf_counter() - started) * 1000)
+        with engine.begin() as conn:
+            conn.execute(models.JobRun.__table__.insert().values(
+                job_name=job_name, started_at=started_at, finished_at=datetime.now(),
+                duration_ms=duration_ms, rows_affected=run["rows"], status=run["status"],
+                error=run["error"], details=run["details"],
+            ))
+        logger.info("Job %s %s in %d ms (%d rows)", job_name, run["status"], duration_ms, run["rows"])
+
+
+# --- Facturas Vencidas ---
+# Se recorre el rango de invoice_id de las vencidas en tramos de JOB_BATCH_SIZE.
+# Cada tramo es su propia transacción corta: bloquea como mucho un tramo de
+# filas, y SKIP LOCKED salta las que la API esté editando en ese momento (la
+# próxima corrida las toma). issue_date < :due_before descarta las particiones
+# recientes (M9). El trigger de M8 actualiza updated_at, así /sync las ve.
+STALE_INVOICE_RANGE = """
+    SELECT min(invoice_id), max(invoice_id) FROM invoices
+    WHERE payment_status = 'pending' AND issue_date < :due_before
+"""
+
+MARK_OVERDUE = """
+    WITH batch AS (
+        SELECT invoice_id, issue_date FROM invoices
+        WHERE invoice_id >= :lo AND invoice_id < :hi
+          AND payment_status = 'pending' AND issue_date < :due_before
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE invoices AS i SET payment_status = 'overdue'
+    FROM batch
+    WHERE i.invoice_id = batch.invoice_id AND i.issue_date = batch.issue_date
+    RETURNING i.invoice_id, i.total_amount
+"""
+
+def sweep_overdue_invoices(engine, due_days: int = INVOICE_DUE_DAYS, batch_size: int = JOB_BATCH_SIZE) -> dict:
+    """Pasa a 'overdue' las facturas 'pending' emitidas hace más de 'due_days' días."""
+    due_before = date.today() - timedelta(days=due_days)
+    with job_run(engine, "overdue_invoices") as run:
+        with engine.connect() as conn:
+            low, high = conn.execute(text(STALE_INVOICE_RANGE), {"due_before": due_before}).one()
+        overdue_amount = Decimal("0.00")
+        batches = 0
+        if low is not None:
+            try:
+                for lo in range(low, high + 1, batch_size):
+                    with engine.begin() as conn:
+                        conn.execute(text(f"SET LOCAL lock_timeout = '{JOB_LOCK_TIMEOUT}'"))
+                        rows = conn.execute(text(MARK_OVERDUE), {
+                            "lo": lo, "hi": lo + batch_size, "due_before": due_before,
+                        }).all()
+                    batches += 1
+                    run["rows"] += len(rows)
+                    for row in rows:
+                        overdue_amount += row.total_amount
+            finally:
+                # Un solo evento por corrida (también si falla a medias, por los
+                # lotes ya confirmados): uno por factura llenaría el historial
+                # del bus y haría recargar cada página abierta miles de veces
+                if run["rows"]:
+                    events.publish("invoices", "overdue_batch", None, count=run["rows"], payment_status="overdue")
+        # Los reportes de ingresos y antigüedad se calculan al leer, no hay
+        # agregados que refrescar; el monto queda en el registro de la corrida.
+        run["details"] = {"due_before": due_before.isoformat(), "batches": batches,
+                          "overdue_amount": str(overdue_amount)}
+    return run
+
+
+# --- Facturación Automática de Citas Completadas ---
+# Anti-join: citas 'completed' de la ventana sin factura. En PostgreSQL se
+# consulta 'invoice_keys' (M9): un solo índice único por appointment_id, que
+# además incluye las facturas ya archivadas (M10); en SQLite, 'invoices'.
+# Es idempotente y se retoma sola: todo se inserta en UNA transacción, así que
+# si algo falla no queda nada a medias y la siguiente corrida vuelve a tomar
+# las mismas citas. Si la API factura a mano una cita al mismo tiempo, el
+# UNIQUE de invoice_keys aborta la corrida y la próxima ya no la incluye.
+UNINVOICED_APPOINTMENTS = """
+    SELECT a.appointment_id, a.appointment_date, v.consultation_fee
+    FROM appointments a
+    JOIN veterinarians v ON v.veterinarian_id = a.veterinarian_id
+    WHERE a.status = 'completed'
+      AND a.appointment_date >= :since AND a.appointment_date < :until
+      AND NOT EXISTS (SELECT 1 FROM {invoiced} k WHERE k.appointment_id = a.appointment_id)
+    ORDER BY a.appointment_date, a.appointment_id
+"""
+
+def _price(fee: Decimal) -> dict:
+    tax = (fee * INVOICE_TAX_RATE).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    return {"subtotal": fee, "tax_amount": tax, "total_amount": fee + tax}
+
+def invoice_completed_appointments(engine, lookback_days: int = AUTO_INVOICE_LOOKBACK_DAYS) -> dict:
+    """Crea la factura 'pending' de cada cita completada que aún no tenga una."""
+    until = date.today() + timedelta(days=1)
+    since = until - timedelta(days=lookback_days + 1)
+    invoiced = "invoice_keys" if engine.dialect.name == "postgresql" else "invoices"
+    with job_run(engine, "auto_invoices") as run:
+        with Session(engine) as db:
+            if engine.dialect.name == "postgresql":
+                db.execute(text(f"SET LOCAL lock_timeout = '{JOB_LOCK_TIMEOUT}'"))
+            query = text(UNINVOICED_APPOINTMENTS.format(invoiced=invoiced)).columns(appointment_date=TIMESTAMP)
+            candidates = db.execute(query, {"since": since, "until": until}).all()
+            billable = [c for c in candidates if c.consultation_fee is not None]
+
+            # Números en un pedido por año (un bloque o un solo UPDATE del contador)
+            by_year = {}
+            for c in billable:
+                by_year.setdefault(c.appointment_date.year, []).append(c)
+            rows = []
+            for year, appointments in by_year.items():
+                numbers = numbering.allocate_invoice_numbers(db, date(year, 1, 1), len(appointments))
+                for appt, number in zip(appointments, numbers):
+                    issue_date = appt.appointment_date.date()
+                    rows.append({"appointment_id": appt.appointment_id, "invoice_number": number,
+                                 "issue_date": issue_date, "payment_status": "pending",
+                                 **_price(appt.consultation_fee)})
+
+            for month in {(r["issue_date"].year, r["issue_date"].month) for r in rows}:
+                partitions.ensure_partition_for(db, "invoices", date(*month, 1)) # M9
+            created = []
+            if rows:
+                invoices = models.Invoice.__table__
+                created = db.execute(
+                    invoices.insert().returning(invoices.c.invoice_id, invoices.c.total_amount), rows
+                ).all()
+            db.commit()
+
+        if created:
+            events.publish("invoices", "created_batch", None, count=len(created), payment_status="pending")
+        run["rows"] = len(created)
+        run["details"] = {"since": since.isoformat(), "candidates": len(candidates),
+                          "skipped_without_fee": len(candidates) - len(billable),
+                          "billed_amount": str(sum((i.total_amount for i in created), Decimal("0.00")))}
+    return run
+
+
+# --- Recordatorios de Vacunación (M14) ---
+def queue_vaccination_reminders(engine) -> dict:
+    """Encola (set-based) los recordatorios de dosis próximas, uno por dueño."""
+    with job_run(engine, "vaccination_reminders") as run:
+        run["details"] = reminders.enqueue_vaccination_reminders(engine)
+        run["rows"] = run["details"]["doses"]
+    return run
+
+def send_reminders(engine) -> dict:
+    """Despacha la outbox por el transporte configurado (REMINDER_TRANSPORT)."""
+    with job_run(engine, "send_reminders") as run:
+        run["details"] = reminders.dispatch_reminders(engine)
+        run["rows"] = run["details"]["sent"]
+    return run
+
+
+# --- Registro y ejecución ---
+# El scheduler las corre en este orden (primero se encola, después se envía)
+JOBS = {
+    "overdue_invoices": sweep_overdue_invoices,
+    "auto_invoices": invoice_completed_appointments,
+    "vaccination_reminders": queue_vaccination_reminders,
+    "send_reminders": send_reminders,
+}
+
+def run_job(engine, job_name: str) -> dict:
+    """
+    Ejecuta una tarea si nadie más la está corriendo (pg_try_advisory_lock).
+    Devuelve el resultado, o None si otro proceso tenía el lock.
+    """
+    if engine.dialect.name != "postgresql":
+        return JOBS[job_name](engine)
+    with engine.connect() as lock_conn:
+        locked = lock_conn.execute(text("SELECT pg_try_advisory_lock(hashtext(:key))"),
+                                   {"key": f"job:{job_name}"}).scalar()
+        lock_conn.commit()
+        if not locked:
+            logger.info("Job %s already running elsewhere, skipped", job_name)
+            return None
+        try:
+            return JOBS[job_name](engine)
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(hashtext(:key))"), {"key": f"job:{job_name}"})
+            lock_conn.commit()
+
+
+class JobScheduler:
+    """Hilo que corre todas las tareas cada 'interval' segundos (JOBS_ENABLED=true)."""
+    def __init__(self, engine, interval: int = JOBS_INTERVAL_SECONDS):
+        self.engine = engine
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._loop, name="job-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            for job_name in JOBS:
+                try:
+                    run_job(self.engine, job_name)
+                except Exception:
+                    # Ya quedó registrada como 'failed' en job_runs; se reintenta en la próxima vuelta
+                    logger.exception("Job %s failed", job_name)
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    parser = argparse.ArgumentParser(description="Ejecuta tareas programadas")
+    parser.add_argument("job", choices=list(JOBS))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    result = run_job(engine, args.job)
+    logger.info("Result: %s", result)
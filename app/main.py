@@ -1,27 +1,88 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, Query, UploadFile, File
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from datetime import date, datetime
 from decimal import Decimal
 # ---  IMPORTS PARA RATE LIMITING ---
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
 from starlette.requests import Request
+from starlette.responses import FileResponse, Response, StreamingResponse
+from pydantic import TypeAdapter
+import asyncio
+import logging
+import os
 
 # Importaciones locales
-from . import crud, models, schemas, auth, security
+from . import crud, models, schemas, auth, security, events, partitions, importer, jobs, numbering
+from .cache import agenda_cache
 from .database import engine, get_db
+from .ratelimit import RateLimitExceeded, create_limiter, rate_limit_exceeded_handler
+from .metrics import setup_metrics
+from .profiling import setup_profiling
+from .slow_queries import setup_slow_query_log
+from .tracing import setup_tracing
+
+logger = logging.getLogger(__name__)
+
 # --- CONFIGURACIÓN DE RATE LIMITER ---
-# Inicializa el limiter y le dice que use Redis en localhost
-limiter = Limiter(key_func=get_remote_address, storage_uri="redis://localhost:6379")
+# Token bucket en memoria por proceso, sincronizado con Redis en lotes (ver app/ratelimit.py).
+# Si Redis no responde, se sigue limitando localmente (fail-open).
+# La clave es el usuario del token (no la IP: detrás del proxy todos comparten IP).
+limiter = create_limiter(key_func=security.get_rate_limit_key)
+
+# Pesos sobre el presupuesto compartido de cada usuario (ver TieredLimiter.limit)
+COST_SEARCH = 3
+COST_SYNC = 2
+COST_REPORT = 10
 
 app = FastAPI(title="API Clínica Veterinaria")
 
 # --- MANEJADOR DE ERRORES Y ESTADO DEL LIMITER ---
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
+
+# --- MÉTRICAS (Prometheus): middleware por ruta, pool de BD, SQL por petición, limiter y caché de agendas ---
+setup_metrics(app, engine, limiter, agenda_cache)
+
+# --- PERFILADO DE SQL Y DETECCIÓN DE N+1 (solo con CLINICA_DEV_MODE=true) ---
+setup_profiling(app, engine)
+
+# --- LOG DE CONSULTAS LENTAS (SLOW_QUERY_THRESHOLD_MS) Y CAPTURA DE EXPLAIN (EXPLAIN_CAPTURE) ---
+setup_slow_query_log(engine)
+
+# --- TRAZAS DISTRIBUIDAS (TRACING_ENABLED): span por petición, ruta, auth, limiter y SQL ---
+# Va después de los otros middlewares para quedar por fuera de todos, y antes de las rutas.
+setup_tracing(app, engine)
+
+# --- PARTICIONES MENSUALES (M9): crear las que falten antes de recibir tráfico ---
+@app.on_event("startup")
+def create_missing_partitions():
+    try:
+        partitions.ensure_partitions(engine)
+    except Exception as e:
+        # Sin M9 aplicada (o sin BD) la API arranca igual; el cron las creará
+        logger.warning("Could not create monthly partitions: %s", e)
+
+# --- EVENTOS EN VIVO: LISTEN a los eventos de todos los workers y del cron (ver app/events.py) ---
+@app.on_event("startup")
+def start_event_listener():
+    events.start_listener()
+
+@app.on_event("shutdown")
+def stop_event_listener():
+    events.stop_listener()
+
+# --- TAREAS PROGRAMADAS (JOBS_ENABLED): facturas vencidas, etc. (ver app/jobs.py) ---
+job_scheduler = jobs.JobScheduler(engine)
+
+@app.on_event("startup")
+def start_job_scheduler():
+    if jobs.JOBS_ENABLED:
+        job_scheduler.start()
+
+@app.on_event("shutdown")
+def stop_job_scheduler():
+    job_scheduler.stop()
 
 # --- Alias de Dependencia ---
 DbDep = Depends(get_db)
@@ -57,7 +118,8 @@ async def login_for_access_token(
     
     # 3. Crea el token JWT
     access_token = auth.create_access_token(
-        data={"sub": user.email} # 'sub' (subject) es el email
+        # 'sub' (subject) es el email; 'role' particiona la caché compartida del frontend
+        data={"sub": user.email, "role": "veterinarian"}
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -151,12 +213,25 @@ def read_vet_appointments(request: Request, vet_id: int, db: Session = DbDep, cu
         raise HTTPException(status_code=404, detail="Veterinarian not found")
     return crud.get_appointments_by_veterinarian(db=db, vet_id=vet_id)
 
+# Serializa la agenda una sola vez: la caché guarda los bytes JSON ya listos
+SCHEDULE_ADAPTER = TypeAdapter(List[schemas.Appointment])
+
 @app.get("/veterinarians/{vet_id}/schedule", response_model=List[schemas.Appointment], tags=["Veterinarians"])
 @limiter.limit("100/minute")
-def read_vet_schedule(request: Request, vet_id: int, date: date, db: Session = DbDep, current_user: models.Veterinarian = ActiveUserDep):
-    if not crud.get_veterinarian(db, vet_id=vet_id):
+def read_vet_schedule(request: Request, vet_id: int, date: date, with_cancelled: bool = False, db: Session = DbDep, current_user: models.Veterinarian = ActiveUserDep):
+    # Agenda del día desde la caché de dos niveles (app/cache.py); crud la invalida al escribir citas.
+    # Solo se cachea la vista por defecto (sin canceladas); con with_cancelled va directo a la BD.
+    def load_schedule():
+        if not crud.get_veterinarian(db, vet_id=vet_id):
+            return None
+        appointments = crud.get_appointments_by_vet_and_date(db=db, vet_id=vet_id, date=date,
+                                                             with_cancelled=with_cancelled)
+        return SCHEDULE_ADAPTER.dump_json(SCHEDULE_ADAPTER.validate_python(appointments, from_attributes=True))
+
+    payload = load_schedule() if with_cancelled else agenda_cache.get_or_load(vet_id, date, load_schedule)
+    if payload is None:
         raise HTTPException(status_code=404, detail="Veterinarian not found")
-    return crud.get_appointments_by_vet_and_date(db=db, vet_id=vet_id, date=date)
+    return Response(content=payload, media_type="application/json")
 
 # === Endpoints Owners ===
 @app.post("/owners/", response_model=schemas.Owner, status_code=status.HTTP_201_CREATED, tags=["Owners"])
@@ -261,10 +336,16 @@ def delete_pet(request: Request, pet_id: int, db: Session = DbDep, current_user:
 # --- Endpoints Relacionales de Pets (M1, M2) ---
 @app.get("/pets/{pet_id}/medical-history", response_model=List[schemas.MedicalRecord], tags=["Pets", "Medical Records"])
 @limiter.limit("100/minute")
-def read_pet_medical_history(request: Request, pet_id: int, db: Session = DbDep, current_user: models.Veterinarian = ActiveUserDep):
+def read_pet_medical_history(
+    request: Request,
+    pet_id: int,
+    include_archived: bool = Query(False, description="Incluir historiales archivados (M10)"),
+    db: Session = DbDep,
+    current_user: models.Veterinarian = ActiveUserDep
+):
     if not crud.get_pet(db, pet_id=pet_id):
         raise HTTPException(status_code=404, detail="Pet not found")
-    return crud.get_medical_records_by_pet(db=db, pet_id=pet_id)
+    return crud.get_medical_records_by_pet(db=db, pet_id=pet_id, include_archived=include_archived)
 
 @app.get("/pets/{pet_id}/vaccinations", response_model=List[schemas.VaccinationRecord], tags=["Pets", "Vaccination Records"])
 @limiter.limit("100/minute")
@@ -273,6 +354,28 @@ def read_pet_vaccinations(request: Request, pet_id: int, db: Session = DbDep, cu
         raise HTTPException(status_code=404, detail="Pet not found")
     return crud.get_vaccinations_by_pet(db=db, pet_id=pet_id)
 
+@app.get("/pets/{pet_id}/timeline", response_model=schemas.PetTimeline, tags=["Pets"])
+@limiter.limit("100/minute")
+def read_pet_timeline(
+    request: Request,
+    pet_id: int,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    include_archived: bool = Query(False, description="Incluir citas, historiales y facturas archivadas (M10)"),
+    db: Session = DbDep,
+    current_user: models.Veterinarian = ActiveUserDep
+):
+    """
+    Expediente completo en una sola consulta: la mascota con su dueño y sus
+    citas, historiales, vacunas y facturas, del más reciente al más antiguo.
+    """
+    pet, timeline, has_more = crud.get_pet_timeline(
+        db, pet_id=pet_id, skip=skip, limit=limit, include_archived=include_archived
+    )
+    if pet is None:
+        raise HTTPException(status_code=404, detail="Pet not found")
+    return schemas.PetTimeline(pet=pet, skip=skip, limit=limit, has_more=has_more, events=timeline)
+
 @app.get("/pets/{pet_id}/vaccination-schedule", response_model=List[schemas.VaccinationRecord], tags=["Pets", "Vaccination Records"])
 @limiter.limit("100/minute")
 def read_pet_vaccination_schedule(request: Request, pet_id: int, db: Session = DbDep, current_user: models.Veterinarian = ActiveUserDep):
@@ -310,6 +413,27 @@ def create_appointment(request: Request, appt: schemas.AppointmentCreate, db: Se
 def read_appointments(request: Request, skip: int = 0, limit: int = 100, db: Session = DbDep, current_user: models.Veterinarian = ActiveUserDep):
     return crud.get_appointments(db, skip=skip, limit=limit)
 
+@app.post("/appointments/series", response_model=schemas.AppointmentSeriesResult, status_code=status.HTTP_201_CREATED, tags=["Appointments"])
+@limiter.limit("100/minute")
+def create_appointment_series(request: Request, series: schemas.AppointmentSeriesCreate, db: Session = DbDep, current_user: models.Veterinarian = ActiveUserDep):
+    """
+    Crea una serie de citas recurrentes (ej. semanal durante 8 semanas).
+    Si alguna fecha choca con la agenda del veterinario responde 409, salvo
+    con 'skip_conflicts', que crea las libres e informa las omitidas.
+    """
+    if not crud.get_pet(db, pet_id=series.pet_id):
+        raise HTTPException(status_code=404, detail=f"Pet with id {series.pet_id} not found")
+    if not crud.get_veterinarian(db, vet_id=series.veterinarian_id):
+        raise HTTPException(status_code=404, detail=f"Veterinarian with id {series.veterinarian_id} not found")
+
+    db_series, created, conflicts = crud.create_appointment_series(db=db, series=series)
+    if db_series is None:
+        dates = ", ".join(sorted({c.requested_date.strftime('%Y-%m-%d %H:%M') for c in conflicts}))
+        raise HTTPException(status_code=409, detail=f"Veterinarian already has appointments at: {dates}")
+    return {"series": db_series,
+            "appointments": [dict(row._mapping) for row in created],
+            "skipped": [dict(row._mapping) for row in conflicts]}
+
 @app.get("/appointments/today", response_model=List[schemas.Appointment], tags=["Appointments"])
 @limiter.limit("100/minute")
 def read_appointments_today(request: Request, db: Session = DbDep, current_user: models.Veterinarian = ActiveUserDep):
@@ -358,15 +482,14 @@ def cancel_appointment(request: Request, appt_id: int, db: Session = DbDep, curr
     if db_appt is None:
         raise HTTPException(status_code=404, detail="Appointment not found")
     
-    # Lógica de negocio: revertir métricas si se cancela
-    # (Asumiendo que delete_appointment hace lo mismo)
-    deleted_appt = crud.delete_appointment(db=db, db_appt=db_appt)
-    # Marcarla como cancelada en lugar de borrarla (mejor)
-    # update_data = schemas.AppointmentUpdate(status=schemas.AppointmentStatusEnum.cancelled)
-    # return crud.update_appointment(db=db, db_appt=db_appt, appt_update=update_data)
+    if db_appt.status != 'scheduled':
+        raise HTTPException(status_code=400, detail="Only scheduled appointments can be cancelled")
     
-    # Para este ejercicio, seguir el delete_appointment que revierte métricas
-    return deleted_appt 
+    # Cancelación "suave": la cita queda con status 'cancelled' y se descuentan las métricas
+    cancelled_appt = crud.cancel_appointment(db=db, db_appt=db_appt)
+    if cancelled_appt is None:
+        raise HTTPException(status_code=409, detail="Appointment status changed, please reload")
+    return cancelled_appt
 
 @app.delete("/appointments/{appt_id}", response_model=schemas.Appointment, tags=["Appointments"])
 @limiter.limit("100/minute")
@@ -532,8 +655,12 @@ def create_invoice(request: Request, invoice: schemas.InvoiceCreate, db: Session
     if invoice.appointment_id and not crud.get_appointment(db, appt_id=invoice.appointment_id):
          raise HTTPException(status_code=404, detail="Appointment not found")
     
-    # Verificar duplicados de número de factura
-    # (Necesitarías una función get_invoice_by_number en crud, o confiar en el error de BD)
+    # M13: sin invoice_number lo asigna el servidor; si viene, no debe existir
+    # ni usar el formato de la serie del servidor (chocaría con un número futuro)
+    if invoice.invoice_number and numbering.is_server_series_number(invoice.invoice_number):
+        raise HTTPException(status_code=400, detail=f"Invoice numbers with the '{numbering.INVOICE_NUMBER_PREFIX}-YYYY-NNNNNN' format are assigned by the server")
+    if invoice.invoice_number and crud.get_invoice_by_number(db, invoice_number=invoice.invoice_number):
+        raise HTTPException(status_code=400, detail="Invoice number already registered")
     
     return crud.create_invoice(db=db, invoice=invoice)
 
@@ -544,14 +671,7 @@ def update_invoice(request: Request, invoice_id: int, invoice: schemas.InvoiceUp
     if db_invoice is None:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
-    # Usamos la función genérica de update
-    update_data = invoice.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_invoice, key, value)
-    
-    db.commit()
-    db.refresh(db_invoice)
-    return db_invoice
+    return crud.update_invoice(db=db, db_invoice=db_invoice, invoice_update=invoice)
 
 @app.delete("/invoices/{invoice_id}", response_model=schemas.Invoice, tags=["Invoices"])
 @limiter.limit("100/minute")
@@ -559,27 +679,230 @@ def delete_invoice(request: Request, invoice_id: int, db: Session = DbDep, curre
     db_invoice = crud.get_invoice(db, invoice_id=invoice_id)
     if db_invoice is None:
         raise HTTPException(status_code=404, detail="Invoice not found")
-    
-    db.delete(db_invoice)
-    db.commit()
-    return db_invoice
+    return crud.delete_invoice(db=db, db_invoice=db_invoice)
 
 
 # === Endpoints Reports (M5) ===
 @app.get("/reports/revenue", response_model=schemas.RevenueReport, tags=["Reports"])
-@limiter.limit("100/minute")
+@limiter.limit("100/minute", cost=COST_REPORT)
 def report_revenue(request: Request, start_date: date, end_date: date, db: Session = DbDep, current_user: models.Veterinarian = ActiveUserDep):
     total = crud.get_revenue_report(db, start_date=start_date, end_date=end_date)
     return schemas.RevenueReport(start_date=start_date, end_date=end_date, total_revenue=total)
 
+@app.get("/reports/receivables", response_model=schemas.ReceivablesReport, tags=["Reports"])
+@limiter.limit("100/minute", cost=COST_REPORT)
+def report_receivables(
+    request: Request,
+    as_of: Optional[date] = None,
+    top: int = Query(20, ge=1, le=500, description="Dueños y veterinarios con mayor saldo a incluir"),
+    db: Session = DbDep,
+    current_user: models.Veterinarian = ActiveUserDep
+):
+    """Cuentas por cobrar: totales y antigüedad (0-30, 31-60, 61-90, 90+ días) por estado, dueño y veterinario."""
+    return crud.get_receivables_report(db, as_of=as_of, top=top)
+
 @app.get("/reports/popular-veterinarians", response_model=List[schemas.Veterinarian], tags=["Reports"])
-@limiter.limit("100/minute")
+@limiter.limit("100/minute", cost=COST_REPORT)
 def report_popular_veterinarians(request: Request, db: Session = DbDep, current_user: models.Veterinarian = ActiveUserDep):
     # Simplemente devuelve los Vets ordenados por 'total_appointments'
     return crud.get_popular_veterinarians(db)
 
 @app.get("/reports/vaccination-alerts", response_model=List[schemas.VaccinationRecord], tags=["Reports"])
-@limiter.limit("100/minute")
+@limiter.limit("100/minute", cost=COST_REPORT)
 def report_vaccination_alerts(request: Request, db: Session = DbDep, current_user: models.Veterinarian = ActiveUserDep):
     # Por defecto, busca vacunas para los próximos 30 días
-    return crud.get_vaccination_alerts(db)
\ No newline at end of file
+    return crud.get_vaccination_alerts(db)
+
+# === Endpoint de Búsqueda (M7) ===
+@app.get("/search", response_model=schemas.SearchResponse, tags=["Search"])
+@limiter.limit("100/minute", cost=COST_SEARCH)
+def search(
+    request: Request,
+    q: str = Query(..., min_length=2, max_length=100),
+    types: Optional[List[schemas.SearchEntityEnum]] = Query(None),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = DbDep,
+    current_user: models.Veterinarian = ActiveUserDep
+):
+    """
+    Busca dueños (nombre, email, teléfono), mascotas (nombre, microchip) e
+    historiales médicos (diagnóstico, tratamiento, receta). Resultados ordenados por relevancia.
+    """
+    entity_types = [t.value for t in types] if types else None
+    results, has_more = crud.search(db, q=q, entity_types=entity_types, skip=skip, limit=limit)
+    return schemas.SearchResponse(query=q, skip=skip, limit=limit, has_more=has_more, results=results)
+
+
+# === Stream de Eventos en Vivo (SSE) ===
+EVENT_TOPICS = {"appointments", "invoices"}
+SSE_KEEPALIVE_SECONDS = 15
+
+@app.get("/events/stream", tags=["Events"])
+@limiter.limit("30/minute") # cuenta conexiones (reconexiones), no eventos
+async def stream_events(
+    request: Request,
+    topics: Optional[str] = Query(None, description="Lista separada por comas, ej. 'appointments,invoices'"),
+    db: Session = DbDep,
+    current_user: models.Veterinarian = ActiveUserDep
+):
+    """
+    Server-Sent Events con los cambios de citas y facturas.
+    Si el cliente se reconecta con la cabecera 'Last-Event-ID', primero recibe
+    los eventos que se perdió (mientras sigan en el historial del bus). Si el
+    id es de otro proceso del API, recibe un evento 'resync' por tema.
+    """
+    # La sesión solo se necesitaba para validar el token: se libera la conexión
+    # para no retener una del pool durante toda la vida del stream.
+    db.close()
+    wanted = set(topics.split(",")) & EVENT_TOPICS if topics else EVENT_TOPICS
+    header = request.headers.get("last-event-id")
+    last_boot, last_id = events.parse_sse_id(header)
+    # La secuencia es por proceso: un id de antes de un reinicio o de otro
+    # worker (o del formato viejo, solo el número) no dice nada de este historial
+    missed = bool(header) and last_boot != events.BOOT_ID
+    if last_boot != events.BOOT_ID:
+        last_id = 0
+
+    async def event_generator():
+        subscriber = events.bus.subscribe()
+        _, queue = subscriber
+        try:
+            # Al conectar se informa el último id para que el cliente tenga un punto de partida
+            yield f"retry: 3000\nid: {events.BOOT_ID}-{max(last_id, events.bus.last_id)}\n\n"
+            if missed:
+                for topic in sorted(wanted):
+                    yield events.format_sse(events.resync_event(topic))
+            # Un evento publicado después de suscribirse y antes de leer el
+            # historial llega por las dos vías: se descarta todo lo que no
+            # supere el mayor id ya enviado
+            last_sent = last_id
+            for event in events.bus.since(last_id) if last_id else []:
+                last_sent = event["id"]
+                if event["topic"] in wanted:
+                    yield events.format_sse(event)
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event["id"] <= last_sent:
+                    continue
+                last_sent = event["id"]
+                if event["topic"] in wanted:
+                    yield events.format_sse(event)
+        finally:
+            events.bus.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# === Sincronización Incremental (M8) ===
+SYNC_SCHEMAS = {
+    'owners': schemas.Owner,
+    'pets': schemas.Pet,
+    'appointments': schemas.Appointment,
+    'invoices': schemas.Invoice,
+}
+
+@app.get("/sync/{entity}", response_model=schemas.SyncResponse, tags=["Sync"])
+@limiter.limit("100/minute", cost=COST_SYNC)
+def sync_entity(
+    request: Request,
+    entity: schemas.SyncEntityEnum,
+    since: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=2000),
+    db: Session = DbDep,
+    current_user: models.Veterinarian = ActiveUserDep
+):
+    """
+    Devuelve solo lo que cambió desde 'since' (token de la llamada anterior).
+    Sin 'since' devuelve la colección completa (paginada con has_more/next_token).
+    """
+    try:
+        result = crud.get_sync_changes(db, entity=entity.value, since=since, limit=limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+    schema = SYNC_SCHEMAS[entity.value]
+    result["changes"] = [schema.model_validate(row).model_dump(mode="json") for row in result["changes"]]
+    return schemas.SyncResponse(entity=entity, **result)
+
+
+# === Importación Masiva (CSV / Parquet) ===
+@app.post("/import/{kind}", response_model=schemas.ImportResult, tags=["Import"])
+@limiter.limit("10/minute")
+def import_file(
+    request: Request,
+    kind: schemas.ImportKindEnum,
+    file: UploadFile = File(...),
+    current_user: models.Veterinarian = ActiveUserDep
+):
+    """
+    Importa dueños, mascotas o vacunas desde un CSV/Parquet (ver app/importer.py).
+    Las filas inválidas no detienen la importación: se listan en 'rejects_file'.
+    """
+    rejects_path = importer.new_rejects_path(kind.value)
+    try:
+        result = importer.import_file(engine, kind.value, file.file, importer.detect_format(file.filename or ""),
+                                      rejects_path=rejects_path)
+    except (ValueError, ImportError) as e:
+        # CSV ilegible, o Parquet sin pyarrow instalado
+        raise HTTPException(status_code=400, detail=f"No se pudo leer el archivo: {e}")
+    if result["rejects_file"]:
+        result["rejects_file"] = os.path.basename(result["rejects_file"])
+    return result
+
+@app.get("/import/rejects/{name}", tags=["Import"])
+@limiter.limit("100/minute")
+def download_import_rejects(request: Request, name: str, current_user: models.Veterinarian = ActiveUserDep):
+    path = importer.rejects_file_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Rejects file not found")
+    return FileResponse(path, media_type="text/csv", filename=name)
+
+
+# === Tareas Programadas ===
+@app.get("/jobs/runs", response_model=List[schemas.JobRun], tags=["Monitoring"])
+@limiter.limit("100/minute")
+def read_job_runs(
+    request: Request,
+    job_name: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = DbDep,
+    current_user: models.Veterinarian = ActiveUserDep
+):
+    """Últimas corridas de las tareas programadas (duración, filas afectadas, errores)."""
+    return crud.get_job_runs(db, job_name=job_name, limit=limit)
+
+
+# === Recordatorios de Vacunación (M14) ===
+@app.post("/reminders/vaccinations", response_model=schemas.ReminderQueueResult, tags=["Reports"])
+@limiter.limit("10/minute", cost=COST_REPORT)
+def queue_vaccination_reminders(request: Request, current_user: models.Veterinarian = ActiveUserDep):
+    """
+    Encola un mensaje por dueño con sus dosis próximas aún no recordadas.
+    El envío lo hace el worker (tarea 'send_reminders').
+    """
+    run = jobs.run_job(engine, "vaccination_reminders")
+    if run is None:
+        raise HTTPException(status_code=409, detail="Reminders are already being queued")
+    return run["details"]
+
+@app.get("/reminders/outbox", response_model=List[schemas.ReminderOutboxStatus], tags=["Reports"])
+@limiter.limit("100/minute", cost=COST_REPORT)
+def read_reminder_outbox(request: Request, db: Session = DbDep, current_user: models.Veterinarian = ActiveUserDep):
+    """Mensajes de la outbox por estado de envío."""
+    return crud.get_reminder_outbox_summary(db)
+
+
+# === Monitoreo del Rate Limiter ===
+@app.get("/rate-limit/stats", tags=["Monitoring"])
+@limiter.limit("30/minute")
+def rate_limit_stats(request: Request, current_user: models.Veterinarian = ActiveUserDep):
+    """Peticiones permitidas/rechazadas (y tokens gastados) por ruta y tipo de clave."""
+    return limiter.snapshot()
@@ -0,0 +1,151 @@
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import FastAPI
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, REGISTRY
+from sqlalchemy import event
+from starlette.requests import Request
+from starlette.responses import Response
+
+# --- Métricas estilo Prometheus ---
+# Las etiquetas usan la PLANTILLA de la ruta ("/pets/{pet_id}"), nunca la URL real,
+# y las peticiones que no coinciden con ninguna ruta van a "unmatched". Así la
+# cardinalidad queda acotada por el número de rutas x métodos x códigos.
+
+UNMATCHED_ROUTE = "unmatched"
+
+REQUESTS = Counter(
+    "http_requests_total", "Peticiones HTTP atendidas",
+    ["method", "route", "status"],
+)
+LATENCY = Histogram(
+    "http_request_duration_seconds", "Latencia de las peticiones HTTP",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "Peticiones HTTP en curso",
+    ["method"],
+)
+SQL_STATEMENTS = Histogram(
+    "http_request_sql_statements", "Sentencias SQL ejecutadas por petición",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+DB_POOL = Gauge(
+    "db_pool_connections", "Estado del pool de conexiones de SQLAlchemy",
+    ["state"],
+)
+
+
+class RequestStats:
+    """Contadores de la petición actual (compartidos con los hooks de SQLAlchemy)."""
+    __slots__ = ("sql_statements",)
+
+    def __init__(self):
+        self.sql_statements = 0
+
+# El objeto se crea en el middleware; los endpoints síncronos corren en el
+# threadpool con una copia del contexto, que apunta al MISMO objeto.
+current_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("current_request_stats", default=None)
+
+
+class RateLimiterCollector:
+    """Expone las métricas del limiter leyéndolas al momento del scrape."""
+    def __init__(self, limiter):
+        self.limiter = limiter
+
+    def collect(self):
+        snapshot = self.limiter.snapshot()
+        requests = CounterMetricFamily(
+            "rate_limit_requests", "Decisiones del rate limiter por ruta",
+            labels=["scope", "key_type", "outcome"],
+        )
+        cost = CounterMetricFamily(
+            "rate_limit_cost", "Tokens gastados por ruta",
+            labels=["scope", "key_type", "outcome"],
+        )
+        for row in snapshot["routes"]:
+            labels = [row["scope"], row["key_type"], row["outcome"]]
+            requests.add_metric(labels, row["requests"])
+            cost.add_metric(labels, row["cost"])
+        yield requests
+        yield cost
+        sync = CounterMetricFamily("rate_limit_backend_sync", "Lotes sincronizados con el backend", labels=["result"])
+        sync.add_metric(["ok"], snapshot["totals"]["sync_batches"])
+        sync.add_metric(["error"], snapshot["totals"]["sync_errors"])
+        yield sync
+
+
+class AgendaCacheCollector:
+    """Aciertos por nivel, fallos e invalidaciones de la caché de agendas (app/cache.py)."""
+    def __init__(self, cache):
+        self.cache = cache
+
+    def collect(self):
+        snapshot = self.cache.snapshot()
+        lookups = CounterMetricFamily("agenda_cache_lookups", "Consultas a la caché de agendas", labels=["result"])
+        lookups.add_metric(["local_hit"], snapshot["local_hits"])
+        lookups.add_metric(["shared_hit"], snapshot["shared_hits"])
+        lookups.add_metric(["miss"], snapshot["misses"])
+        yield lookups
+        yield CounterMetricFamily("agenda_cache_invalidations", "Agendas (vet, día) invalidadas",
+                                  value=snapshot["invalidations"])
+        yield CounterMetricFamily("agenda_cache_backend_errors", "Errores del nivel compartido (Redis)",
+                                  value=snapshot["backend_errors"])
+
+
+def _route_template(request: Request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", UNMATCHED_ROUTE)
+
+
+def setup_metrics(app: FastAPI, engine, limiter=None, agenda_cache=None) -> None:
+    """Registra el middleware, los hooks de SQL y el endpoint /metrics."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count_statement(conn, cursor, statement, parameters, context, executemany):
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.sql_statements += 1
+
+    pool = engine.pool
+    if hasattr(pool, "checkedout"):
+        DB_POOL.labels("checked_out").set_function(pool.checkedout)
+        DB_POOL.labels("checked_in").set_function(pool.checkedin)
+        DB_POOL.labels("overflow").set_function(lambda: max(0, pool.overflow()))
+        DB_POOL.labels("size").set_function(pool.size)
+
+    if limiter is not None:
+        REGISTRY.register(RateLimiterCollector(limiter))
+    if agenda_cache is not None:
+        REGISTRY.register(AgendaCacheCollector(agenda_cache))
+
+    @app.middleware("http")
+    async def metrics_middleware(request: Request, call_next):
+        if request.url.path == "/metrics":
+            return await call_next(request)
+        method = request.method
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        IN_FLIGHT.labels(method).inc()
+        start = time.perf_counter()
+        status = "500"
+        try:
+            response = await call_next(request)
+            status = str(response.status_code)
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            IN_FLIGHT.labels(method).dec()
+            current_request_stats.reset(token)
+            route = _route_template(request)
+            REQUESTS.labels(method, route, status).inc()
+            LATENCY.labels(method, route, status).observe(elapsed)
+            SQL_STATEMENTS.labels(method, route).observe(stats.sql_statements)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,7 +1,8 @@
-from sqlalchemy import (Column, Integer, String, Text, Date, TIMESTAMP, Numeric,
-                        Boolean, ForeignKey, Enum)
+from sqlalchemy import (Column, Integer, BigInteger, String, Text, Date, TIMESTAMP, Numeric,
+                        Boolean, ForeignKey, ForeignKeyConstraint, Enum, FetchedValue, Index, JSON)
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from .database import Base
 
 class Veterinarian(Base):
@@ -45,6 +46,9 @@ class Owner(Base):
     # --- ESTAS LÍNEAS (MIGRACIÓN 3) ---
     emergency_contact = Column(String(30), nullable=True) 
     preferred_payment_method = Column(Enum('cash', 'credit', 'debit', 'insurance', name='payment_method_enum'), nullable=True)
+
+    # --- M8: Sincronización incremental ---
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False)
     
     # Relación: Un dueño tiene muchas mascotas
     pets = relationship("Pet", back_populates="owner")
@@ -60,7 +64,7 @@ class Pet(Base):
     weight = Column(Numeric(6, 2))
     
     # Foreign Key
-    owner_id = Column(Integer, ForeignKey("owners.owner_id"), nullable=False) 
+    owner_id = Column(Integer, ForeignKey("owners.owner_id"), nullable=False, index=True) # M11
     registration_date = Column(TIMESTAMP, server_default=func.now())
     
     # --- ESTAS LÍNEAS (M5) ---
@@ -72,6 +76,9 @@ class Pet(Base):
     is_neutered = Column(Boolean, default=False)
     blood_type = Column(String(10), nullable=True)
 
+    # --- M8: Sincronización incremental ---
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False)
+
     # Relaciones inversas
     owner = relationship("Owner", back_populates="pets")
     appointments = relationship("Appointment", back_populates="pet")
@@ -80,6 +87,9 @@ class Pet(Base):
 
 class Appointment(Base):
     __tablename__ = "appointments"
+    # --- M9: en PostgreSQL la tabla está particionada por mes en appointment_date ---
+    # La PK real es (appointment_id, appointment_date); para el ORM basta con
+    # appointment_id, que sigue siendo único (viene de la secuencia).
     
     appointment_id = Column(Integer, primary_key=True, index=True)
     
@@ -92,6 +102,10 @@ class Appointment(Base):
     status = Column(Enum('scheduled', 'completed', 'cancelled', 'no_show', name='appointment_status_enum'), default='scheduled')
     notes = Column(Text, nullable=True)
     created_at = Column(TIMESTAMP, server_default=func.now())
+    # --- M8: Sincronización incremental ---
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False)
+    # --- M16: cita generada por una serie recurrente ---
+    series_id = Column(Integer, ForeignKey("appointment_series.series_id", ondelete="SET NULL"), nullable=True, index=True)
     
     # Relaciones inversas
     pet = relationship("Pet", back_populates="appointments")
@@ -105,23 +119,43 @@ class Appointment(Base):
     # 'cascade="all, delete-orphan"' asegura que si borras la cita, se borra el historial
     #  o si quitas el historial de la cita, se borra el historial.
 
+    # --- M11: índices de FKs (con la fecha para historial y agenda) y del filtro por estado ---
+    __table_args__ = (
+        Index("ix_appointments_pet_id_date", "pet_id", "appointment_date"),
+        Index("ix_appointments_veterinarian_id_date", "veterinarian_id", "appointment_date"),
+        Index("ix_appointments_status_date", "status", "appointment_date"),
+        # --- M15: solo las citas agendadas (agenda activa, choques de horario) ---
+        Index("ix_appointments_scheduled_vet_date", "veterinarian_id", "appointment_date",
+              postgresql_where=text("status = 'scheduled'"), sqlite_where=text("status = 'scheduled'")),
+    )
+
 class MedicalRecord(Base):
     __tablename__ = "medical_records"
     
     record_id = Column(Integer, primary_key=True, index=True)
     
     # FK con UNIQUE = True para enforce una relación 1:1 con Appointment
-    appointment_id = Column(Integer, ForeignKey("appointments.appointment_id", ondelete="CASCADE"), unique=True, nullable=False)
+    appointment_id = Column(Integer, unique=True, nullable=False)
+    # --- M9: parte de la FK compuesta hacia la tabla particionada (la llena un trigger) ---
+    appointment_date = Column(TIMESTAMP, nullable=False, server_default=FetchedValue(), server_onupdate=FetchedValue())
     
     diagnosis = Column(Text, nullable=False)
     treatment = Column(Text, nullable=False)
     prescription = Column(Text, nullable=True) # Puede ser nulo
     follow_up_required = Column(Boolean, default=False)
-    created_at = Column(TIMESTAMP, server_default=func.now())
+    created_at = Column(TIMESTAMP, server_default=func.now(), index=True) # M11
     
     # Relación inversa con Appointment
     appointment = relationship("Appointment", back_populates="medical_record")
 
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["appointment_id", "appointment_date"],
+            ["appointments.appointment_id", "appointments.appointment_date"],
+            ondelete="CASCADE", onupdate="CASCADE",
+        ),
+    )
+
 
 class Vaccine(Base):
     """
@@ -151,7 +185,7 @@ class VaccinationRecord(Base):
     veterinarian_id = Column(Integer, ForeignKey("veterinarians.veterinarian_id"), nullable=False)
     
     vaccination_date = Column(Date, nullable=False, default=func.current_date())
-    next_dose_date = Column(Date, nullable=True) # Opcional
+    next_dose_date = Column(Date, nullable=True, index=True) # Opcional (M14: índice para alertas/recordatorios)
     batch_number = Column(String(50)) # Número de lote de la vacuna
     
     # Relaciones inversas
@@ -159,15 +193,27 @@ class VaccinationRecord(Base):
     vaccine = relationship("Vaccine", back_populates="vaccination_records")
     veterinarian = relationship("Veterinarian", back_populates="vaccination_records")
 
+    # --- M11: índices de FKs ---
+    __table_args__ = (
+        Index("ix_vaccination_records_pet_id_date", "pet_id", "vaccination_date"),
+        Index("ix_vaccination_records_vaccine_id", "vaccine_id"),
+        Index("ix_vaccination_records_veterinarian_id", "veterinarian_id"),
+    )
+
 
 # --- CLASE NUEVA (M4) ---
 class Invoice(Base):
     __tablename__ = "invoices"
+    # --- M9: en PostgreSQL la tabla está particionada por mes en issue_date ---
+    # La unicidad global de invoice_number y appointment_id la garantiza la tabla
+    # 'invoice_keys' (mantenida por trigger), no un índice de esta tabla.
     
     invoice_id = Column(Integer, primary_key=True, index=True)
     
     # Clave foránea única para la relación 1:1
-    appointment_id = Column(Integer, ForeignKey("appointments.appointment_id", ondelete="SET NULL"), unique=True, nullable=True)
+    appointment_id = Column(Integer, unique=True, nullable=True)
+    # --- M9: parte de la FK compuesta hacia la tabla particionada (la llena un trigger) ---
+    appointment_date = Column(TIMESTAMP, nullable=True, server_default=FetchedValue(), server_onupdate=FetchedValue())
     
     invoice_number = Column(String(50), unique=True, nullable=False, index=True)
     issue_date = Column(Date, nullable=False, default=func.current_date())
@@ -177,6 +223,145 @@ class Invoice(Base):
     
     payment_status = Column(Enum('pending', 'partial', 'paid', 'overdue', name='invoice_payment_status_enum'), default='pending')
     payment_date = Column(TIMESTAMP, nullable=True) # Se llena cuando 'status' es 'paid'
+    # --- M8: Sincronización incremental ---
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False)
     
     # Relación inversa
-    appointment = relationship("Appointment", back_populates="invoice")
\ No newline at end of file
+    appointment = relationship("Appointment", back_populates="invoice")
+
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["appointment_id", "appointment_date"],
+            ["appointments.appointment_id", "appointments.appointment_date"],
+            ondelete="SET NULL", onupdate="CASCADE", match="FULL",
+        ),
+        # --- M11: facturas pendientes (get_pending_invoices) y pagos por fecha ---
+        Index("ix_invoices_payment_status_issue_date", "payment_status", "issue_date"),
+        Index("ix_invoices_payment_date", "payment_date"),
+    )
+
+
+# --- CLASE NUEVA (M8) ---
+class SyncTombstone(Base):
+    """
+    Registro de borrados para /sync. Lo llena un trigger AFTER DELETE en
+    owners, pets, appointments e invoices (ver migración M8).
+    """
+    __tablename__ = "sync_tombstones"
+
+    tombstone_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    entity = Column(String(30), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    deleted_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
+
+
+# --- CLASES NUEVAS (M10: Archivo) ---
+# Almacenamiento frío que llena app/archive.py. Las columnas sirven para buscar;
+# la fila original completa está en 'data' (JSONB comprimido).
+ArchiveData = JSON().with_variant(JSONB, "postgresql")
+
+class ArchivedAppointment(Base):
+    __tablename__ = "archived_appointments"
+
+    appointment_id = Column(Integer, primary_key=True)
+    pet_id = Column(Integer, nullable=True, index=True)
+    veterinarian_id = Column(Integer, nullable=False)
+    appointment_date = Column(TIMESTAMP, nullable=False)
+    status = Column(String(20), nullable=False)
+    data = Column(ArchiveData, nullable=False)
+    archived_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
+
+class ArchivedMedicalRecord(Base):
+    __tablename__ = "archived_medical_records"
+
+    record_id = Column(Integer, primary_key=True)
+    appointment_id = Column(Integer, nullable=False)
+    pet_id = Column(Integer, nullable=True, index=True)
+    created_at = Column(TIMESTAMP, nullable=True)
+    data = Column(ArchiveData, nullable=False)
+    archived_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
+
+class ArchivedInvoice(Base):
+    __tablename__ = "archived_invoices"
+
+    invoice_id = Column(Integer, primary_key=True)
+    appointment_id = Column(Integer, nullable=True, index=True)
+    invoice_number = Column(String(50), nullable=False)
+    issue_date = Column(Date, nullable=False, index=True)
+    total_amount = Column(Numeric(10, 2), nullable=False)
+    data = Column(ArchiveData, nullable=False)
+    archived_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
+
+
+# --- CLASE NUEVA (M12: Tareas programadas) ---
+class JobRun(Base):
+    """Una corrida de una tarea de app/jobs.py (duración, filas afectadas, resultado)."""
+    __tablename__ = "job_runs"
+    __table_args__ = (
+        Index("ix_job_runs_job_name_started_at", "job_name", "started_at"),
+    )
+
+    job_run_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    job_name = Column(String(50), nullable=False)
+    started_at = Column(TIMESTAMP, nullable=False)
+    finished_at = Column(TIMESTAMP, nullable=False)
+    duration_ms = Column(Integer, nullable=False)
+    rows_affected = Column(Integer, nullable=False, default=0)
+    status = Column(String(20), nullable=False) # 'success' | 'failed' | 'skipped'
+    error = Column(Text, nullable=True)
+    details = Column(JSON().with_variant(JSONB, "postgresql"), nullable=True)
+
+
+# --- CLASE NUEVA (M13: Numeración de facturas) ---
+class InvoiceNumberCounter(Base):
+    """Último correlativo emitido por serie (prefijo-año) en el modo 'gapless' de app/numbering.py."""
+    __tablename__ = "invoice_number_counters"
+
+    series = Column(String(50), primary_key=True)
+    last_value = Column(BigInteger, nullable=False, default=0)
+
+
+# --- CLASES NUEVAS (M14: Outbox de recordatorios) ---
+class ReminderOutbox(Base):
+    """Mensaje pendiente o enviado a un dueño (app/reminders.py), con sus reintentos."""
+    __tablename__ = "reminder_outbox"
+    __table_args__ = (
+        Index("ix_reminder_outbox_pending", "next_attempt_at", postgresql_where=text("status = 'pending'")),
+    )
+
+    message_id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    owner_id = Column(Integer, ForeignKey("owners.owner_id", ondelete="CASCADE"), nullable=False, index=True)
+    email = Column(String(255), nullable=False)
+    kind = Column(String(30), nullable=False) # 'vaccination'
+    items = Column(JSON().with_variant(JSONB, "postgresql"), nullable=False)
+    status = Column(String(20), nullable=False, default="pending") # 'pending' | 'sent' | 'failed'
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
+    last_error = Column(Text, nullable=True)
+    created_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
+    sent_at = Column(TIMESTAMP, nullable=True)
+
+class ReminderOutboxItem(Base):
+    """Dosis ya incluida en un mensaje: la PK evita recordarla dos veces."""
+    __tablename__ = "reminder_outbox_items"
+
+    vaccination_id = Column(Integer, ForeignKey("vaccination_records.vaccination_id", ondelete="CASCADE"), primary_key=True)
+    message_id = Column(BigInteger().with_variant(Integer, "sqlite"), ForeignKey("reminder_outbox.message_id", ondelete="CASCADE"),
+                        nullable=False, index=True)
+
+
+# --- CLASE NUEVA (M16: Series de citas) ---
+class AppointmentSeries(Base):
+    """Regla de recurrencia (cada 'interval' días/semanas/meses, 'occurrences' veces)."""
+    __tablename__ = "appointment_series"
+
+    series_id = Column(Integer, primary_key=True)
+    pet_id = Column(Integer, ForeignKey("pets.pet_id", ondelete="CASCADE"), nullable=False, index=True)
+    veterinarian_id = Column(Integer, ForeignKey("veterinarians.veterinarian_id"), nullable=False, index=True)
+    first_appointment_date = Column(TIMESTAMP, nullable=False)
+    frequency = Column(String(10), nullable=False) # 'daily' | 'weekly' | 'monthly'
+    interval = Column(Integer, nullable=False, default=1)
+    occurrences = Column(Integer, nullable=False)
+    reason = Column(Text, nullable=True)
+    notes = Column(Text, nullable=True)
+    created_at = Column(TIMESTAMP, nullable=False, server_default=func.now())
@@ -0,0 +1,108 @@
+import math
+import os
+import re
+import threading
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# --- Numeración de Facturas (M13) ---
+# El servidor asigna invoice_number cuando el cliente no lo manda. Formato:
+#   {INVOICE_NUMBER_PREFIX}-{año de issue_date}-{correlativo}   ej. INV-2026-000123
+# El prefijo identifica a la clínica (cada instalación configura el suyo).
+#
+# Dos modos (INVOICE_NUMBERING):
+#   - "blocks" (por defecto, tolera huecos): secuencia 'invoice_number_seq' con
+#     INCREMENT BY = tamaño del bloque. Cada proceso reserva un bloque con un solo
+#     nextval() y reparte los números desde memoria, sin bloquear ninguna fila,
+#     así que la facturación masiva no se serializa. Quedan huecos si la
+#     transacción hace rollback o el proceso se reinicia con un bloque a medias,
+#     y entre workers los números no salen en orden estricto.
+#   - "gapless": contador por serie (prefijo-año) en 'invoice_number_counters',
+#     incrementado en la MISMA transacción que inserta la factura: si hay
+#     rollback el número vuelve al contador. A cambio, la fila del contador queda
+#     bloqueada hasta el commit; en lotes hay que pedir todos los números juntos.
+# Fuera de PostgreSQL (SQLite de los benchmarks) siempre se usa el contador.
+
+INVOICE_NUMBERING = os.getenv("INVOICE_NUMBERING", "blocks").lower() # 'blocks' | 'gapless'
+INVOICE_NUMBER_PREFIX = os.getenv("INVOICE_NUMBER_PREFIX", "INV")
+INVOICE_NUMBER_DIGITS = 6
+_SERIES_NUMBER = re.compile(rf"{re.escape(INVOICE_NUMBER_PREFIX)}-\d{{4}}-\d{{{INVOICE_NUMBER_DIGITS},}}", re.I)
+
+# El tamaño del bloque es el INCREMENT BY de la secuencia (M13 la crea con 50);
+# para cambiarlo basta con ALTER SEQUENCE invoice_number_seq INCREMENT BY n.
+SEQUENCE_INCREMENT = """
+    SELECT increment_by FROM pg_sequences
+    WHERE schemaname = current_schema() AND sequencename = 'invoice_number_seq'
+"""
+
+NEXT_BLOCKS = "SELECT nextval('invoice_number_seq') FROM generate_series(1, :blocks)"
+
+BUMP_COUNTER = """
+    INSERT INTO invoice_number_counters (series, last_value) VALUES (:series, :count)
+    ON CONFLICT (series) DO UPDATE
+        SET last_value = invoice_number_counters.last_value + EXCLUDED.last_value
+    RETURNING last_value
+"""
+
+
+class _BlockPool:
+    """Rangos [inicio, fin) ya reservados en la secuencia y aún sin repartir."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ranges = []
+        self._block_size = None
+
+    def take(self, db: Session, count: int) -> list:
+        numbers = []
+        with self._lock:
+            while len(numbers) < count:
+                if not self._ranges:
+                    self._reserve(db, count - len(numbers))
+                start, end = self._ranges[0]
+                taken = min(end - start, count - len(numbers))
+                numbers.extend(range(start, start + taken))
+                if start + taken == end:
+                    self._ranges.pop(0)
+                else:
+                    self._ranges[0] = (start + taken, end)
+        return numbers
+
+    def _reserve(self, db: Session, needed: int) -> None:
+        # Un solo viaje a la BD aunque el lote necesite varios bloques
+        if self._block_size is None:
+            self._block_size = db.execute(text(SEQUENCE_INCREMENT)).scalar_one()
+        blocks = math.ceil(needed / self._block_size)
+        starts = db.execute(text(NEXT_BLOCKS), {"blocks": blocks}).scalars().all()
+        self._ranges.extend((start, start + self._block_size) for start in starts)
+
+_pool = _BlockPool()
+
+
+def invoice_series(issue_date: date) -> str:
+    return f"{INVOICE_NUMBER_PREFIX}-{issue_date.year}"
+
+def is_server_series_number(invoice_number: str) -> bool:
+    """
+    True si el número tiene el formato que asigna el servidor. Un número así
+    enviado por el cliente chocaría más adelante con uno de la secuencia o del
+    contador, así que se rechaza al crear la factura.
+    """
+    return _SERIES_NUMBER.fullmatch(invoice_number.strip()) is not None
+
+def allocate_invoice_numbers(db: Session, issue_date: date, count: int = 1) -> list:
+    """
+    Devuelve 'count' números de factura nuevos para la serie del año de issue_date.
+    En modo 'gapless' corre dentro de la transacción de 'db': hay que hacer
+    commit (o rollback) pronto para liberar el contador.
+    """
+    if count <= 0:
+        return []
+    series = invoice_series(issue_date)
+    if INVOICE_NUMBERING == "gapless" or db.get_bind().dialect.name != "postgresql":
+        last = db.execute(text(BUMP_COUNTER), {"series": series, "count": count}).scalar_one()
+        numbers = range(last - count + 1, last + 1)
+    else:
+        numbers = _pool.take(db, count)
+    return [f"{series}-{n:0{INVOICE_NUMBER_DIGITS}d}" for n in numbers]
@@ -0,0 +1,119 @@
+import logging
+import os
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# --- Particiones Mensuales (M9) ---
+# 'appointments' e 'invoices' están particionadas por mes. Las particiones se
+# crean por adelantado (al arrancar la API y con el cron mensual):
+#     python -m app.partitions
+# y, para fechas fuera de esa ventana (una cita a 2 años, una factura atrasada),
+# crud llama a ensure_partition_for() antes del INSERT/UPDATE.
+# La función SQL create_monthly_partitions() es idempotente y se serializa con un
+# advisory lock, así que varios procesos pueden llamarla a la vez.
+
+logger = logging.getLogger(__name__)
+
+# Tabla -> meses futuros que deben existir siempre
+PARTITIONED_TABLES = {
+    'appointments': int(os.getenv("PARTITION_MONTHS_AHEAD_APPOINTMENTS", "12")),
+    'invoices': int(os.getenv("PARTITION_MONTHS_AHEAD_INVOICES", "3")),
+}
+
+# Meses que este proceso ya sabe que existen (solo los creados en transacciones
+# que hicieron commit: una partición creada dentro de una petición que luego hace
+# rollback no debe quedar marcada).
+_known_months = {table: set() for table in PARTITIONED_TABLES}
+
+
+def _add_months(day: date, months: int) -> date:
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def ensure_partitions(engine, months_back: int = 1) -> dict:
+    """
+    Crea (si faltan) las particiones desde 'months_back' meses atrás hasta el
+    horizonte de cada tabla. Devuelve {tabla: particiones creadas}.
+    """
+    if engine.dialect.name != "postgresql":
+        return {}
+    today = date.today().replace(day=1)
+    created = {}
+    for table, months_ahead in PARTITIONED_TABLES.items():
+        start, end = _add_months(today, -months_back), _add_months(today, months_ahead)
+        with engine.begin() as conn:
+            created[table] = conn.execute(
+                text("SELECT create_monthly_partitions(:table, :start, :end)"),
+                {"table": table, "start": start, "end": end},
+            ).scalar()
+        for offset in range(-months_back, months_ahead + 1):
+            month = _add_months(today, offset)
+            _known_months[table].add((month.year, month.month))
+    return created
+
+
+def ensure_partition_for(db: Session, table: str, value) -> None:
+    """
+    Garantiza que exista la partición del mes de 'value' antes de escribir una fila.
+    Para los meses de la ventana normal no hace nada (conjunto en memoria); fuera
+    de ella ejecuta create_monthly_partitions() en la MISMA transacción, así no
+    hay bloqueos cruzados con la sesión de la petición.
+    """
+    if value is None or db.get_bind().dialect.name != "postgresql":
+        return
+    if (value.year, value.month) in _known_months[table]:
+        return
+    db.execute(
+        text("SELECT create_monthly_partitions(:table, :day, :day)"),
+        {"table": table, "day": date(value.year, value.month, 1)},
+    )
+
+
+def drop_empty_partitions(engine, table: str, before: date) -> list:
+    """
+    Quita las particiones de 'table' que terminan antes de 'before' y están vacías
+    (las que dejó el archivado, ver app/archive.py). DETACH ... CONCURRENTLY no
+    bloquea la tabla padre; si entre el chequeo y el DETACH alguien escribió una
+    fila vieja, la partición se vuelve a adjuntar en lugar de borrarse.
+    """
+    if engine.dialect.name != "postgresql":
+        return []
+    dropped = []
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        names = conn.execute(text("""
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = CAST(:table AS regclass) ORDER BY c.relname
+        """), {"table": table}).scalars().all()
+        for name in names:
+            try:
+                year, month = map(int, name.rsplit("_p", 1)[1].split("_"))
+            except ValueError:
+                continue # no es una partición mensual creada por create_monthly_partitions()
+            start = date(year, month, 1)
+            if _add_months(start, 1) > before:
+                break
+            if conn.execute(text(f'SELECT EXISTS (SELECT 1 FROM "{name}")')).scalar():
+                continue
+            conn.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{name}" CONCURRENTLY'))
+            if conn.execute(text(f'SELECT EXISTS (SELECT 1 FROM "{name}")')).scalar():
+                conn.execute(text(
+                    f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" '
+                    f"FOR VALUES FROM ('{start}') TO ('{_add_months(start, 1)}')"
+                ))
+                continue
+            conn.execute(text(f'DROP TABLE "{name}"'))
+            _known_months[table].discard((year, month))
+            dropped.append(name)
+            logger.info("Dropped empty partition %s", name)
+    return dropped
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    logging.basicConfig(level=logging.INFO)
+    for table, count in ensure_partitions(engine).items():
+        logger.info("%s: %d partitions created", table, count)
@@ -0,0 +1,131 @@
+import logging
+import os
+import re
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import FastAPI
+from sqlalchemy import event
+from starlette.requests import Request
+
+# --- Perfilado de SQL por Petición y Detección de N+1 ---
+# Con CLINICA_DEV_MODE=true se registran las sentencias de cada petición, su
+# tiempo total y los patrones repetidos. La respuesta lleva cabeceras X-SQL-*,
+# /debug/sql-profiles muestra las últimas peticiones y se loguea un warning
+# cuando una misma sentencia se ejecuta N veces (síntoma típico de lazy loading).
+
+logger = logging.getLogger(__name__)
+
+DEV_MODE = os.getenv("CLINICA_DEV_MODE", "false").lower() == "true"
+N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+PROFILE_HISTORY = 50
+MAX_STATEMENTS_KEPT = 200 # por petición, para no crecer sin límite en endpoints patológicos
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class QueryProfile:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.route = None
+        self.status = None
+        self.statements = []
+        self.patterns = Counter()
+        self.sql_time = 0.0
+        self.total_time = 0.0
+
+    def record(self, statement: str, duration: float) -> None:
+        pattern = _WHITESPACE.sub(" ", statement).strip()
+        self.patterns[pattern] += 1
+        self.sql_time += duration
+        if len(self.statements) < MAX_STATEMENTS_KEPT:
+            self.statements.append({"sql": pattern, "ms": round(duration * 1000, 3)})
+
+    @property
+    def count(self) -> int:
+        return sum(self.patterns.values())
+
+    def repeated(self, threshold: int = 2) -> list:
+        return [
+            {"sql": sql, "count": n}
+            for sql, n in self.patterns.most_common() if n >= threshold
+        ]
+
+    def as_dict(self) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "statement_count": self.count,
+            "sql_time_ms": round(self.sql_time * 1000, 3),
+            "total_time_ms": round(self.total_time * 1000, 3),
+            "repeated": self.repeated(),
+            "statements": self.statements,
+        }
+
+
+current_profile: ContextVar[Optional[QueryProfile]] = ContextVar("current_profile", default=None)
+recent_profiles = deque(maxlen=PROFILE_HISTORY)
+
+
+def setup_profiling(app: FastAPI, engine, enabled: bool = DEV_MODE) -> None:
+    """Registra los hooks de SQLAlchemy, el middleware y /debug/sql-profiles (solo en dev)."""
+    if not enabled:
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("profiling_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _record_statement(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["profiling_start"].pop()
+        profile = current_profile.get()
+        if profile is not None:
+            profile.record(statement, time.perf_counter() - start)
+
+    @event.listens_for(engine, "handle_error")
+    def _discard_timer(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("profiling_start"):
+            conn.info["profiling_start"].pop()
+
+    @app.middleware("http")
+    async def profiling_middleware(request: Request, call_next):
+        profile = QueryProfile(request.method, request.url.path)
+        token = current_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            current_profile.reset(token)
+        profile.total_time = time.perf_counter() - start
+        profile.status = response.status_code
+        route = request.scope.get("route")
+        profile.route = getattr(route, "path", None)
+
+        response.headers["X-SQL-Count"] = str(profile.count)
+        response.headers["X-SQL-Time-ms"] = f"{profile.sql_time * 1000:.2f}"
+        worst = profile.patterns.most_common(1)
+        response.headers["X-SQL-Max-Repeat"] = str(worst[0][1] if worst else 0)
+
+        if worst and worst[0][1] >= N_PLUS_ONE_THRESHOLD:
+            logger.warning(
+                "Possible N+1 in %s %s: statement executed %d times: %s",
+                request.method, profile.route or request.url.path, worst[0][1], worst[0][0][:200],
+            )
+        if request.url.path != "/debug/sql-profiles":
+            recent_profiles.append(profile)
+        return response
+
+    @app.get("/debug/sql-profiles", tags=["Debug"])
+    def sql_profiles(limit: int = 20, only_repeated: bool = False):
+        """Últimas peticiones perfiladas (más reciente primero). Solo existe en modo dev."""
+        profiles = [p.as_dict() for p in reversed(recent_profiles)]
+        if only_repeated:
+            profiles = [p for p in profiles if p["repeated"]]
+        return profiles[:limit]
@@ -0,0 +1,322 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from . import tracing
+
+# --- Rate Limiting en Dos Niveles (local + Redis) ---
+# Cada proceso decide en memoria con un token bucket por clave (sin I/O en el
+# camino de la petición). Un hilo de fondo envía a Redis, en lotes, cuánto
+# consumió este proceso y recibe cuánto consumieron los demás; ese consumo
+# ajeno se descuenta del bucket local. Así el límite es global (aproximado,
+# con un retraso de SYNC_INTERVAL) y si Redis se cae el API sigue funcionando
+# con límites por proceso (fail-open).
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_STORAGE_URI = os.getenv("RATE_LIMIT_STORAGE_URI", "redis://localhost:6379")
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() != "false"
+SYNC_INTERVAL = float(os.getenv("RATE_LIMIT_SYNC_INTERVAL", "0.5")) # segundos entre lotes
+# Presupuesto compartido por clave entre TODAS las rutas; cada llamada gasta su 'cost'
+USER_BUDGET = os.getenv("RATE_LIMIT_USER_BUDGET", "600/minute")
+BACKEND_ERROR_LOG_INTERVAL = 60 # no llenar el log si Redis está caído
+
+PERIODS = {
+    "second": 1, "seconds": 1,
+    "minute": 60, "minutes": 60,
+    "hour": 3600, "hours": 3600,
+    "day": 86400, "days": 86400,
+}
+
+class RateLimitExceeded(Exception):
+    def __init__(self, limit: str, retry_after: float):
+        super().__init__(limit)
+        self.limit = limit
+        self.retry_after = retry_after
+
+def parse_rate(rate: str) -> tuple:
+    """'100/minute' -> (100, 60.0)"""
+    amount, _, period = rate.partition("/")
+    try:
+        return int(amount), float(PERIODS[period.strip().lower()])
+    except (ValueError, KeyError):
+        raise ValueError(f"Invalid rate limit string: {rate!r}")
+
+def get_remote_address(request: Request) -> str:
+    return request.client.host if request.client else "127.0.0.1"
+
+
+# --- Backends compartidos ---
+class MemoryBackend:
+    """
+    Contadores en memoria del proceso. Sirve para un solo nodo y para pruebas:
+    varios TieredLimiter que comparten la misma instancia simulan varios nodos.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, tuple] = {} # clave -> (total, expira_en)
+
+    def incr_many(self, deltas: Dict[str, int], ttl: Dict[str, float]) -> Dict[str, int]:
+        now = time.monotonic()
+        totals = {}
+        with self._lock:
+            for key, delta in deltas.items():
+                total, expires = self._counters.get(key, (0, 0))
+                if expires <= now:
+                    total, expires = 0, 0
+                if delta:
+                    # Solo el consumo renueva el periodo: un nodo que solo consulta no lo alarga
+                    total += delta
+                    expires = now + ttl[key]
+                    self._counters[key] = (total, expires)
+                totals[key] = total
+        return totals
+
+class RedisBackend:
+    """
+    Contadores en Redis: un solo pipeline por lote. Las claves con consumo
+    hacen INCRBY + EXPIRE; las que solo se consultan, GET (sin renovar el TTL,
+    para que el total se reinicie cuando nadie consume durante un periodo).
+    """
+    def __init__(self, url: str):
+        import redis
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+
+    def incr_many(self, deltas: Dict[str, int], ttl: Dict[str, float]) -> Dict[str, int]:
+        pipe = self._client.pipeline(transaction=False)
+        positions = {}
+        for key, delta in deltas.items():
+            positions[key] = len(pipe)
+            if delta:
+                pipe.incrby(f"rl:{key}", delta)
+                pipe.expire(f"rl:{key}", int(ttl[key]) + 1)
+            else:
+                pipe.get(f"rl:{key}")
+        results = pipe.execute()
+        return {key: int(results[i] or 0) for key, i in positions.items()}
+
+def backend_from_uri(uri: str):
+    if uri.startswith("memory://"):
+        return MemoryBackend()
+    return RedisBackend(uri)
+
+
+# --- Token bucket local ---
+class TokenBucket:
+    __slots__ = ("capacity", "refill_rate", "tokens", "updated", "pending", "remote_total")
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.refill_rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.pending = 0 # consumo local aún no enviado al backend
+        self.remote_total = None # último total global visto en el backend (None: aún no sincronizado)
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def try_consume(self, cost: int, now: float) -> float:
+        """Devuelve 0 si se permitió; si no, los segundos hasta tener tokens suficientes."""
+        self.refill(now)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            self.pending += cost
+            return 0.0
+        return (cost - self.tokens) / self.refill_rate
+
+
+class TieredLimiter:
+    def __init__(self, key_func: Callable = get_remote_address, backend=None,
+                 sync_interval: float = SYNC_INTERVAL, enabled: bool = True, fail_open: bool = True,
+                 shared_budget: Optional[str] = None):
+        self.key_func = key_func
+        self.shared_budget = shared_budget
+        self.backend = backend
+        self.sync_interval = sync_interval
+        self.enabled = enabled
+        self.fail_open = fail_open
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._periods: Dict[str, float] = {}
+        self._sync_thread: Optional[threading.Thread] = None
+        self._last_backend_error = 0.0
+        self.stats = {"allowed": 0, "rejected": 0, "sync_batches": 0, "sync_errors": 0}
+        # Métricas por ruta: (scope, tipo de clave, resultado) -> [peticiones, costo].
+        # El tipo de clave es 'user' o 'ip' (nunca el usuario), así la cardinalidad es acotada.
+        self.hits: Dict[tuple, list] = {}
+
+    # --- Decisión (camino caliente, solo memoria) ---
+    def hit(self, scope: str, key: str, rate: str, cost: int = 1) -> None:
+        """Consume 'cost' tokens o lanza RateLimitExceeded."""
+        if not self.enabled:
+            return
+        amount, period = parse_rate(rate)
+        bucket_key = f"{scope}:{rate}:{key}"
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(bucket_key)
+            if bucket is None:
+                bucket = self._buckets[bucket_key] = TokenBucket(amount, period)
+                self._periods[bucket_key] = period
+            retry_after = bucket.try_consume(cost, now)
+            outcome = "rejected" if retry_after else "allowed"
+            self.stats[outcome] += 1
+            counter = self.hits.setdefault((scope, key.partition(":")[0] or "key", outcome), [0, 0])
+            counter[0] += 1
+            counter[1] += cost
+        self._ensure_sync_thread()
+        if retry_after:
+            logger.info("Rate limit exceeded: scope=%s key=%s rate=%s cost=%s", scope, key, rate, cost)
+            raise RateLimitExceeded(rate, retry_after)
+
+    def snapshot(self) -> dict:
+        """Copia de las métricas del limiter (para exponerlas sin bloquear el camino caliente)."""
+        with self._lock:
+            return {
+                "totals": dict(self.stats),
+                "routes": [
+                    {"scope": scope, "key_type": key_type, "outcome": outcome, "requests": n, "cost": c}
+                    for (scope, key_type, outcome), (n, c) in sorted(self.hits.items())
+                ],
+            }
+
+    # --- Sincronización por lotes ---
+    def _ensure_sync_thread(self) -> None:
+        if self.backend is None or self._sync_thread is not None:
+            return
+        with self._lock:
+            if self._sync_thread is None:
+                self._sync_thread = threading.Thread(target=self._sync_loop, name="ratelimit-sync", daemon=True)
+                self._sync_thread.start()
+
+    def _sync_loop(self) -> None:
+        while True:
+            time.sleep(self.sync_interval)
+            self.sync()
+
+    def sync(self) -> None:
+        """Envía el consumo pendiente y descuenta el consumo de otros nodos."""
+        if self.backend is None:
+            return
+        with self._lock:
+            deltas = {k: b.pending for k, b in self._buckets.items() if b.pending}
+            # También se consultan las claves sin consumo local reciente para enterarse de los demás
+            for k in self._buckets:
+                deltas.setdefault(k, 0)
+            ttl = {k: self._periods[k] for k in deltas}
+            for k in deltas:
+                self._buckets[k].pending -= deltas[k]
+        if not deltas:
+            return
+
+        try:
+            totals = self.backend.incr_many(deltas, ttl)
+        except Exception as e:
+            # Fail-open: se sigue limitando solo con el bucket local
+            with self._lock:
+                self.stats["sync_errors"] += 1
+                for k, delta in deltas.items():
+                    if k in self._buckets:
+                        self._buckets[k].pending += delta
+            now = time.monotonic()
+            if now - self._last_backend_error > BACKEND_ERROR_LOG_INTERVAL:
+                self._last_backend_error = now
+                logger.warning("Rate limit backend unavailable, using local buckets only: %s", e)
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            self.stats["sync_batches"] += 1
+            for k, total in totals.items():
+                bucket = self._buckets.get(k)
+                if bucket is None:
+                    continue
+                if bucket.remote_total is None:
+                    # Primera sincronización del bucket (nodo nuevo o bucket recreado
+                    # tras olvidarlo): lo que ya había en la clave es consumo de
+                    # periodos anteriores o de antes de existir el bucket; se toma
+                    # como línea base sin descontarlo.
+                    bucket.remote_total = total
+                    continue
+                others = total - bucket.remote_total - deltas[k]
+                if others > 0:
+                    bucket.refill(now)
+                    bucket.tokens = max(-bucket.capacity, bucket.tokens - others)
+                bucket.remote_total = total
+            # Olvidar buckets llenos e inactivos para que la memoria no crezca sin límite
+            idle = [k for k, b in self._buckets.items()
+                    if not b.pending and now - b.updated > 2 * self._periods[k]]
+            for k in idle:
+                del self._buckets[k]
+                del self._periods[k]
+
+    # --- Decorador compatible con el anterior '@limiter.limit("100/minute")' ---
+    def limit(self, rate: str, cost: int = 1) -> Callable:
+        """
+        'rate' es el límite propio de la ruta (cada llamada gasta 1).
+        'cost' es lo que la llamada gasta del presupuesto compartido del usuario
+        (shared_budget): un reporte pesado cuenta más que un GET /pets/{id}.
+        """
+        parse_rate(rate) # validar al importar, no en la primera petición
+        if cost < 1:
+            raise ValueError("Rate limit cost must be >= 1")
+
+        def decorator(func: Callable) -> Callable:
+            scope = f"{func.__module__}.{func.__name__}"
+
+            def check(request: Request) -> None:
+                with tracing.span("ratelimit.check", **{"ratelimit.scope": scope, "ratelimit.cost": cost}):
+                    try:
+                        key = self.key_func(request)
+                        self.hit(scope, key, rate)
+                        if self.shared_budget:
+                            self.hit("shared", key, self.shared_budget, cost)
+                    except RateLimitExceeded:
+                        raise
+                    except Exception:
+                        if not self.fail_open:
+                            raise
+                        logger.exception("Rate limiter error, allowing request")
+
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, request: Request, **kwargs):
+                    check(request)
+                    return await func(*args, request=request, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def sync_wrapper(*args, request: Request, **kwargs):
+                check(request)
+                return func(*args, request=request, **kwargs)
+            return sync_wrapper
+
+        return decorator
+
+
+def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded) -> JSONResponse:
+    return JSONResponse(
+        {"error": f"Rate limit exceeded: {exc.limit}"},
+        status_code=429,
+        headers={"Retry-After": str(max(1, int(exc.retry_after + 0.999)))},
+    )
+
+
+def create_limiter(key_func: Callable = get_remote_address) -> TieredLimiter:
+    backend = None
+    if RATE_LIMIT_ENABLED:
+        try:
+            backend = backend_from_uri(RATE_LIMIT_STORAGE_URI)
+        except ImportError:
+            logger.warning("redis package not installed, rate limiting is per process only")
+    return TieredLimiter(key_func=key_func, backend=backend, enabled=RATE_LIMIT_ENABLED,
+                         shared_budget=USER_BUDGET or None)
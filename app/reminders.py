@@ -0,0 +1,210 @@
+import logging
+import os
+import smtplib
+import time
+from datetime import date, timedelta
+from email.message import EmailMessage
+from pathlib import Path
+
+from sqlalchemy import text
+
+# --- Recordatorios de Vacunación (M14) ---
+# 1) Encolar: UNA sentencia toma todas las dosis próximas que todavía no se
+#    recordaron, las agrupa por dueño (varias mascotas/vacunas = un mensaje) y
+#    las deja en 'reminder_outbox'. 'reminder_outbox_items' marca cada dosis
+#    como incluida, así que volver a encolar no duplica nada.
+# 2) Despachar: el worker reclama lotes con FOR UPDATE SKIP LOCKED, envía por
+#    el transporte configurado a un ritmo máximo de REMINDER_RATE_PER_SECOND y
+#    guarda el resultado. Si falla, reintenta con espera exponencial hasta
+#    REMINDER_MAX_ATTEMPTS; después el mensaje queda 'failed'.
+#
+# Transportes (REMINDER_TRANSPORT):
+#   - "file" (por defecto): escribe cada mensaje como .eml en REMINDER_OUTBOX_DIR.
+#   - "smtp": REMINDER_SMTP_HOST:REMINDER_SMTP_PORT; para desarrollo sirve un
+#     servidor de depuración (python -m aiosmtpd -n -l localhost:1025).
+# Las corridas se registran como tareas en app/jobs.py.
+
+logger = logging.getLogger(__name__)
+
+REMINDER_DAYS_AHEAD = int(os.getenv("REMINDER_DAYS_AHEAD", "30"))
+REMINDER_TRANSPORT = os.getenv("REMINDER_TRANSPORT", "file")
+REMINDER_OUTBOX_DIR = os.getenv("REMINDER_OUTBOX_DIR", "outbox")
+REMINDER_SMTP_HOST = os.getenv("REMINDER_SMTP_HOST", "localhost")
+REMINDER_SMTP_PORT = int(os.getenv("REMINDER_SMTP_PORT", "1025"))
+REMINDER_FROM = os.getenv("REMINDER_FROM", "recordatorios@clinica.local")
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "100"))
+REMINDER_RATE_PER_SECOND = float(os.getenv("REMINDER_RATE_PER_SECOND", "10"))
+REMINDER_MAX_ATTEMPTS = int(os.getenv("REMINDER_MAX_ATTEMPTS", "5"))
+REMINDER_RETRY_BASE_SECONDS = int(os.getenv("REMINDER_RETRY_BASE_SECONDS", "60"))
+# Mientras se envía un lote, sus mensajes quedan "reservados" este tiempo
+REMINDER_LEASE_SECONDS = int(os.getenv("REMINDER_LEASE_SECONDS", "300"))
+
+
+# --- Encolado (set-based) ---
+# 'due' se materializa una vez y alimenta los dos INSERT. Con 100k mascotas es
+# un solo recorrido de vaccination_records por el índice de next_dose_date.
+ENQUEUE_VACCINATION_REMINDERS = """
+    WITH due AS MATERIALIZED (
+        SELECT vr.vaccination_id, p.owner_id, o.email, vr.next_dose_date,
+               jsonb_build_object('vaccination_id', vr.vaccination_id, 'pet', p.name,
+                                  'vaccine', v.name, 'next_dose_date', vr.next_dose_date) AS item
+        FROM vaccination_records vr
+        JOIN pets p ON p.pet_id = vr.pet_id
+        JOIN owners o ON o.owner_id = p.owner_id
+        JOIN vaccines v ON v.vaccine_id = vr.vaccine_id
+        WHERE vr.next_dose_date BETWEEN :today AND :until
+          AND NOT EXISTS (SELECT 1 FROM reminder_outbox_items ri WHERE ri.vaccination_id = vr.vaccination_id)
+    ),
+    messages AS (
+        INSERT INTO reminder_outbox (owner_id, email, kind, items)
+        SELECT owner_id, min(email), 'vaccination', jsonb_agg(item ORDER BY next_dose_date, vaccination_id)
+        FROM due
+        GROUP BY owner_id
+        RETURNING message_id, owner_id
+    ),
+    marked AS (
+        INSERT INTO reminder_outbox_items (vaccination_id, message_id)
+        SELECT due.vaccination_id, messages.message_id
+        FROM due JOIN messages USING (owner_id)
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM messages) AS messages, (SELECT count(*) FROM marked) AS doses
+"""
+
+def enqueue_vaccination_reminders(engine, days_ahead: int = REMINDER_DAYS_AHEAD) -> dict:
+    """Encola un mensaje por dueño con las dosis de los próximos 'days_ahead' días aún no recordadas."""
+    today = date.today()
+    with engine.begin() as conn:
+        row = conn.execute(text(ENQUEUE_VACCINATION_REMINDERS),
+                           {"today": today, "until": today + timedelta(days=days_ahead)}).one()
+    return {"messages": row.messages, "doses": row.doses}
+
+
+# --- Transportes ---
+def render_message(message) -> EmailMessage:
+    email = EmailMessage()
+    email["From"] = REMINDER_FROM
+    email["To"] = message.email
+    email["Subject"] = "Recordatorio de vacunación"
+    lines = ["Hola,", "", "Se acercan las siguientes dosis de vacunación:", ""]
+    for item in message.items:
+        lines.append(f"  - {item['pet']}: {item['vaccine']} (vence el {item['next_dose_date']})")
+    lines += ["", "Puede agendar una cita respondiendo este correo o llamando a la clínica."]
+    email.set_content("\n".join(lines))
+    return email
+
+class FileTransport:
+    """Escribe cada mensaje como .eml (útil en desarrollo y para auditar)."""
+    def __init__(self, directory: str = REMINDER_OUTBOX_DIR):
+        self.directory = Path(directory)
+
+    def send(self, message) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{message.message_id}.eml"
+        path.write_bytes(bytes(render_message(message)))
+
+class SmtpTransport:
+    """Envía por SMTP reutilizando una conexión por lote."""
+    def __init__(self, host: str = REMINDER_SMTP_HOST, port: int = REMINDER_SMTP_PORT):
+        self.host, self.port = host, port
+        self._smtp = None
+
+    def send(self, message) -> None:
+        if self._smtp is None:
+            self._smtp = smtplib.SMTP(self.host, self.port, timeout=10)
+        try:
+            self._smtp.send_message(render_message(message))
+        except smtplib.SMTPServerDisconnected:
+            self._smtp = None
+            raise
+
+    def close(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except smtplib.SMTPException:
+                pass
+            self._smtp = None
+
+TRANSPORTS = {
+    "file": FileTransport,
+    "smtp": SmtpTransport,
+}
+
+
+# --- Despacho ---
+# Reclamar = mover next_attempt_at al futuro (lease) en una transacción corta;
+# otro worker no los ve hasta que venza. Si este proceso muere a mitad del
+# lote, el mensaje vuelve a estar disponible al vencer el lease.
+CLAIM_REMINDERS = """
+    WITH batch AS (
+        SELECT message_id FROM reminder_outbox
+        WHERE status = 'pending' AND next_attempt_at <= now()
+        ORDER BY next_attempt_at
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE reminder_outbox AS r
+    SET next_attempt_at = now() + make_interval(secs => :lease), attempts = r.attempts + 1
+    FROM batch
+    WHERE r.message_id = batch.message_id
+    RETURNING r.message_id, r.email, r.items, r.attempts
+"""
+
+MARK_SENT = """
+    UPDATE reminder_outbox SET status = 'sent', sent_at = now(), last_error = NULL
+    WHERE message_id = ANY(CAST(:ids AS bigint[]))
+"""
+
+MARK_RETRY = """
+    UPDATE reminder_outbox
+    SET status = CASE WHEN attempts >= :max_attempts THEN 'failed' ELSE 'pending' END,
+        next_attempt_at = now() + make_interval(secs => :delay),
+        last_error = :error
+    WHERE message_id = :message_id
+"""
+
+def dispatch_reminders(engine, transport=None, batch_size: int = REMINDER_BATCH_SIZE,
+                       rate_per_second: float = REMINDER_RATE_PER_SECOND, max_batches: int = None) -> dict:
+    """Envía los mensajes pendientes por lotes hasta vaciar la cola (o 'max_batches')."""
+    transport = transport or TRANSPORTS[REMINDER_TRANSPORT]()
+    interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+    result = {"sent": 0, "retried": 0, "failed": 0, "batches": 0}
+    try:
+        while max_batches is None or result["batches"] < max_batches:
+            with engine.begin() as conn:
+                claimed = conn.execute(text(CLAIM_REMINDERS),
+                                       {"limit": batch_size, "lease": REMINDER_LEASE_SECONDS}).all()
+            if not claimed:
+                break
+            result["batches"] += 1
+
+            sent, failures = [], []
+            for message in claimed:
+                started = time.monotonic()
+                try:
+                    transport.send(message)
+                    sent.append(message.message_id)
+                except Exception as e:
+                    logger.warning("Reminder %s failed (attempt %d): %s", message.message_id, message.attempts, e)
+                    failures.append((message, str(e)[:2000]))
+                # Control de ritmo: como máximo 'rate_per_second' envíos por segundo
+                wait = interval - (time.monotonic() - started)
+                if wait > 0:
+                    time.sleep(wait)
+
+            with engine.begin() as conn:
+                if sent:
+                    conn.execute(text(MARK_SENT), {"ids": sent})
+                for message, error in failures:
+                    delay = REMINDER_RETRY_BASE_SECONDS * 2 ** (message.attempts - 1)
+                    conn.execute(text(MARK_RETRY), {"message_id": message.message_id, "error": error,
+                                                    "delay": delay, "max_attempts": REMINDER_MAX_ATTEMPTS})
+            result["sent"] += len(sent)
+            for message, _ in failures:
+                result["failed" if message.attempts >= REMINDER_MAX_ATTEMPTS else "retried"] += 1
+    finally:
+        if hasattr(transport, "close"):
+            transport.close()
+    return result
+
@@ -31,6 +31,11 @@ class InvoicePaymentStatusEnum(str, Enum):
     paid = 'paid'
     overdue = 'overdue'
 
+class SearchEntityEnum(str, Enum):
+    owner = 'owner'
+    pet = 'pet'
+    medical_record = 'medical_record'
+
 # --- Schemas Simplificados (para anidación) ---
 
 class PetSimple(BaseModel):
@@ -122,6 +127,7 @@ class Owner(OwnerBase):
     owner_id: int
     registration_date: datetime
     pets: List[PetSimple] = []
+    updated_at: Optional[datetime] = None # M8
     class Config:
         from_attributes = True
 
@@ -160,6 +166,7 @@ class Pet(PetBase):
     # --- M5 ---
     last_visit_date: Optional[date] = None
     visit_count: int
+    updated_at: Optional[datetime] = None # M8
     class Config:
         from_attributes = True
 
@@ -188,11 +195,59 @@ class Appointment(AppointmentBase):
     created_at: datetime
     pet: Optional[PetSimple] = None
     veterinarian: Optional[VeterinarianSimple] = None
+    updated_at: Optional[datetime] = None # M8
+    series_id: Optional[int] = None # M16
     # 'invoice' se añade más abajo para evitar error de referencia
     
     class Config:
         from_attributes = True
 
+# --- Series de Citas (M16) ---
+class RecurrenceFrequencyEnum(str, Enum):
+    daily = 'daily'
+    weekly = 'weekly'
+    monthly = 'monthly'
+
+class AppointmentSeriesCreate(BaseModel):
+    pet_id: int
+    veterinarian_id: int
+    first_appointment_date: datetime
+    frequency: RecurrenceFrequencyEnum = RecurrenceFrequencyEnum.weekly
+    interval: int = Field(1, ge=1, le=12)     # cada 'interval' días/semanas/meses
+    occurrences: int = Field(..., ge=2, le=52) # cantidad de citas
+    reason: Optional[str] = None
+    notes: Optional[str] = None
+    skip_conflicts: bool = False # True: crea solo las fechas libres y omite las que chocan
+
+class AppointmentSeries(BaseModel):
+    series_id: int
+    pet_id: int
+    veterinarian_id: int
+    first_appointment_date: datetime
+    frequency: RecurrenceFrequencyEnum
+    interval: int
+    occurrences: int
+    reason: Optional[str] = None
+    notes: Optional[str] = None
+    created_at: datetime
+    class Config:
+        from_attributes = True
+
+class SeriesAppointment(BaseModel):
+    appointment_id: int
+    appointment_date: datetime
+    status: AppointmentStatusEnum
+
+class SeriesConflict(BaseModel):
+    requested_date: datetime
+    appointment_id: int     # cita agendada con la que choca
+    appointment_date: datetime
+
+class AppointmentSeriesResult(BaseModel):
+    series: AppointmentSeries
+    appointments: List[SeriesAppointment]
+    skipped: List[SeriesConflict] = []
+
 # --- Medical Records (M1) ---
 class MedicalRecordBase(BaseModel):
     appointment_id: int
@@ -213,6 +268,7 @@ class MedicalRecordUpdate(BaseModel):
 class MedicalRecord(MedicalRecordBase):
     record_id: int
     created_at: datetime
+    archived: bool = False # M10: viene de archived_medical_records
     class Config:
         from_attributes = True
 
@@ -262,7 +318,8 @@ class InvoiceBase(BaseModel):
     payment_date: Optional[datetime] = None
 
 class InvoiceCreate(InvoiceBase):
-    pass
+    # M13: si no se envía, el servidor lo asigna (app/numbering.py)
+    invoice_number: Optional[str] = Field(None, max_length=50)
 
 class InvoiceUpdate(BaseModel):
     payment_status: InvoicePaymentStatusEnum
@@ -270,6 +327,7 @@ class InvoiceUpdate(BaseModel):
 class Invoice(InvoiceBase):
     invoice_id: int
     appointment: Optional[Appointment] = None 
+    updated_at: Optional[datetime] = None # M8
     class Config:
         from_attributes = True
 
@@ -280,6 +338,30 @@ class RevenueReport(BaseModel):
     end_date: date
     total_revenue: Decimal
 
+class ReceivablesGroup(BaseModel):
+    # Solo vienen las columnas del agrupamiento (ninguna en el total general)
+    status: Optional[InvoicePaymentStatusEnum] = None
+    owner_id: Optional[int] = None
+    owner_name: Optional[str] = None
+    veterinarian_id: Optional[int] = None
+    veterinarian_name: Optional[str] = None
+    invoice_count: int
+    billed: Decimal
+    paid: Decimal
+    outstanding: Decimal # pending + partial + overdue
+    # Antigüedad del saldo por cobrar (días desde issue_date)
+    days_0_30: Decimal
+    days_31_60: Decimal
+    days_61_90: Decimal
+    days_over_90: Decimal
+
+class ReceivablesReport(BaseModel):
+    as_of: date
+    totals: Optional[ReceivablesGroup] = None # None si no hay facturas
+    by_status: List[ReceivablesGroup]
+    by_owner: List[ReceivablesGroup] # Mayor saldo primero (owner_id None = facturas sin cita)
+    by_veterinarian: List[ReceivablesGroup]
+
 class PopularVeterinarianReport(BaseModel):
     veterinarian: VeterinarianSimple
     appointment_count: int
@@ -289,6 +371,113 @@ class VaccinationAlertReport(BaseModel):
     vaccine: Vaccine
     next_dose_date: date
 
+# --- Búsqueda (M7) ---
+
+class SearchResult(BaseModel):
+    entity_type: SearchEntityEnum
+    entity_id: int
+    parent_id: Optional[int] = None # owner_id para mascotas, pet_id para historiales
+    title: str
+    snippet: Optional[str] = None
+    rank: float
+
+class SearchResponse(BaseModel):
+    query: str
+    skip: int
+    limit: int
+    has_more: bool
+    results: List[SearchResult]
+
+# --- Expediente del Paciente (línea de tiempo) ---
+
+class TimelineEventTypeEnum(str, Enum):
+    appointment = 'appointment'
+    medical_record = 'medical_record'
+    vaccination = 'vaccination'
+    invoice = 'invoice'
+
+class OwnerContact(OwnerSimple):
+    phone: Optional[str] = None
+    address: Optional[str] = None
+    emergency_contact: Optional[str] = None
+
+class TimelinePet(Pet):
+    owner: OwnerContact
+
+class TimelineEvent(BaseModel):
+    event_type: TimelineEventTypeEnum
+    event_id: int # appointment_id, record_id, vaccination_id o invoice_id según el tipo
+    occurred_at: datetime
+    appointment_id: Optional[int] = None
+    veterinarian: Optional[str] = None
+    title: Optional[str] = None
+    details: dict # Campos propios del tipo (diagnóstico, vacuna, total, etc.)
+    archived: bool = False # M10: viene de las tablas archived_*
+
+class PetTimeline(BaseModel):
+    pet: TimelinePet
+    skip: int
+    limit: int
+    has_more: bool
+    events: List[TimelineEvent] # Del más reciente al más antiguo
+
+# --- Sincronización Incremental (M8) ---
+
+class SyncEntityEnum(str, Enum):
+    owners = 'owners'
+    pets = 'pets'
+    appointments = 'appointments'
+    invoices = 'invoices'
+
+class SyncResponse(BaseModel):
+    entity: SyncEntityEnum
+    changes: List[dict] # Filas nuevas o modificadas (mismo formato que el GET de la colección)
+    deleted: List[int] # IDs borrados (tombstones)
+    next_token: str # Se envía como 'since' en la siguiente llamada
+    has_more: bool # True si hay más cambios pendientes: volver a llamar con next_token
+    reset: bool = False # True si el token es demasiado viejo: descartar la copia local
+
+# --- Tareas Programadas (M12) ---
+class JobRun(BaseModel):
+    job_run_id: int
+    job_name: str
+    started_at: datetime
+    finished_at: datetime
+    duration_ms: int
+    rows_affected: int
+    status: str
+    error: Optional[str] = None
+    details: Optional[dict] = None
+    class Config:
+        from_attributes = True
+
+# --- Recordatorios (M14) ---
+class ReminderQueueResult(BaseModel):
+    messages: int # mensajes nuevos (uno por dueño)
+    doses: int    # dosis incluidas en ellos
+
+class ReminderOutboxStatus(BaseModel):
+    status: str
+    messages: int
+    last_created_at: Optional[datetime] = None
+    last_sent_at: Optional[datetime] = None
+    class Config:
+        from_attributes = True
+
+# --- Importación Masiva ---
+class ImportKindEnum(str, Enum):
+    owners = 'owners'
+    pets = 'pets'
+    vaccinations = 'vaccinations'
+
+class ImportResult(BaseModel):
+    kind: ImportKindEnum
+    rows: int
+    imported: int
+    rejected: int
+    rejects_file: Optional[str] = None # Nombre para GET /import/rejects/{name}
+    elapsed_seconds: float
+
 class Token(BaseModel):
     """
     Schema de respuesta cuando el login es exitoso.
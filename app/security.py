@@ -1,13 +1,28 @@
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from . import auth, models, schemas, crud, database
+from starlette.requests import Request
+from . import auth, models, schemas, crud, database, tracing
 
 # Esta es la URL donde el cliente (Streamlit/Postman) irá para obtener el token
 # Le dice a FastAPI: "El endpoint de login está en '/login'"
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
+def get_token_subject(request: Request) -> Optional[str]:
+    """
+    Decodifica el token Bearer UNA sola vez por petición y guarda el 'sub' en
+    request.state. Lo usan tanto la autenticación como la clave del rate limiter.
+    """
+    if hasattr(request.state, "token_subject"):
+        return request.state.token_subject
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    subject = auth.decode_access_token(token) if scheme.lower() == "bearer" and token else None
+    request.state.token_subject = subject
+    return subject
+
 def get_current_veterinarian(
+    request: Request,
     db: Session = Depends(database.get_db), 
     token: str = Depends(oauth2_scheme)
 ) -> models.Veterinarian:
@@ -20,8 +35,9 @@ def get_current_veterinarian(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    # 1. Decodificar el token
-    email = auth.decode_access_token(token)
+    # 1. Decodificar el token (reutiliza el resultado si ya se decodificó en esta petición)
+    with tracing.span("auth.decode_token"):
+        email = get_token_subject(request)
     if email is None:
         raise credentials_exception
     
@@ -29,7 +45,8 @@ def get_current_veterinarian(
     token_data = schemas.TokenData(email=email)
     
     # 3. Obtener el usuario (Veterinario) de la base de datos
-    user = crud.get_veterinarian_by_email(db, email=token_data.email)
+    with tracing.span("auth.load_user"):
+        user = crud.get_veterinarian_by_email(db, email=token_data.email)
     if user is None:
         raise credentials_exception
         
@@ -43,4 +60,15 @@ def get_current_active_veterinarian(
     """
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Usuario inactivo")
-    return current_user
\ No newline at end of file
+    return current_user
+
+def get_rate_limit_key(request: Request) -> str:
+    """
+    Clave del rate limiter: el usuario del token si viene uno válido; si no
+    (login, sign-up, token inválido), la IP. Detrás del proxy todas las
+    estaciones comparten IP, así cada usuario tiene su propio presupuesto.
+    """
+    subject = get_token_subject(request)
+    if subject:
+        return f"user:{subject}"
+    return f"ip:{request.client.host if request.client else '127.0.0.1'}"
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+from sqlalchemy import event
+
+# --- Log de Consultas Lentas con Captura de EXPLAIN ---
+# Toda sentencia que tarde más de SLOW_QUERY_THRESHOLD_MS se loguea con sus
+# parámetros (PII redactada) y la función de crud.py que la originó.
+# Si EXPLAIN_CAPTURE está activo, las peores (más de EXPLAIN_THRESHOLD_MS) se
+# re-ejecutan con EXPLAIN (ANALYZE, BUFFERS) en un hilo aparte y el plan se
+# guarda en un archivo JSONL rotativo. Solo SELECTs: ANALYZE ejecuta la consulta.
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200")) # 0 = desactivado
+EXPLAIN_CAPTURE = os.getenv("EXPLAIN_CAPTURE", "false").lower() == "true"
+EXPLAIN_THRESHOLD_MS = float(os.getenv("EXPLAIN_THRESHOLD_MS", "1000"))
+EXPLAIN_STORE_PATH = os.getenv("EXPLAIN_STORE_PATH", "logs/explain_plans.jsonl")
+EXPLAIN_STORE_MAX_BYTES = 5 * 1024 * 1024
+EXPLAIN_STORE_BACKUPS = 5
+EXPLAIN_COOLDOWN_SECONDS = 600 # un mismo patrón no se vuelve a analizar antes de esto
+
+REDACTED = "<redacted>"
+# q/term/like: parámetros de la búsqueda global (crud.search)
+PII_KEY = re.compile(r"^(?:q|term|like)$|email|phone|name|address|password|microchip|emergency|diagnosis|treatment|prescription|notes|reason", re.I)
+PII_VALUE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+|^\+?[\d\s().-]{7,}$")
+WRITE_KEYWORDS = re.compile(r"\b(?:INSERT|UPDATE|DELETE|MERGE)\b")
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def redact_parameters(parameters):
+    """Copia de los parámetros con los valores sensibles reemplazados."""
+    def redact_value(key, value):
+        if key is not None and PII_KEY.search(str(key)):
+            return REDACTED
+        if isinstance(value, str) and PII_VALUE.search(value):
+            return REDACTED
+        if isinstance(value, (str, int, float, bool)) or value is None:
+            return value
+        return str(value)
+
+    if isinstance(parameters, dict):
+        return {k: redact_value(k, v) for k, v in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return [redact_parameters(p) for p in parameters[:5]] # executemany: solo una muestra
+        return [redact_value(None, v) for v in parameters]
+    return parameters
+
+
+def find_caller() -> str:
+    """Primera función de la app (preferentemente de crud.py) en la pila de llamadas."""
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(APP_DIR) and not filename.endswith("slow_queries.py"):
+            module = os.path.splitext(os.path.basename(filename))[0]
+            name = f"{module}.{frame.f_code.co_name}"
+            if module == "crud":
+                return name
+            fallback = fallback or name
+        frame = frame.f_back
+    return fallback or "unknown"
+
+
+class ExplainStore:
+    """Archivo JSONL rotativo con los planes capturados."""
+    def __init__(self, path: str = EXPLAIN_STORE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._logger = logging.getLogger(f"{__name__}.store")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        if not self._logger.handlers:
+            handler = RotatingFileHandler(path, maxBytes=EXPLAIN_STORE_MAX_BYTES, backupCount=EXPLAIN_STORE_BACKUPS)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger.addHandler(handler)
+        self._lock = threading.Lock()
+        self._last_capture = {}
+
+    def should_capture(self, fingerprint: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_capture.get(fingerprint, -EXPLAIN_COOLDOWN_SECONDS) < EXPLAIN_COOLDOWN_SECONDS:
+                return False
+            self._last_capture[fingerprint] = now
+            return True
+
+    def save(self, entry: dict) -> None:
+        self._logger.info(json.dumps(entry, default=str))
+
+
+def is_explainable(statement: str) -> bool:
+    """
+    Solo lecturas: SELECT, (SELECT ...) UNION ... y WITH ... SELECT. EXPLAIN
+    ANALYZE ejecuta la sentencia, así que un WITH que escribe (WITH ... DELETE)
+    no se analiza aunque después se haga rollback.
+    """
+    head = statement.lstrip().lstrip("(").lstrip().upper()
+    if head.startswith("SELECT"):
+        return True
+    return head.startswith("WITH") and not WRITE_KEYWORDS.search(head)
+
+
+def _capture_explain(engine, store: ExplainStore, entry: dict, statement: str, parameters) -> None:
+    try:
+        with engine.connect() as conn:
+            plan = conn.exec_driver_sql(
+                "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters,
+                execution_options={"skip_slow_query_log": True},
+            ).scalar()
+            conn.rollback()
+        entry["plan"] = plan
+        store.save(entry)
+    except Exception as e:
+        logger.warning("Could not capture EXPLAIN for %s: %s", entry["caller"], e)
+
+
+def setup_slow_query_log(engine, threshold_ms: float = SLOW_QUERY_THRESHOLD_MS,
+                         explain: bool = EXPLAIN_CAPTURE) -> None:
+    if threshold_ms <= 0:
+        return
+    store = ExplainStore() if explain and engine.dialect.name == "postgresql" else None
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _check_duration(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["slow_query_start"].pop()) * 1000
+        if elapsed_ms < threshold_ms:
+            return
+        if context is not None and context.execution_options.get("skip_slow_query_log"):
+            return
+        entry = {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "caller": find_caller(),
+            "duration_ms": round(elapsed_ms, 2),
+            "statement": statement,
+            "parameters": redact_parameters(parameters),
+        }
+        logger.warning(
+            "Slow query (%.1f ms) from %s: %s | params=%s",
+            elapsed_ms, entry["caller"], " ".join(statement.split())[:500], entry["parameters"],
+        )
+
+        if (store is not None and not executemany and elapsed_ms >= EXPLAIN_THRESHOLD_MS
+                and is_explainable(statement)):
+            fingerprint = hashlib.sha1(statement.encode()).hexdigest()
+            if store.should_capture(fingerprint):
+                entry["fingerprint"] = fingerprint
+                threading.Thread(
+                    target=_capture_explain,
+                    args=(engine, store, entry, statement, parameters),
+                    name="explain-capture",
+                    daemon=True,
+                ).start()
+
+    @event.listens_for(engine, "handle_error")
+    def _discard_timer(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("slow_query_start"):
+            conn.info["slow_query_start"].pop()
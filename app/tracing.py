@@ -0,0 +1,334 @@
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# --- Trazas Distribuidas (Streamlit -> API -> BD) ---
+# Propagación con la cabecera W3C 'traceparent'. La página abre el span raíz en
+# get_data (frontend/tracing.py) y la API crea spans hijos para la petición, la
+# ruta, el rate limiter, la autenticación y cada sentencia SQL.
+# Los spans se exportan en un hilo aparte a un JSONL local (TRACE_EXPORT_PATH) y,
+# si se configura TRACE_OTLP_ENDPOINT, a un colector OTLP/HTTP (JSON).
+# Ver una traza:  python -m app.tracing logs/traces.jsonl [trace_id]
+#
+# Este módulo no importa FastAPI ni SQLAlchemy al cargarse: el frontend lo reutiliza.
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "logs/traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "") # ej. http://localhost:4318/v1/traces
+TRACE_EXPORT_INTERVAL = 1.0 # segundos entre lotes
+TRACE_QUEUE_SIZE = 10_000   # si se llena, se descartan spans (nunca se bloquea una petición)
+MAX_STATEMENT_LENGTH = 1000
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+class Span:
+    __slots__ = ("service", "name", "trace_id", "span_id", "parent_id", "sampled",
+                 "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, service: str, name: str, trace_id: str, parent_id: Optional[str], sampled: bool, **attributes):
+        self.service = service
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.error = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        if self.sampled:
+            exporter.submit(self)
+
+    def as_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "service": self.service,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def parse_traceparent(header: Optional[str]):
+    """(trace_id, parent_span_id, sampled) o None si la cabecera no es válida."""
+    match = TRACEPARENT.match((header or "").strip().lower())
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1
+
+
+def start_root_span(service: str, name: str, traceparent: Optional[str] = None, **attributes) -> Span:
+    """Span de entrada: continúa la traza del cliente si trae 'traceparent', si no abre una nueva."""
+    parent = parse_traceparent(traceparent)
+    if parent:
+        trace_id, parent_id, sampled = parent
+    else:
+        trace_id, parent_id = "%032x" % random.getrandbits(128), None
+        sampled = random.random() < TRACE_SAMPLE_RATE
+    return Span(service, name, trace_id, parent_id, sampled, **attributes)
+
+
+def start_child_span(name: str, **attributes) -> Optional[Span]:
+    """Hijo del span actual, o None si no hay traza en curso (tracing apagado o fuera de una petición)."""
+    parent = current_span.get()
+    if parent is None:
+        return None
+    return Span(parent.service, name, parent.trace_id, parent.span_id, parent.sampled, **attributes)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Span hijo como context manager. Sin traza en curso no hace nada (costo ~ un ContextVar.get)."""
+    child = start_child_span(name, **attributes)
+    if child is None:
+        yield None
+        return
+    token = current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.end(error=e)
+        raise
+    finally:
+        current_span.reset(token)
+        child.end()
+
+
+# --- Exportador ---
+class SpanExporter:
+    """Cola + hilo que escribe los spans terminados por lotes (JSONL y/o OTLP)."""
+    def __init__(self, path: str = TRACE_EXPORT_PATH, otlp_endpoint: str = TRACE_OTLP_ENDPOINT):
+        self.path = path
+        self.otlp_endpoint = otlp_endpoint
+        self.queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        self.dropped = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, span: Span) -> None:
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(TRACE_EXPORT_INTERVAL)
+            self.flush()
+
+    def flush(self) -> None:
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            return
+        try:
+            if self.path:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a") as f:
+                    for s in batch:
+                        f.write(json.dumps(s.as_dict(), default=str) + "\n")
+            if self.otlp_endpoint:
+                self._post_otlp(batch)
+        except Exception as e:
+            logger.warning("Could not export %d spans: %s", len(batch), e)
+
+    def _post_otlp(self, batch: list) -> None:
+        by_service = {}
+        for s in batch:
+            by_service.setdefault(s.service, []).append(otlp_span(s))
+        payload = {"resourceSpans": [
+            {
+                "resource": {"attributes": [otlp_attribute("service.name", service)]},
+                "scopeSpans": [{"scope": {"name": "clinica.tracing"}, "spans": spans}],
+            }
+            for service, spans in by_service.items()
+        ]}
+        request = urllib.request.Request(
+            self.otlp_endpoint, data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json"}, method="POST",
+        )
+        urllib.request.urlopen(request, timeout=5).close()
+
+
+def otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+def otlp_span(s: Span) -> dict:
+    data = {
+        "traceId": s.trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        "kind": 2 if s.parent_id is None or s.name.startswith(("GET ", "POST ", "PUT ", "DELETE ", "PATCH ")) else 1,
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(s.end_ns),
+        "attributes": [otlp_attribute(k, v) for k, v in s.attributes.items()],
+        "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+    }
+    if s.parent_id:
+        data["parentSpanId"] = s.parent_id
+    return data
+
+
+exporter = SpanExporter()
+
+
+# --- Integración con FastAPI y SQLAlchemy ---
+def setup_tracing(app, engine, enabled: bool = TRACING_ENABLED) -> None:
+    """
+    Middleware del span de la petición, spans por ruta y por sentencia SQL.
+    Debe llamarse ANTES de declarar las rutas (cambia app.router.route_class).
+    """
+    if not enabled:
+        return
+    from fastapi.routing import APIRoute
+    from sqlalchemy import event
+    from starlette.requests import Request
+
+    class TracedRoute(APIRoute):
+        """Span 'route' alrededor de dependencias + endpoint + serialización."""
+        def get_route_handler(self):
+            handler = super().get_route_handler()
+            path = self.path
+
+            async def traced_handler(request: Request):
+                with span(f"route {path}", **{"http.route": path}):
+                    return await handler(request)
+            return traced_handler
+
+    app.router.route_class = TracedRoute
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_sql_span(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("trace_spans", []).append(start_child_span(
+            "db.query",
+            **{"db.system": engine.dialect.name, "db.statement": statement[:MAX_STATEMENT_LENGTH],
+               "db.executemany": executemany},
+        ))
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end_sql_span(conn, cursor, statement, parameters, context, executemany):
+        sql_span = conn.info["trace_spans"].pop()
+        if sql_span is not None:
+            sql_span.set(**{"db.rowcount": cursor.rowcount})
+            sql_span.end()
+
+    @event.listens_for(engine, "handle_error")
+    def _fail_sql_span(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("trace_spans"):
+            sql_span = conn.info["trace_spans"].pop()
+            if sql_span is not None:
+                sql_span.end(error=exception_context.original_exception)
+
+    @app.middleware("http")
+    async def tracing_middleware(request: Request, call_next):
+        root = start_root_span(
+            "api", f"{request.method} {request.url.path}", request.headers.get("traceparent"),
+            **{"http.method": request.method, "http.target": request.url.path},
+        )
+        token = current_span.set(root)
+        try:
+            response = await call_next(request)
+        except BaseException as e:
+            root.end(error=e)
+            raise
+        finally:
+            current_span.reset(token)
+        route = getattr(request.scope.get("route"), "path", None)
+        if route:
+            root.name = f"{request.method} {route}"
+            root.set(**{"http.route": route})
+        root.set(**{"http.status_code": response.status_code})
+        root.end()
+        response.headers["traceparent"] = root.traceparent
+        return response
+
+
+# --- Visor mínimo ---
+def print_trace(path: str, trace_id: Optional[str] = None) -> None:
+    """Imprime una traza como árbol con duraciones (por defecto, la última del archivo)."""
+    with open(path) as f:
+        spans = [json.loads(line) for line in f if line.strip()]
+    if not spans:
+        print("No hay spans")
+        return
+    trace_id = trace_id or spans[-1]["trace_id"]
+    spans = [s for s in spans if s["trace_id"] == trace_id]
+    ids = {s["span_id"] for s in spans}
+    children = {}
+    for s in spans:
+        parent = s["parent_id"] if s["parent_id"] in ids else None
+        children.setdefault(parent, []).append(s)
+
+    def show(parent, depth):
+        for s in sorted(children.get(parent, []), key=lambda s: s["start_ns"]):
+            detail = s["attributes"].get("db.statement", "")
+            detail = " ".join(detail.split())[:80]
+            flag = f"  !! {s['error']}" if s["error"] else ""
+            print(f"{'  ' * depth}{s['duration_ms']:>9.2f} ms  [{s['service']}] {s['name']} {detail}{flag}")
+            show(s["span_id"], depth + 1)
+
+    print(f"trace {trace_id}")
+    show(None, 0)
+
+
+if __name__ == "__main__":
+    print_trace(*(sys.argv[1:3] or [TRACE_EXPORT_PATH]))
@@ -0,0 +1,59 @@
+"""
+Mide el costo por petición del rate limiter (app/ratelimit.py).
+
+Uso:
+    python -m benchmarks.bench_ratelimit [--iterations 200000] [--redis redis://localhost:6379]
+
+Compara:
+  - sin limiter (línea base del bucle),
+  - bucket local solo (MemoryBackend, un nodo),
+  - bucket local + sincronización por lotes con Redis (si se indica --redis),
+  - un INCR a Redis por petición (el comportamiento anterior con slowapi), si se indica --redis.
+"""
+import argparse
+import time
+
+from app.ratelimit import MemoryBackend, RedisBackend, TieredLimiter
+
+RATE = "1000000/minute" # alto para medir solo el costo, sin rechazos
+
+def time_loop(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    return (time.perf_counter() - start) / iterations * 1e6 # µs por llamada
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200_000)
+    parser.add_argument("--keys", type=int, default=50, help="Número de clientes distintos simulados")
+    parser.add_argument("--redis", default=None, help="URL de Redis para medir el nivel compartido")
+    args = parser.parse_args()
+
+    keys = [f"10.0.0.{i}" for i in range(args.keys)]
+    results = {}
+
+    results["baseline (sin limiter)"] = time_loop(lambda i: keys[i % len(keys)], args.iterations)
+
+    local = TieredLimiter(backend=MemoryBackend())
+    results["bucket local + MemoryBackend"] = time_loop(
+        lambda i: local.hit("bench", keys[i % len(keys)], RATE), args.iterations)
+
+    if args.redis:
+        tiered = TieredLimiter(backend=RedisBackend(args.redis))
+        results["bucket local + Redis (lotes)"] = time_loop(
+            lambda i: tiered.hit("bench", keys[i % len(keys)], RATE), args.iterations)
+
+        import redis
+        client = redis.Redis.from_url(args.redis)
+        n = min(args.iterations, 20_000)
+        results["INCR Redis por petición (anterior)"] = time_loop(
+            lambda i: client.incr(f"bench:{keys[i % len(keys)]}"), n)
+
+    width = max(len(k) for k in results)
+    for name, micros in results.items():
+        print(f"{name:<{width}}  {micros:8.2f} µs/petición")
+    print(f"sincronizaciones: {local.stats['sync_batches']} lotes, errores: {local.stats['sync_errors']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Dataset escalable y reproducible para los benchmarks.
+
+'scale' es el número de dueños; el resto crece en proporción (≈1.5 mascotas y
+≈6 citas por dueño). La semilla es fija para que dos corridas sobre commits
+distintos midan exactamente los mismos datos.
+"""
+import random
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from app import auth, models
+from app.database import Base
+
+# Dominios reales de ejemplo: EmailStr rechaza los reservados como .test en las respuestas
+BENCH_USER_EMAIL = "bench@example.com"
+BENCH_USER_PASSWORD = "bench123"
+
+VETS = 20
+VACCINES = 12
+PETS_PER_OWNER = 1.5
+APPOINTMENTS_PER_PET = 4
+SPECIES = ['dog', 'cat', 'bird', 'rabbit', 'other']
+STATUSES = ['scheduled', 'completed', 'completed', 'completed', 'cancelled', 'no_show']
+
+
+def _chunks(rows: list, size: int = 5000):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+def _bulk_insert(db: Session, model, rows: list) -> None:
+    for chunk in _chunks(rows):
+        db.execute(insert(model), chunk)
+
+
+def seed(engine, scale: int = 1000, seed_value: int = 42) -> dict:
+    """
+    Crea el esquema si hace falta (SQLite) y carga el dataset si la BD está vacía.
+    Devuelve un resumen con los ids que usan los benchmarks.
+    """
+    if engine.dialect.name == "sqlite":
+        Base.metadata.create_all(bind=engine)
+
+    rng = random.Random(seed_value)
+    today = date.today()
+
+    with Session(engine) as db:
+        if db.scalar(select(func.count()).select_from(models.Owner)):
+            if not db.scalar(select(func.count()).select_from(models.Veterinarian)
+                             .where(models.Veterinarian.email == BENCH_USER_EMAIL)):
+                raise RuntimeError(f"La BD {engine.url.render_as_string(hide_password=True)} tiene un dataset "
+                                   "anterior (correos .test); bórrela para volver a sembrarla.")
+            return describe(db)
+
+        hashed = auth.get_password_hash(BENCH_USER_PASSWORD)
+        vets = [{
+            "license_number": f"VET-{i:05d}",
+            "first_name": f"Vet{i}",
+            "last_name": f"Bench{i}",
+            "email": BENCH_USER_EMAIL if i == 0 else f"vet{i}@example.com",
+            "hashed_password": hashed,
+            "hire_date": today - timedelta(days=rng.randint(100, 3000)),
+            "is_active": True,
+            "consultation_fee": Decimal(rng.randint(40, 150)),
+            "total_appointments": 0,
+        } for i in range(VETS)]
+        _bulk_insert(db, models.Veterinarian, vets)
+
+        owners = [{
+            "first_name": f"Owner{i}",
+            "last_name": f"Family{i % 997}",
+            "email": f"owner{i}@example.com",
+            "phone": f"555-{i:07d}",
+            "address": f"Calle {i}",
+        } for i in range(scale)]
+        _bulk_insert(db, models.Owner, owners)
+
+        vaccines = [{"name": f"Vacuna {i}", "manufacturer": "BenchLabs", "species_applicable": "dog,cat"}
+                    for i in range(VACCINES)]
+        _bulk_insert(db, models.Vaccine, vaccines)
+        db.flush()
+
+        vet_ids = db.scalars(select(models.Veterinarian.veterinarian_id)).all()
+        owner_ids = db.scalars(select(models.Owner.owner_id)).all()
+        vaccine_ids = db.scalars(select(models.Vaccine.vaccine_id)).all()
+
+        pets = [{
+            "name": f"Pet{i}",
+            "species": rng.choice(SPECIES),
+            "owner_id": owner_ids[int(i / PETS_PER_OWNER) % len(owner_ids)],
+            "microchip_number": f"CHIP{i:09d}",
+            "visit_count": 0,
+            "is_neutered": rng.random() < 0.5,
+        } for i in range(int(scale * PETS_PER_OWNER))]
+        _bulk_insert(db, models.Pet, pets)
+        db.flush()
+        pet_ids = db.scalars(select(models.Pet.pet_id)).all()
+
+        appointments = []
+        for pet_id in pet_ids:
+            for _ in range(APPOINTMENTS_PER_PET):
+                offset = rng.randint(-720, 30)
+                status = 'scheduled' if offset >= 0 else rng.choice(STATUSES)
+                appointments.append({
+                    "pet_id": pet_id,
+                    "veterinarian_id": rng.choice(vet_ids),
+                    "appointment_date": datetime.combine(today + timedelta(days=offset), datetime.min.time())
+                                        + timedelta(hours=rng.randint(8, 17), minutes=rng.choice([0, 30])),
+                    "reason": "Control",
+                    "status": status,
+                })
+        _bulk_insert(db, models.Appointment, appointments)
+        db.flush()
+
+        completed = db.execute(
+            select(models.Appointment.appointment_id, models.Appointment.appointment_date)
+            .where(models.Appointment.status == 'completed')
+        ).all()
+        records, invoices = [], []
+        for n, (appt_id, appt_date) in enumerate(completed):
+            records.append({
+                "appointment_id": appt_id,
+                "appointment_date": appt_date,
+                "diagnosis": rng.choice(["Otitis externa", "Dermatitis alérgica", "Gastroenteritis", "Control sano"]),
+                "treatment": "Tratamiento estándar",
+                "follow_up_required": rng.random() < 0.2,
+            })
+            subtotal = Decimal(rng.randint(40, 300))
+            paid = rng.random() < 0.7
+            invoices.append({
+                "appointment_id": appt_id,
+                "appointment_date": appt_date,
+                "invoice_number": f"BENCH-{n:08d}",
+                "issue_date": appt_date.date(),
+                "subtotal": subtotal,
+                "tax_amount": (subtotal * Decimal("0.13")).quantize(Decimal("0.01")),
+                "total_amount": (subtotal * Decimal("1.13")).quantize(Decimal("0.01")),
+                "payment_status": 'paid' if paid else 'pending',
+                "payment_date": appt_date + timedelta(days=rng.randint(0, 20)) if paid else None,
+            })
+        _bulk_insert(db, models.MedicalRecord, records)
+        _bulk_insert(db, models.Invoice, invoices)
+
+        vaccinations = [{
+            "pet_id": pet_id,
+            "vaccine_id": rng.choice(vaccine_ids),
+            "veterinarian_id": rng.choice(vet_ids),
+            "vaccination_date": today - timedelta(days=rng.randint(0, 365)),
+            "next_dose_date": today + timedelta(days=rng.randint(-30, 120)),
+        } for pet_id in pet_ids]
+        _bulk_insert(db, models.VaccinationRecord, vaccinations)
+
+        db.commit()
+        return describe(db)
+
+
+def describe(db: Session) -> dict:
+    """Ids y conteos que necesitan los generadores de carga."""
+    return {
+        "vet_ids": db.scalars(select(models.Veterinarian.veterinarian_id)).all(),
+        "pet_ids": db.scalars(select(models.Pet.pet_id)).all(),
+        "owner_ids": db.scalars(select(models.Owner.owner_id)).all(),
+        "pending_invoice_ids": db.scalars(
+            select(models.Invoice.invoice_id).where(models.Invoice.payment_status == 'pending')
+        ).all(),
+        "counts": {
+            model.__tablename__: db.scalar(select(func.count()).select_from(model))
+            for model in (models.Owner, models.Pet, models.Appointment, models.Invoice,
+                          models.MedicalRecord, models.VaccinationRecord)
+        },
+    }
@@ -0,0 +1,250 @@
+import base64
+import json
+import logging
+import os
+import threading
+import time
+
+import streamlit as st
+from frontend.tracing import traced_get
+
+# --- Caché Compartida de Lecturas para las Páginas (Redis) ---
+# Reemplaza a @st.cache_data en get_data. st.cache_data vive en cada proceso de
+# Streamlit, se indexa solo por el endpoint (sin importar quién llama) y se
+# borraba entera con st.cache_data.clear() después de cualquier escritura.
+# Aquí:
+#   - la clave es (rol del usuario, endpoint), así que dos roles nunca
+#     comparten una respuesta, y la guardan todas las réplicas en Redis;
+#   - cada endpoint pertenece a una "etiqueta" (el primer segmento de la ruta:
+#     /pets/..., /reports/...). El valor se guarda como 'versión:json' y cada
+#     etiqueta tiene un contador de versión;
+#   - una escritura sube la versión solo de las etiquetas que afecta
+#     (DEPENDENT_TAGS). Un valor con versión vieja ya no se usa, aunque una
+#     lectura que empezó antes de la escritura lo guarde después.
+# Si Redis no responde se va directo a la API (fail-open). Sin el paquete redis,
+# o con FRONTEND_CACHE_URI=memory://, la caché es por proceso como antes.
+
+logger = logging.getLogger(__name__)
+
+FRONTEND_CACHE_ENABLED = os.getenv("FRONTEND_CACHE_ENABLED", "true").lower() != "false"
+FRONTEND_CACHE_URI = os.getenv("FRONTEND_CACHE_URI", os.getenv("RATE_LIMIT_STORAGE_URI", "redis://localhost:6379"))
+DEFAULT_ROLE = "veterinarian" # tokens emitidos antes de que existiera el claim 'role'
+EVENT_MARKER_TTL = 300
+BACKEND_ERROR_LOG_INTERVAL = 60 # no llenar el log si Redis está caído
+
+# Respuestas que dependen de QUIÉN llama (no solo del rol): nunca se comparten
+PRIVATE_PREFIXES = ("/users/",)
+
+# Etiquetas que hay que invalidar cuando cambia un recurso. Sale de lo que
+# embeben las respuestas: la mascota trae a su dueño, la cita a la mascota y al
+# veterinario, la factura a la cita, los reportes agregan casi todo, etc.
+DEPENDENT_TAGS = {
+    "owners": ("pets", "reports"),
+    "pets": ("owners", "appointments", "vaccination-records", "invoices", "reports"),
+    "appointments": ("pets", "veterinarians", "invoices", "reports"),
+    "invoices": ("pets", "reports"),
+    "veterinarians": ("appointments", "vaccination-records", "invoices", "reports"),
+    "vaccines": ("vaccination-records", "reports"),
+    "vaccination-records": ("pets", "reports", "reminders"),
+    "reminders": (),
+}
+# Rutas de escritura cuyo recurso no es el primer segmento (/import/{tipo}, /sign-up)
+RESOURCE_ALIASES = {"vaccinations": "vaccination-records", "sign-up": "veterinarians"}
+
+
+def tag_of(endpoint: str) -> str:
+    """'/pets/3/timeline?limit=100' -> 'pets'; '/import/vaccinations' -> 'vaccination-records'."""
+    parts = [p for p in endpoint.split("?", 1)[0].split("/") if p]
+    if not parts:
+        return ""
+    if parts[0] == "import" and len(parts) > 1:
+        return RESOURCE_ALIASES.get(parts[1], parts[1])
+    return RESOURCE_ALIASES.get(parts[0], parts[0])
+
+
+def _token_claims(token: str) -> dict:
+    """
+    Lee el payload del JWT SIN verificar la firma: solo se usa para elegir la
+    partición de la caché y para no servir nada con un token vencido. Quien
+    valida el token sigue siendo la API, en cada fallo de caché.
+    """
+    try:
+        payload = token.split(".")[1]
+        return json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (AttributeError, IndexError, ValueError):
+        return {}
+
+
+# --- Backends ---
+class MemoryBackend:
+    """Un solo proceso (desarrollo, o si no está instalado redis)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}   # clave -> (bytes, vence_en)
+        self._versions = {} # etiqueta -> versión
+        self._markers = {}  # marca -> vence_en
+
+    def get(self, key: str, tag: str) -> tuple:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._values.get(key)
+            value = entry[0] if entry and entry[1] > now else None
+            return value, self._versions.get(tag, 0)
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if len(self._values) > 5000:
+                self._values = {k: v for k, v in self._values.items() if v[1] > now}
+            self._values[key] = (value, now + ttl)
+
+    def bump(self, tags: list) -> None:
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def claim(self, marker: str, ttl: int) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if self._markers.get(marker, 0) > now:
+                return False
+            self._markers = {m: t for m, t in self._markers.items() if t > now}
+            self._markers[marker] = now + ttl
+            return True
+
+class RedisBackend:
+    """Valores en st:cache:{rol}:{endpoint}; versión de cada etiqueta en st:v:{etiqueta}."""
+    def __init__(self, url: str):
+        import redis
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2, socket_connect_timeout=0.2)
+
+    def get(self, key: str, tag: str) -> tuple:
+        value, version = self._client.mget(f"st:cache:{key}", f"st:v:{tag}")
+        return value, int(version or 0)
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        self._client.set(f"st:cache:{key}", value, ex=ttl)
+
+    def bump(self, tags: list) -> None:
+        pipe = self._client.pipeline(transaction=False)
+        for tag in tags:
+            pipe.incr(f"st:v:{tag}")
+        pipe.execute()
+
+    def claim(self, marker: str, ttl: int) -> bool:
+        return bool(self._client.set(f"st:event:{marker}", 1, nx=True, ex=ttl))
+
+def backend_from_uri(uri: str):
+    if uri.startswith("memory://"):
+        return MemoryBackend()
+    return RedisBackend(uri)
+
+def _create_backend():
+    if not FRONTEND_CACHE_ENABLED:
+        return None
+    try:
+        return backend_from_uri(FRONTEND_CACHE_URI)
+    except ImportError:
+        logger.warning("redis package not installed, frontend cache is per process only")
+        return MemoryBackend()
+
+_backend = _create_backend()
+_last_backend_error = 0.0
+stats = {"hits": 0, "misses": 0, "bypassed": 0, "invalidations": 0, "backend_errors": 0}
+
+
+def _backend_error(error: Exception) -> None:
+    global _last_backend_error
+    stats["backend_errors"] += 1
+    now = time.monotonic()
+    if now - _last_backend_error > BACKEND_ERROR_LOG_INTERVAL:
+        _last_backend_error = now
+        logger.warning("Frontend cache backend unavailable, calling the API directly: %s", error)
+
+
+# --- API para las páginas ---
+def cached_get(api_url: str, endpoint: str, ttl: int):
+    """
+    GET autenticado a la API con la caché compartida. Devuelve el JSON ya
+    decodificado; los errores HTTP/conexión se propagan (RequestException) y
+    no se guardan.
+    """
+    token = st.session_state['auth_token']
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def fetch() -> bytes:
+        response = traced_get(f"{api_url}{endpoint}", f"get_data {endpoint}", headers=headers)
+        response.raise_for_status()
+        return response.content
+
+    claims = _token_claims(token)
+    if (_backend is None or endpoint.startswith(PRIVATE_PREFIXES)
+            or claims.get("exp", 0) <= time.time()):
+        # Token vencido o ilegible: que la API responda (401) en vez de la caché
+        stats["bypassed"] += 1
+        return json.loads(fetch())
+
+    key = f"{claims.get('role', DEFAULT_ROLE)}:{endpoint}"
+    tag = tag_of(endpoint)
+    version = None
+    try:
+        stored, version = _backend.get(key, tag)
+        if stored is not None:
+            stored_version, _, payload = stored.partition(b":")
+            if int(stored_version) == version:
+                stats["hits"] += 1
+                return json.loads(payload)
+    except Exception as e:
+        _backend_error(e)
+
+    stats["misses"] += 1
+    payload = fetch()
+    if version is not None:
+        # Con la versión leída ANTES de llamar a la API
+        try:
+            _backend.set(key, b"%d:" % version + payload, ttl)
+        except Exception as e:
+            _backend_error(e)
+    return json.loads(payload)
+
+
+def invalidate(*resources: str) -> None:
+    """Invalida las lecturas afectadas por cambios en esos recursos ('pets', 'appointments', ...)."""
+    if _backend is None:
+        return
+    tags = set()
+    for resource in resources:
+        resource = RESOURCE_ALIASES.get(resource, resource)
+        tags.add(resource)
+        tags.update(DEPENDENT_TAGS.get(resource, ()))
+    stats["invalidations"] += len(tags)
+    try:
+        _backend.bump(sorted(tags))
+    except Exception as e:
+        _backend_error(e)
+
+
+def invalidate_for(endpoint: str) -> None:
+    """Llamar después de una escritura exitosa (POST/PUT/DELETE) a 'endpoint'."""
+    invalidate(tag_of(endpoint))
+
+
+def invalidate_for_event(event_key: str, *topics: str) -> None:
+    """
+    Igual que invalidate(), pero para eventos en vivo: todas las sesiones abiertas
+    reciben el mismo evento y solo la primera sube las versiones. 'event_key' es
+    el 'origin' del evento ('{boot}-{n}' de quien lo publicó): es el mismo en
+    todos los workers del API, a diferencia del id SSE, que es local a cada uno.
+    """
+    if _backend is None:
+        return
+    if not event_key:
+        invalidate(*topics)
+        return
+    try:
+        first = _backend.claim(f"{event_key}:{','.join(topics)}", EVENT_MARKER_TTL)
+    except Exception as e:
+        _backend_error(e)
+        first = True
+    if first:
+        invalidate(*topics)
@@ -0,0 +1,111 @@
+import json
+import threading
+import requests
+import streamlit as st
+from frontend.cache import invalidate_for_event
+
+# --- Consumidor de Eventos en Vivo (SSE) para las páginas de Streamlit ---
+# Un hilo por sesión mantiene abierta la conexión a /events/stream y solo marca
+# que "algo cambió". La página revisa esa marca localmente (sin HTTP) dentro de
+# un fragmento y recarga los datos únicamente cuando llega un evento relevante.
+
+CHECK_INTERVAL = "2s"
+RECONNECT_DELAY_SECONDS = 3
+
+class LiveWatcher:
+    def __init__(self, api_url: str, token: str, topics: tuple):
+        self.api_url = api_url
+        self.token = token
+        self.topics = topics
+        self.last_event_id = "" # '{boot}-{secuencia}' del proceso del API
+        self.last_event_key = "" # identidad del evento en todos los procesos ('origin')
+        self.connected = False
+        self._changed = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def consume_change(self) -> bool:
+        """True si llegó algún evento desde la última consulta (y reinicia la marca)."""
+        if self._changed.is_set():
+            self._changed.clear()
+            return True
+        return False
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            headers = {"Authorization": f"Bearer {self.token}", "Accept": "text/event-stream"}
+            if self.last_event_id:
+                headers["Last-Event-ID"] = self.last_event_id
+            try:
+                with requests.get(
+                    f"{self.api_url}/events/stream",
+                    params={"topics": ",".join(self.topics)},
+                    headers=headers,
+                    stream=True,
+                    timeout=(5, 60),
+                ) as response:
+                    if response.status_code == 401:
+                        # Token vencido: no tiene sentido reintentar
+                        return
+                    response.raise_for_status()
+                    self.connected = True
+                    self._read_stream(response)
+            except requests.exceptions.RequestException:
+                pass
+            self.connected = False
+            self._stop.wait(RECONNECT_DELAY_SECONDS)
+
+    def _read_stream(self, response) -> None:
+        data_lines = []
+        for line in response.iter_lines(decode_unicode=True):
+            if self._stop.is_set():
+                return
+            if line is None:
+                continue
+            if line.startswith("id:"):
+                self.last_event_id = line[3:].strip()
+            elif line.startswith("data:"):
+                data_lines.append(line[5:].strip())
+            elif line == "" and data_lines:
+                # Fin de un evento
+                event = json.loads("\n".join(data_lines))
+                data_lines = []
+                # Los 'resync' no tienen origin: se usa el id SSE
+                self.last_event_key = event.get("origin") or self.last_event_id
+                if event.get("topic") in self.topics:
+                    self._changed.set()
+
+
+def watch(api_url: str, topics: tuple) -> LiveWatcher:
+    """Devuelve el watcher de la sesión actual, creándolo (o renovándolo) si hace falta."""
+    key = f"live_watcher_{'_'.join(topics)}"
+    token = st.session_state['auth_token']
+    watcher = st.session_state.get(key)
+    if watcher is None or watcher.token != token:
+        if watcher is not None:
+            watcher.stop()
+        watcher = LiveWatcher(api_url, token, topics)
+        st.session_state[key] = watcher
+    return watcher
+
+
+def refresh_on_change(api_url: str, topics: tuple) -> None:
+    """
+    Registra un fragmento que revisa el watcher cada pocos segundos y, si hubo
+    un evento, invalida en la caché compartida solo las lecturas que dependen de
+    esos temas y recarga la página.
+    """
+    watcher = watch(api_url, topics)
+
+    @st.fragment(run_every=CHECK_INTERVAL)
+    def _live_indicator():
+        if watcher.consume_change():
+            invalidate_for_event(watcher.last_event_key, *topics)
+            st.rerun(scope="app")
+        st.caption("🟢 En vivo" if watcher.connected else "⚪ Reconectando...")
+
+    _live_indicator()
@@ -0,0 +1,53 @@
+import requests
+import streamlit as st
+from frontend.tracing import traced_get
+
+# --- Copia Local Sincronizada (M8) ---
+# En vez de descargar la colección completa cada vez que expira la caché,
+# la página guarda sus filas en session_state y solo pide a /sync/{entity}
+# lo que cambió desde el último token, aplicando altas, cambios y borrados.
+
+ID_FIELDS = {
+    'owners': 'owner_id',
+    'pets': 'pet_id',
+    'appointments': 'appointment_id',
+    'invoices': 'invoice_id',
+}
+
+def synced_collection(api_url: str, entity: str) -> list:
+    """
+    Devuelve la lista completa y actualizada de 'entity'.
+    La primera llamada descarga todo (paginado); las siguientes solo el delta.
+    """
+    key = f"sync_{entity}"
+    state = st.session_state.get(key) or {"rows": {}, "token": None}
+    id_field = ID_FIELDS[entity]
+    headers = {"Authorization": f"Bearer {st.session_state['auth_token']}"}
+
+    try:
+        while True:
+            params = {"since": state["token"]} if state["token"] else {}
+            response = traced_get(f"{api_url}/sync/{entity}", f"sync {entity}", headers=headers, params=params)
+            response.raise_for_status()
+            delta = response.json()
+
+            if delta["reset"]:
+                state["rows"] = {}
+            for row in delta["changes"]:
+                state["rows"][row[id_field]] = row
+            for deleted_id in delta["deleted"]:
+                state["rows"].pop(deleted_id, None)
+            state["token"] = delta["next_token"]
+
+            if not delta["has_more"]:
+                break
+    except requests.exceptions.RequestException as e:
+        st.error(f"Error de sincronización ({entity}): {e}")
+
+    st.session_state[key] = state
+    return list(state["rows"].values())
+
+
+def reset_collection(entity: str) -> None:
+    """Olvida la copia local (la próxima llamada vuelve a descargar todo)."""
+    st.session_state.pop(f"sync_{entity}", None)
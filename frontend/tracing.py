@@ -0,0 +1,29 @@
+import requests
+
+from app import tracing
+
+# --- Trazas desde Streamlit ---
+# get_data abre el span raíz de la traza y lo propaga a la API con la cabecera
+# 'traceparent'. Así una página lenta se puede separar en: tiempo en Streamlit
+# (fuera del span), red + serialización (span raíz menos el de la API) y lo que
+# pasa dentro de la API (auth, limiter, SQL). Con TRACING_ENABLED=false es un
+# requests.get normal.
+
+SERVICE_NAME = "streamlit"
+
+
+def traced_get(url: str, span_name: str = None, headers: dict = None, **kwargs) -> requests.Response:
+    """requests.get dentro de un span raíz, propagando el contexto a la API."""
+    if not tracing.TRACING_ENABLED:
+        return requests.get(url, headers=headers, **kwargs)
+
+    root = tracing.start_root_span(SERVICE_NAME, span_name or "get_data", **{"http.method": "GET", "http.url": url})
+    headers = dict(headers or {}, traceparent=root.traceparent)
+    try:
+        response = requests.get(url, headers=headers, **kwargs)
+    except requests.exceptions.RequestException as e:
+        root.end(error=e)
+        raise
+    root.set(**{"http.status_code": response.status_code, "http.response_bytes": len(response.content)})
+    root.end()
+    return response
@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
 import requests
+from frontend.cache import cached_get
 
 # --- 1. Protección de la Página (Auth) ---
 if 'logged_in' not in st.session_state or not st.session_state['logged_in']:
@@ -12,17 +13,27 @@ st.set_page_config(page_title="Gestión de Mascotas", page_icon="🐶", layout="
 API_URL = "http://127.0.0.1:8000"
 
 # --- 3. Función de Carga de Datos ---
-@st.cache_data(ttl=5) # Cache corto para que se sienta rápido pero actualizado
+# Caché compartida entre réplicas (Redis), por rol y endpoint (frontend/cache.py)
 def get_data(endpoint):
-    headers = {"Authorization": f"Bearer {st.session_state['auth_token']}"}
     try:
-        response = requests.get(f"{API_URL}{endpoint}", headers=headers)
-        response.raise_for_status()
-        return response.json()
+        return cached_get(API_URL, endpoint, ttl=5)
     except requests.exceptions.RequestException as e:
         st.error(f"Error al conectar con la API: {e}")
         return None
 
+def pet_detail_fallback(pet_id):
+    """Datos de la mascota desde el listado, si /timeline no respondió."""
+    return next((p for p in pets_list if p['pet_id'] == pet_id), None)
+
+# Eventos por página del expediente (/pets/{id}/timeline)
+TIMELINE_PAGE_SIZE = 100
+TIMELINE_LABELS = {
+    'appointment': "📅 Cita",
+    'medical_record': "🩺 Consulta",
+    'vaccination': "💉 Vacuna",
+    'invoice': "🧾 Factura",
+}
+
 # --- 4. Interfaz Principal ---
 st.title("🐶 Gestión de Pacientes (Mascotas)")
 
@@ -95,20 +106,22 @@ if pets_list:
     if selected_option:
         selected_pet_id = pet_options[selected_option]
         
-        # Cargar datos específicos de la mascota seleccionada
-        # (Usamos endpoints específicos para traer detalles frescos)
-        
-        # 1. Detalles básicos (ya los tenemos, pero podemos pedir frescos si quieres)
-        pet_detail = next((p for p in pets_list if p['pet_id'] == selected_pet_id), None)
-        
-        # 2. Historial Médico (M1)
-        medical_history = get_data(f"/pets/{selected_pet_id}/medical-history")
+        # Todo el expediente (mascota, dueño, citas, historiales, vacunas y
+        # facturas) llega en UNA petición a /timeline, paginado del más reciente
+        # al más antiguo. "Cargar más" pide la página siguiente y la acumula.
+        include_archived = st.toggle("Incluir historial archivado", value=False)
+        timeline_url = f"/pets/{selected_pet_id}/timeline?limit={TIMELINE_PAGE_SIZE}&include_archived={str(include_archived).lower()}"
+        timeline = get_data(timeline_url) or {"pet": pet_detail_fallback(selected_pet_id), "events": [], "has_more": False}
+        more_key = f"timeline_more_{selected_pet_id}_{include_archived}"
+        more = st.session_state.get(more_key, {"events": [], "has_more": timeline['has_more']})
         
-        # 3. Vacunas (M2)
-        vaccinations = get_data(f"/pets/{selected_pet_id}/vaccinations")
+        pet_detail = timeline['pet']
+        timeline_events = timeline['events'] + more['events']
+        medical_history = [e for e in timeline_events if e['event_type'] == 'medical_record']
+        vaccinations = [e for e in timeline_events if e['event_type'] == 'vaccination']
         
         # --- MOSTRAR DETALLES EN PESTAÑAS ---
-        tab_info, tab_medical, tab_vaccines = st.tabs(["ℹ️ Información General", "🩺 Historial Médico", "💉 Vacunación"])
+        tab_info, tab_timeline, tab_medical, tab_vaccines = st.tabs(["ℹ️ Información General", "🕒 Línea de Tiempo", "🩺 Historial Médico", "💉 Vacunación"])
         
         with tab_info:
             c1, c2 = st.columns(2)
@@ -122,23 +135,48 @@ if pets_list:
                 owner = pet_detail['owner']
                 st.markdown(f"**Nombre:** {owner['first_name']} {owner['last_name']}")
                 st.markdown(f"**Email:** {owner['email']}")
-                st.markdown(f"**Teléfono:** {owner.get('phone', 'N/A')}")
-                st.markdown(f"**Dirección:** {owner.get('address', 'N/A')}")
+                st.markdown(f"**Teléfono:** {owner.get('phone') or 'N/A'}")
+                st.markdown(f"**Dirección:** {owner.get('address') or 'N/A'}")
                 
                 # Datos M3 (si existen)
-                if 'emergency_contact' in owner:
+                if owner.get('emergency_contact'):
                     st.info(f"🚨 **Emergencia:** {owner['emergency_contact']}")
 
+        with tab_timeline:
+            st.subheader("Línea de Tiempo del Paciente")
+            if timeline_events:
+                df_timeline = pd.DataFrame([{
+                    "Fecha": e['occurred_at'][:16].replace("T", " "),
+                    "Tipo": TIMELINE_LABELS[e['event_type']],
+                    "Detalle": e.get('title') or "",
+                    "Veterinario": e.get('veterinarian') or "",
+                    "Archivado": "📦" if e.get('archived') else "",
+                } for e in timeline_events])
+                st.dataframe(df_timeline, width='stretch', hide_index=True)
+            else:
+                st.info("No hay eventos registrados para este paciente.")
+            
+            if more['has_more'] and st.button("Cargar más"):
+                next_page = get_data(f"{timeline_url}&skip={len(timeline_events)}")
+                if next_page:
+                    more['events'] += next_page['events']
+                    more['has_more'] = next_page['has_more']
+                    st.session_state[more_key] = more
+                    st.rerun()
+
         with tab_medical:
             st.subheader("Historial de Consultas")
             if medical_history:
                 for record in medical_history:
-                    with st.expander(f"Consulta del {record['created_at'][:10]} - {record['diagnosis'][:30]}..."):
-                        st.markdown(f"**Diagnóstico:** {record['diagnosis']}")
-                        st.markdown(f"**Tratamiento:** {record['treatment']}")
-                        if record.get('prescription'):
-                            st.markdown(f"**Receta:** {record['prescription']}")
-                        if record.get('follow_up_required'):
+                    details = record['details']
+                    label = f"Consulta del {record['occurred_at'][:10]} - {details['diagnosis'][:30]}..."
+                    with st.expander(f"📦 {label}" if record.get('archived') else label):
+                        st.markdown(f"**Veterinario:** {record.get('veterinarian') or 'N/A'} (cita #{record.get('appointment_id')})")
+                        st.markdown(f"**Diagnóstico:** {details['diagnosis']}")
+                        st.markdown(f"**Tratamiento:** {details['treatment']}")
+                        if details.get('prescription'):
+                            st.markdown(f"**Receta:** {details['prescription']}")
+                        if details.get('follow_up_required'):
                             st.warning("⚠️ Requiere seguimiento")
             else:
                 st.info("No hay historial médico registrado para este paciente.")
@@ -146,11 +184,13 @@ if pets_list:
         with tab_vaccines:
             st.subheader("Registro de Vacunación")
             if vaccinations:
-                df_vacs = pd.DataFrame(vaccinations)
-                
-                # Aplanar datos de la vacuna para mostrar el nombre
-                df_vacs['vaccine_name'] = df_vacs['vaccine'].apply(lambda x: x['name'])
-                df_vacs['vet_name'] = df_vacs['veterinarian'].apply(lambda x: f"Dr. {x['last_name']}")
+                df_vacs = pd.DataFrame([{
+                    "vaccination_date": v['occurred_at'][:10],
+                    "vaccine_name": v['details']['vaccine'],
+                    "batch_number": v['details'].get('batch_number'),
+                    "next_dose_date": v['details'].get('next_dose_date'),
+                    "vet_name": v.get('veterinarian'),
+                } for v in vaccinations])
                 
                 st.dataframe(
                     df_vacs[['vaccination_date', 'vaccine_name', 'batch_number', 'next_dose_date', 'vet_name']],
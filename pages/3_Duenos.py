@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
 import requests
+from frontend.cache import cached_get, invalidate_for
 from datetime import datetime
 
 # --- 1. Protección de la Página (Auth) ---
@@ -13,13 +14,10 @@ st.set_page_config(page_title="Gestión de Dueños", page_icon="👤", layout="w
 API_URL = "http://127.0.0.1:8000"
 
 # --- 3. Funciones Auxiliares ---
-@st.cache_data(ttl=5)
+# Caché compartida entre réplicas (Redis), por rol y endpoint (frontend/cache.py)
 def get_data(endpoint):
-    headers = {"Authorization": f"Bearer {st.session_state['auth_token']}"}
     try:
-        response = requests.get(f"{API_URL}{endpoint}", headers=headers)
-        response.raise_for_status()
-        return response.json()
+        return cached_get(API_URL, endpoint, ttl=5)
     except requests.exceptions.RequestException as e:
         st.error(f"Error de conexión: {e}")
         return None
@@ -35,6 +33,7 @@ def api_request(method: str, endpoint: str, data: dict = None):
             response = requests.delete(f"{API_URL}{endpoint}", headers=headers)
         
         response.raise_for_status()
+        invalidate_for(endpoint)
         if response.status_code != 204:
             return response.json()
         return True
@@ -251,6 +250,45 @@ if owners_list:
 else:
     st.info("No hay dueños registrados o no se pudo conectar con la API.")
 
+# --- IMPORTACIÓN MASIVA (clínicas que migran) ---
+# Fuera de las pestañas: una clínica nueva todavía no tiene dueños cargados.
+with st.expander("📥 Importación Masiva (CSV / Parquet)"):
+    st.caption(
+        "Importar en orden: dueños → mascotas (columna owner_email) → vacunas (columna pet_microchip). "
+        "Las filas con errores no se cargan y se pueden descargar para corregirlas."
+    )
+    import_kinds = {"Dueños": "owners", "Mascotas": "pets", "Vacunas": "vaccinations"}
+    import_label = st.selectbox("Tipo de datos", list(import_kinds.keys()))
+    import_upload = st.file_uploader("Archivo", type=["csv", "parquet"])
+
+    if import_upload and st.button("Importar"):
+        headers = {"Authorization": f"Bearer {st.session_state['auth_token']}"}
+        with st.spinner("Importando..."):
+            try:
+                response = requests.post(
+                    f"{API_URL}/import/{import_kinds[import_label]}",
+                    headers=headers,
+                    files={"file": (import_upload.name, import_upload.getvalue())},
+                    timeout=600,
+                )
+                response.raise_for_status()
+                result = response.json()
+            except requests.exceptions.RequestException as e:
+                st.error(f"Error en la importación: {e}")
+                result = None
+
+        if result:
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Filas", result['rows'])
+            c2.metric("Importadas", result['imported'])
+            c3.metric("Rechazadas", result['rejected'])
+            if result['rejects_file']:
+                rejects = requests.get(f"{API_URL}/import/rejects/{result['rejects_file']}", headers=headers)
+                if rejects.ok:
+                    st.download_button("⬇️ Descargar filas rechazadas", rejects.content,
+                                       file_name=result['rejects_file'], mime="text/csv")
+            invalidate_for(f"/import/{import_kinds[import_label]}")
+
 # Botón flotante para volver
 st.markdown("---")
 if st.button("⬅️ Volver al Menú Principal"):
@@ -1,6 +1,9 @@
 import streamlit as st
 import pandas as pd
 import requests
+from frontend.cache import cached_get, invalidate_for
+from frontend.live import refresh_on_change
+from frontend.sync import synced_collection
 from datetime import datetime, date, time, timedelta
 
 # --- 1. Protección de la Página (Auth) ---
@@ -12,15 +15,13 @@ st.set_page_config(page_title="Gestión de Citas", page_icon="📅", layout="wid
 API_URL = "http://127.0.0.1:8000"
 
 # --- 3. Funciones Auxiliares ---
-@st.cache_data(ttl=5)
+# La caché ya no necesita expirar cada 5s: se invalida al llegar un evento en vivo
+# Caché compartida entre réplicas (Redis), por rol y endpoint (frontend/cache.py)
 def get_data(endpoint):
-    headers = {"Authorization": f"Bearer {st.session_state['auth_token']}"}
     try:
-        response = requests.get(f"{API_URL}{endpoint}", headers=headers)
-        response.raise_for_status()
-        return response.json()
+        return cached_get(API_URL, endpoint, ttl=300)
     except requests.exceptions.RequestException as e:
-        if response.status_code == 404:
+        if e.response is not None and e.response.status_code == 404:
             return []
         st.error(f"Error de conexión: {e}")
         return []
@@ -36,6 +37,7 @@ def api_request(method: str, endpoint: str, data: dict = None):
             response = requests.delete(f"{API_URL}{endpoint}", headers=headers)
         
         response.raise_for_status()
+        invalidate_for(endpoint)
         if response.status_code != 204:
             return response.json()
         return True
@@ -51,10 +53,14 @@ def api_request(method: str, endpoint: str, data: dict = None):
 st.title("📅 Gestión de Citas y Emergencias")
 
 # Cargar datos necesarios
-appts_list = get_data("/appointments/")
+# Las citas se mantienen en una copia local que solo recibe los cambios (M8)
+appts_list = sorted(synced_collection(API_URL, "appointments"), key=lambda a: a['appointment_date'], reverse=True)
 pets_list = get_data("/pets/")
 vets_list = get_data("/veterinarians/")
 
+# Refrescar solo cuando la API publique cambios de citas o facturas
+refresh_on_change(API_URL, ("appointments", "invoices"))
+
 # Mapeos para selectboxes
 pet_options = {f"{p['pet_id']} - {p['name']}": p['pet_id'] for p in pets_list} if pets_list else {}
 vet_options = {f"{v['veterinarian_id']} - {v['first_name']} {v['last_name']}": v['veterinarian_id'] for v in vets_list} if vets_list else {}
@@ -128,6 +134,16 @@ with tab_create:
         reason = st.text_area("Motivo de la consulta*")
         notes = st.text_area("Notas adicionales")
         
+        # --- Series recurrentes (M16): la API expande las fechas y revisa choques de una vez ---
+        with st.expander("🔁 Cita Recurrente (tratamientos y seguimientos)"):
+            is_recurring = st.checkbox("Crear una serie de citas a partir de esta fecha")
+            frequencies = {"Semanal": "weekly", "Diaria": "daily", "Mensual": "monthly"}
+            rc1, rc2, rc3 = st.columns(3)
+            freq_label = rc1.selectbox("Frecuencia", list(frequencies.keys()))
+            repeat_interval = rc2.number_input("Cada (días/semanas/meses)", min_value=1, max_value=12, value=1)
+            occurrences = rc3.number_input("Número de citas", min_value=2, max_value=52, value=8)
+            skip_conflicts = st.checkbox("Omitir las fechas en que el veterinario ya tiene cita")
+        
         submitted = st.form_submit_button("Agendar Cita")
         
         if submitted:
@@ -135,6 +151,26 @@ with tab_create:
                 st.error("Faltan datos obligatorios.")
             elif not is_emergency and not selected_pet_id:
                 st.error("Debes seleccionar una mascota.")
+            elif is_recurring and is_emergency:
+                st.error("Las series de citas requieren una mascota registrada.")
+            elif is_recurring:
+                payload = {
+                    "pet_id": selected_pet_id,
+                    "veterinarian_id": vet_options[selected_vet_key],
+                    "first_appointment_date": datetime.combine(new_date, new_time).isoformat(),
+                    "frequency": frequencies[freq_label],
+                    "interval": int(repeat_interval),
+                    "occurrences": int(occurrences),
+                    "reason": reason,
+                    "notes": notes,
+                    "skip_conflicts": skip_conflicts
+                }
+                res = api_request("POST", "/appointments/series", data=payload)
+                if res:
+                    st.success(f"✅ Serie creada: {len(res['appointments'])} citas agendadas.")
+                    if res['skipped']:
+                        skipped = sorted({s['requested_date'][:16].replace('T', ' ') for s in res['skipped']})
+                        st.warning(f"Se omitieron {len(skipped)} fechas por choque de horario: {', '.join(skipped)}")
             else:
                 # 1. Preparar datos
                 vet_id = vet_options[selected_vet_key]
@@ -178,7 +214,6 @@ with tab_create:
                     res = api_request("POST", "/appointments/", data=payload)
                     if res:
                         st.success("✅ Cita agendada correctamente.")
-                        st.cache_data.clear()
                         st.rerun()
 
 # --- TAB 3: GESTIONAR ---
@@ -224,11 +259,9 @@ with tab_manage:
                     payload = {"status": edit_status, "notes": edit_notes}
                     if api_request("PUT", f"/appointments/{appt_id}", data=payload):
                         st.success("Cita actualizada.")
-                        st.cache_data.clear()
                         st.rerun()
                 
                 if submit_delete:
                     if api_request("DELETE", f"/appointments/{appt_id}"):
                         st.success("Cita eliminada.")
-                        st.cache_data.clear()
                         st.rerun()
\ No newline at end of file
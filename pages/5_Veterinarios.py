@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
 import requests
+from frontend.cache import cached_get, invalidate_for
 from datetime import datetime, date
 
 # --- 1. Protección de la Página ---
@@ -13,13 +14,10 @@ st.set_page_config(page_title="Gestión de Veterinarios", page_icon="🩺", layo
 API_URL = "http://127.0.0.1:8000"
 
 # --- 3. Funciones Auxiliares ---
-@st.cache_data(ttl=5)
+# Caché compartida entre réplicas (Redis), por rol y endpoint (frontend/cache.py)
 def get_data(endpoint):
-    headers = {"Authorization": f"Bearer {st.session_state['auth_token']}"}
     try:
-        response = requests.get(f"{API_URL}{endpoint}", headers=headers)
-        response.raise_for_status()
-        return response.json()
+        return cached_get(API_URL, endpoint, ttl=5)
     except requests.exceptions.RequestException as e:
         st.error(f"Error de conexión: {e}")
         return []
@@ -35,6 +33,7 @@ def api_request(method: str, endpoint: str, data: dict = None):
             response = requests.delete(f"{API_URL}{endpoint}", headers=headers)
         
         response.raise_for_status()
+        invalidate_for(endpoint)
         if response.status_code != 204:
             return response.json()
         return True
@@ -153,7 +152,6 @@ with tab_create:
                 # Usamos el endpoint /sign-up que creamos para registrar usuarios
                 if api_request("POST", "/sign-up", data=payload):
                     st.success(f"¡Dr. {new_last} registrado exitosamente!")
-                    st.cache_data.clear()
                     st.rerun()
 
 # --- TAB 3: GESTIÓN ---
@@ -199,14 +197,12 @@ with tab_manage:
                         }
                         if api_request("PUT", f"/veterinarians/{vet_id}", data=update_data):
                             st.success("Datos actualizados.")
-                            st.cache_data.clear()
                             st.rerun()
 
                 with st.expander("🚨 Zona de Peligro"):
                     if st.button(f"Eliminar al Dr. {current_vet['last_name']}", type="primary"):
                         if api_request("DELETE", f"/veterinarians/{vet_id}"):
                             st.success("Veterinario eliminado.")
-                            st.cache_data.clear()
                             st.rerun()
 
 # Botón flotante
@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
 import requests
+from frontend.cache import cached_get, invalidate_for
 
 # --- 1. Protección de la Página (Auth) ---
 if 'logged_in' not in st.session_state or not st.session_state['logged_in']:
@@ -12,13 +13,10 @@ st.set_page_config(page_title="Gestión de Vacunas", page_icon="💉", layout="w
 API_URL = "http://127.0.0.1:8000"
 
 # --- 3. Funciones Auxiliares ---
-@st.cache_data(ttl=5)
+# Caché compartida entre réplicas (Redis), por rol y endpoint (frontend/cache.py)
 def get_data(endpoint):
-    headers = {"Authorization": f"Bearer {st.session_state['auth_token']}"}
     try:
-        response = requests.get(f"{API_URL}{endpoint}", headers=headers)
-        response.raise_for_status()
-        return response.json()
+        return cached_get(API_URL, endpoint, ttl=5)
     except requests.exceptions.RequestException as e:
         st.error(f"Error de conexión: {e}")
         return []
@@ -34,6 +32,7 @@ def api_request(method: str, endpoint: str, data: dict = None):
             response = requests.delete(f"{API_URL}{endpoint}", headers=headers)
         
         response.raise_for_status()
+        invalidate_for(endpoint)
         if response.status_code != 204:
             return response.json()
         return True
@@ -116,13 +115,11 @@ with tab_catalog:
                         }
                         if api_request("PUT", f"/vaccines/{vac_id}", data=payload):
                             st.success("Vacuna actualizada correctamente.")
-                            st.cache_data.clear()
                             st.rerun()
                     
                     if submit_delete:
                         if api_request("DELETE", f"/vaccines/{vac_id}"):
                             st.success("Vacuna eliminada del catálogo.")
-                            st.cache_data.clear()
                             st.rerun()
 
     else:
@@ -155,7 +152,6 @@ with tab_create:
                 
                 if api_request("POST", "/vaccines/", data=payload):
                     st.success(f"Vacuna '{create_name}' creada exitosamente.")
-                    st.cache_data.clear()
                     st.rerun()
 
 # Botón flotante
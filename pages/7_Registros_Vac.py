@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
 import requests
+from frontend.cache import cached_get, invalidate_for
 from datetime import datetime, date
 
 # --- 1. Protección de la Página ---
@@ -13,15 +14,12 @@ st.set_page_config(page_title="Registros de Vacunación", page_icon="📋", layo
 API_URL = "http://127.0.0.1:8000"
 
 # --- 3. Funciones Auxiliares ---
-@st.cache_data(ttl=5)
+# Caché compartida entre réplicas (Redis), por rol y endpoint (frontend/cache.py)
 def get_data(endpoint):
-    headers = {"Authorization": f"Bearer {st.session_state['auth_token']}"}
     try:
-        response = requests.get(f"{API_URL}{endpoint}", headers=headers)
-        response.raise_for_status()
-        return response.json()
+        return cached_get(API_URL, endpoint, ttl=5)
     except requests.exceptions.RequestException as e:
-        if response.status_code != 404: 
+        if e.response is None or e.response.status_code != 404: 
             st.error(f"Error de conexión: {e}")
         return []
 
@@ -36,6 +34,7 @@ def api_request(method: str, endpoint: str, data: dict = None):
             response = requests.delete(f"{API_URL}{endpoint}", headers=headers)
         
         response.raise_for_status()
+        invalidate_for(endpoint)
         if response.status_code != 204:
             return response.json()
         return True
@@ -128,7 +127,6 @@ with tab_register:
                 
                 if api_request("POST", "/vaccination-records/", data=payload):
                     st.success("✅ Vacunación registrada correctamente.")
-                    st.cache_data.clear()
                     st.rerun()
 
 # --- TAB 3: GESTIONAR ---
@@ -187,13 +185,11 @@ with tab_manage:
                             }
                             if api_request("PUT", f"/vaccination-records/{rec_id}", data=payload):
                                 st.success("Registro actualizado.")
-                                st.cache_data.clear()
                                 st.rerun()
                             
                     if delete_btn:
                         if api_request("DELETE", f"/vaccination-records/{rec_id}"):
                             st.success("Registro eliminado.")
-                            st.cache_data.clear()
                             st.rerun()
     else:
         st.info("No hay registros para modificar.")
@@ -1,7 +1,9 @@
 import streamlit as st
 import pandas as pd
 import requests
-import uuid
+from frontend.cache import cached_get, invalidate_for
+from frontend.live import refresh_on_change
+from frontend.sync import synced_collection
 from datetime import datetime, date
 
 # --- 1. Protección de la Página ---
@@ -14,15 +16,13 @@ st.set_page_config(page_title="Gestión Financiera", page_icon="💰", layout="w
 API_URL = "http://127.0.0.1:8000"
 
 # --- 3. Funciones Auxiliares ---
-@st.cache_data(ttl=5)
+# La caché ya no necesita expirar cada 5s: se invalida al llegar un evento en vivo
+# Caché compartida entre réplicas (Redis), por rol y endpoint (frontend/cache.py)
 def get_data(endpoint):
-    headers = {"Authorization": f"Bearer {st.session_state['auth_token']}"}
     try:
-        response = requests.get(f"{API_URL}{endpoint}", headers=headers)
-        response.raise_for_status()
-        return response.json()
+        return cached_get(API_URL, endpoint, ttl=300)
     except requests.exceptions.RequestException as e:
-        if response.status_code != 404:
+        if e.response is None or e.response.status_code != 404:
             st.error(f"Error de conexión: {e}")
         return []
 
@@ -37,6 +37,7 @@ def api_request(method: str, endpoint: str, data: dict = None):
             response = requests.delete(f"{API_URL}{endpoint}", headers=headers)
         
         response.raise_for_status()
+        invalidate_for(endpoint)
         if response.status_code != 204:
             return response.json()
         return True
@@ -49,26 +50,61 @@ def api_request(method: str, endpoint: str, data: dict = None):
         return None
 
 # --- 4. Carga de Datos ---
-invoices_list = get_data("/invoices/")
-appts_list = get_data("/appointments/") 
+# Copias locales que solo reciben los cambios (M8); ya no se limitan a 100 filas
+invoices_list = sorted(synced_collection(API_URL, "invoices"), key=lambda i: i['issue_date'], reverse=True)
+appts_list = sorted(synced_collection(API_URL, "appointments"), key=lambda a: a['appointment_date'], reverse=True)
+
+# Refrescar solo cuando la API publique cambios de citas o facturas
+refresh_on_change(API_URL, ("appointments", "invoices"))
 
 # --- 5. Interfaz Principal ---
 st.title("💰 Gestión Financiera y Facturación")
 
 # --- Métricas Clave ---
-if invoices_list:
-    df_inv = pd.DataFrame(invoices_list)
-    df_inv['total_amount'] = pd.to_numeric(df_inv['total_amount'])
-    
-    total_facturado = df_inv['total_amount'].sum()
-    total_pendiente = df_inv[df_inv['payment_status'].isin(['pending', 'overdue'])]['total_amount'].sum()
-    total_pagado = df_inv[df_inv['payment_status'] == 'paid']['total_amount'].sum()
-    
+# Calculadas en la BD (/reports/receivables) sobre TODAS las facturas
+receivables = get_data("/reports/receivables?top=10")
+totals = receivables.get('totals') if receivables else None
+if totals:
     kpi1, kpi2, kpi3 = st.columns(3)
-    kpi1.metric("Total Facturado", f"${total_facturado:,.2f}")
-    kpi2.metric("Ingresos Reales", f"${total_pagado:,.2f}", delta="Efectivo")
-    kpi3.metric("Pendiente de Cobro", f"${total_pendiente:,.2f}", delta="-Deuda", delta_color="inverse")
-    
+    kpi1.metric("Total Facturado", f"${float(totals['billed']):,.2f}")
+    kpi2.metric("Ingresos Reales", f"${float(totals['paid']):,.2f}", delta="Efectivo")
+    kpi3.metric("Pendiente de Cobro", f"${float(totals['outstanding']):,.2f}", delta="-Deuda", delta_color="inverse")
+
+    # Antigüedad del saldo por cobrar
+    age1, age2, age3, age4 = st.columns(4)
+    age1.metric("0-30 días", f"${float(totals['days_0_30']):,.2f}")
+    age2.metric("31-60 días", f"${float(totals['days_31_60']):,.2f}")
+    age3.metric("61-90 días", f"${float(totals['days_61_90']):,.2f}")
+    age4.metric("Más de 90 días", f"${float(totals['days_over_90']):,.2f}")
+
+    with st.expander("📅 Antigüedad de saldos por estado, cliente y veterinario"):
+        aging_columns = {
+            "outstanding": st.column_config.NumberColumn("Por Cobrar", format="$%.2f"),
+            "days_0_30": st.column_config.NumberColumn("0-30", format="$%.2f"),
+            "days_31_60": st.column_config.NumberColumn("31-60", format="$%.2f"),
+            "days_61_90": st.column_config.NumberColumn("61-90", format="$%.2f"),
+            "days_over_90": st.column_config.NumberColumn("90+", format="$%.2f"),
+        }
+        aging_fields = ["outstanding", "days_0_30", "days_31_60", "days_61_90", "days_over_90"]
+        for title, group, label_field in [
+            ("Por Estado", "by_status", "status"),
+            ("Clientes con Mayor Saldo", "by_owner", "owner_name"),
+            ("Por Veterinario", "by_veterinarian", "veterinarian_name"),
+        ]:
+            st.markdown(f"**{title}**")
+            if receivables[group]:
+                df_aging = pd.DataFrame(receivables[group])
+                df_aging[aging_fields] = df_aging[aging_fields].apply(pd.to_numeric)
+                df_aging[label_field] = df_aging[label_field].fillna("Sin cita asociada")
+                st.dataframe(
+                    df_aging[[label_field, "invoice_count", *aging_fields]],
+                    column_config={label_field: "", "invoice_count": "Facturas", **aging_columns},
+                    width='stretch',
+                    hide_index=True
+                )
+            else:
+                st.caption("Sin saldos pendientes.")
+
     st.divider()
 
 # --- PESTAÑAS ---
@@ -132,7 +168,6 @@ with tab_status:
                         with st.spinner("Procesando pago..."):
                             if api_request("POST", f"/invoices/{inv_to_pay_id}/pay"):
                                 st.success("¡Pago registrado!")
-                                st.cache_data.clear()
                                 st.rerun()
             else:
                 st.success("¡No hay facturas pendientes!")
@@ -147,17 +182,12 @@ with tab_create:
     
     # --- NOTA: Quitamos 'with st.form' para que los cálculos sean inmediatos ---
     
-    # Generar ID automático: INV-AAAAMMDD-XXXX
-    # Usamos session_state para que el ID no cambie cada vez que escribes una letra
-    if 'new_invoice_uuid' not in st.session_state:
-        st.session_state['new_invoice_uuid'] = uuid.uuid4().hex[:4].upper()
-        
-    auto_inv_num = f"INV-{datetime.now().strftime('%Y%m%d')}-{st.session_state['new_invoice_uuid']}"
+    # El número lo asigna la API al emitir (M13), sin riesgo de duplicados
     
     c1, c2 = st.columns(2)
     
     with c1:
-        st.text_input("Número de Factura (Automático)", value=auto_inv_num, disabled=True)
+        st.text_input("Número de Factura (Automático)", value="Se asigna al emitir", disabled=True)
         new_issue_date = st.date_input("Fecha de Emisión*", value=date.today())
         
         appt_opts = {f"Cita #{a['appointment_id']} ({a['appointment_date'][:10]})": a['appointment_id'] for a in appts_list}
@@ -188,7 +218,6 @@ with tab_create:
         else:
             payload = {
                 "appointment_id": sel_appt_id,
-                "invoice_number": auto_inv_num,
                 "issue_date": new_issue_date.isoformat(),
                 "subtotal": new_subtotal,
                 "tax_amount": calc_tax,
@@ -197,11 +226,9 @@ with tab_create:
                 "payment_date": datetime.now().isoformat() if new_status == 'paid' else None
             }
             
-            if api_request("POST", "/invoices/", data=payload):
-                st.success(f"Factura {auto_inv_num} emitida correctamente.")
-                # Limpiar el ID generado para la próxima factura
-                del st.session_state['new_invoice_uuid']
-                st.cache_data.clear()
+            created = api_request("POST", "/invoices/", data=payload)
+            if created:
+                st.success(f"Factura {created['invoice_number']} emitida correctamente.")
                 st.rerun()
 
 # --- TAB 3: ADMINISTRAR ---
@@ -235,13 +262,11 @@ with tab_manage:
                         payload = {"payment_status": edit_status}
                         if api_request("PUT", f"/invoices/{inv_id}", data=payload):
                             st.success("Estado actualizado.")
-                            st.cache_data.clear()
                             st.rerun()
                     
                     if btn_delete:
                         if api_request("DELETE", f"/invoices/{inv_id}"):
                             st.success("Factura anulada.")
-                            st.cache_data.clear()
                             st.rerun()
 
 st.markdown("---")
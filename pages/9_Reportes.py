@@ -1,6 +1,7 @@
 import streamlit as st
 import pandas as pd
 import requests
+from frontend.cache import cached_get, invalidate_for
 from datetime import datetime, timedelta
 
 # --- 1. Protección de la Página ---
@@ -13,13 +14,10 @@ st.set_page_config(page_title="Reportes y Métricas", page_icon="📈", layout="
 API_URL = "http://127.0.0.1:8000"
 
 # --- 3. Funciones Auxiliares ---
-@st.cache_data(ttl=60) # Cache más largo (60s) porque los reportes no cambian tan rápido
+# Caché compartida entre réplicas (Redis), por rol y endpoint (frontend/cache.py)
 def get_data(endpoint):
-    headers = {"Authorization": f"Bearer {st.session_state['auth_token']}"}
     try:
-        response = requests.get(f"{API_URL}{endpoint}", headers=headers)
-        response.raise_for_status()
-        return response.json()
+        return cached_get(API_URL, endpoint, ttl=60)
     except requests.exceptions.RequestException as e:
         st.error(f"Error de conexión: {e}")
         return None
@@ -134,6 +132,27 @@ with tab_alerts:
     else:
         st.success("✅ No hay alertas de vacunación pendientes para los próximos 30 días.")
 
+    # --- Recordatorios por email (M14): un mensaje por dueño, enviado por el worker ---
+    st.markdown("#### 📧 Recordatorios a Dueños")
+    st.caption("Agrupa todas las dosis próximas de cada dueño en un solo mensaje. Las dosis ya recordadas no se repiten.")
+    if st.button("Encolar Recordatorios"):
+        headers = {"Authorization": f"Bearer {st.session_state['auth_token']}"}
+        try:
+            response = requests.post(f"{API_URL}/reminders/vaccinations", headers=headers)
+            response.raise_for_status()
+            queued = response.json()
+            st.success(f"Se encolaron {queued['messages']} mensajes ({queued['doses']} dosis).")
+            invalidate_for("/reminders/vaccinations")
+        except requests.exceptions.RequestException as e:
+            st.error(f"No se pudieron encolar los recordatorios: {e}")
+
+    outbox = get_data("/reminders/outbox")
+    if outbox:
+        status_labels = {"pending": "⏳ Pendientes", "sent": "✅ Enviados", "failed": "❌ Fallidos"}
+        cols = st.columns(len(outbox))
+        for col, row in zip(cols, outbox):
+            col.metric(status_labels.get(row['status'], row['status']), row['messages'])
+
 # Botón flotante
 st.markdown("---")
 if st.button("⬅️ Volver al Menú Principal"):
@@ -4,7 +4,7 @@ from decimal import Decimal
 from faker import Faker
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from app import models
+from app import models, numbering
 from app.database import SessionLocal, engine
 # --- AÑADIR 'auth' PARA HASHEAR CONTRASEÑAS ---
 from app import auth 
@@ -157,7 +157,7 @@ try:
         
         invoice = models.Invoice(
             appointment_id=appt.appointment_id,
-            invoice_number=fake.unique.bothify(text='INV-####-????'),
+            invoice_number=numbering.allocate_invoice_numbers(db, appt.appointment_date.date())[0], # M13
             issue_date=appt.appointment_date.date(),
             subtotal=subtotal,
             tax_amount=tax.quantize(Decimal('0.01')),
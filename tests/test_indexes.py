@@ -0,0 +1,12 @@
+import os
+
+# Solo se leen los modelos: no hace falta una BD real (ni el driver de PostgreSQL)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from app import models  # noqa: E402,F401  (registra las tablas en Base.metadata)
+from app.database import Base  # noqa: E402
+from app.indexes import unindexed_foreign_keys  # noqa: E402
+
+
+def test_every_foreign_key_is_indexed():
+    assert unindexed_foreign_keys(Base.metadata) == []